@@ -1,8 +1,18 @@
 # Home.py — CardioCare AI (Refreshed Home)
 import streamlit as st
+from utils import metrics
+from utils.model_store import warm_up
 
 st.set_page_config(page_title="CardioCare AI", page_icon="💓", layout="centered")
 
+# Load the model in the background while the visitor reads this page, so
+# Predict doesn't pay for it on first open (once per server process)
+warm_up()
+
+# Metrics export, if configured (CARDIOCARE_METRICS_*); every page calls this,
+# since visitors can open any of them first, and only the first call starts it
+metrics.start_exporter()
+
 # =========================
 # Header / Banner
 # =========================
@@ -0,0 +1,66 @@
+"""Move old prediction history out of user_history.db into monthly archives.
+
+Rows older than the retention window go to one SQLite file per month in
+user_history_archive/ (history-2025-08.db, ...), in bounded batches so the
+app keeps writing while it runs, and the live file shrinks via incremental
+vacuum. Full-history reads (get_user_history, the History page's CSV
+export) ATTACH the archives, so nothing disappears for the user.
+
+    python archive_history.py --older-than-days 365
+
+Databases created before incremental auto-vacuum was turned on only reuse
+the freed space for new rows; the file doesn't shrink. Converting them
+takes one full VACUUM, which rewrites the file and blocks every write
+while it runs, so it is opt-in; run it once, in a quiet period:
+
+    python archive_history.py --older-than-days 365 --enable-incremental-vacuum
+"""
+import argparse
+import os
+import sys
+import time
+
+from utils import db_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive prediction history older than the retention window.")
+    parser.add_argument("--older-than-days", type=float, default=365,
+                        help="keep this many days of history in the live database")
+    parser.add_argument("--db", default=db_manager.DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=db_manager.ARCHIVE_BATCH_ROWS,
+                        help="rows moved per transaction")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="after archiving, convert an older database to incremental auto-vacuum "
+                             "(one full VACUUM; blocks writes while it runs)")
+    args = parser.parse_args()
+
+    db_manager.DB_PATH = args.db
+    db_manager.init_db()
+    before = os.path.getsize(args.db)
+    start = time.perf_counter()
+    moved = db_manager.archive_history(args.older_than_days, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    if not moved:
+        print(f"Nothing older than {args.older_than_days:g} days.")
+    else:
+        for month, n in sorted(moved.items()):
+            print(f"  {month}: {n:,} rows")
+        print(f"✅ Archived {sum(moved.values()):,} rows into {db_manager.archive_dir()}/ in {elapsed:.1f}s")
+
+    if args.enable_incremental_vacuum:
+        start = time.perf_counter()
+        if db_manager.enable_incremental_vacuum():
+            print(f"✅ Switched to incremental auto-vacuum in {time.perf_counter() - start:.1f}s")
+        else:
+            print("Incremental auto-vacuum was already on.")
+    elif moved and not db_manager.incremental_vacuum_enabled():
+        print("ℹ️ This database predates incremental auto-vacuum, so the space freed is reused for new "
+              "rows but the file doesn't shrink. Run once with --enable-incremental-vacuum to convert it.")
+    freed = before - os.path.getsize(args.db)
+    if freed > 0:
+        print(f"{args.db} is {freed / 1e6:.1f} MB smaller")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Concurrent save_history throughput: legacy connect-per-call vs pooled WAL.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_db_concurrency --threads 1 4 16 32 --writes 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from utils import db_manager
+
+SAMPLE = {
+    "Age": 54, "RestingBP": 130, "Cholesterol": 240, "MaxHR": 150,
+    "Diabetes": 0, "Hypertension": 1, "Heart_Condition": 0, "Vaccinated": 1,
+    "Hospitalized": 0, "Vaccine_Type": 1, "Doses": 2, "Days_Since_Vaccine": 90,
+    "Risk_Score": 0.42, "Prediction": 0, "Tier": "⚠️ Standard",
+    "Coverage": "₹5 – ₹10 Lakh", "Premium": "₹6,000 – ₹9,000",
+}
+
+
+def legacy_save_history(email, data):
+    """The pre-pool implementation: new connection, default journal, one commit."""
+    conn = sqlite3.connect(db_manager.DB_PATH)
+    try:
+        db_manager._insert_history(conn, [(email, int(time.time()),
+                                           *(data[f] for f in db_manager.HISTORY_FIELDS))])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(save, n_threads, writes_per_thread):
+    errors = []
+
+    def worker(i):
+        for _ in range(writes_per_thread):
+            try:
+                save(f"user{i}@bench", SAMPLE)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ok = n_threads * writes_per_thread - len(errors)
+    return ok / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--writes", type=int, default=200, help="writes per thread")
+    args = parser.parse_args()
+
+    print(f"{'threads':>7} {'mode':>8} {'writes/s':>10} {'errors':>7}")
+    for n in args.threads:
+        for mode, save in (("legacy", legacy_save_history), ("pooled", db_manager.save_history)):
+            with tempfile.TemporaryDirectory() as tmp:
+                db_manager.DB_PATH = os.path.join(tmp, "bench.db")
+                db_manager.init_db()
+                if mode == "legacy":
+                    # start legacy from a rollback-journal database
+                    db_manager.close_all_connections()
+                    conn = sqlite3.connect(db_manager.DB_PATH)
+                    conn.execute("PRAGMA journal_mode=DELETE")
+                    conn.close()
+                rate, errors = run(save, n, args.writes)
+                db_manager.close_all_connections()
+            print(f"{n:>7} {mode:>8} {rate:>10.0f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Peak memory of DICOM decoding: the original full-size float32 path vs read_dicom.
+
+Each measurement runs in a fresh subprocess. "peak RSS" is the child's
+high-water RSS after decode + preprocess; "+decode" is how much of it the decode
+added over the RSS just before (imports and the file bytes already loaded).
+Run from the repo root (Linux/macOS):
+
+    python -m benchmarks.bench_dicom_memory --sizes 2000 3000
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def legacy_decode(data):
+    """read_cxr_file's DICOM branch before read_dicom existed."""
+    import cv2
+    import pydicom
+    ds = pydicom.dcmread(io.BytesIO(data))
+    arr = ds.pixel_array.astype(np.float32)
+    slope = float(getattr(ds, "RescaleSlope", 1.0))
+    intercept = float(getattr(ds, "RescaleIntercept", 0.0))
+    arr = arr * slope + intercept
+    photometric = getattr(ds, "PhotometricInterpretation", "MONOCHROME2")
+    if photometric and str(photometric).upper() == "MONOCHROME1":
+        arr = arr.max() - arr
+    return cv2.normalize(arr, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+
+def _maxrss_mb():
+    # VmHWM is reset by exec; ru_maxrss on Linux keeps the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def child(mode, path):
+    from utils.imaging import preprocess, read_dicom
+    with open(path, "rb") as f:
+        data = f.read()
+    before = _maxrss_mb()
+    t = time.perf_counter()
+    img = legacy_decode(data) if mode == "legacy" else read_dicom(data)
+    img = preprocess(img, target=512)
+    elapsed = time.perf_counter() - t
+    peak = _maxrss_mb()
+    print(f"{peak:.1f} {peak - before:.1f} {elapsed * 1e3:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 3000])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    from benchmarks.phantoms import cxr_phantom, dicom_bytes
+    print(f"{'size':>5} {'mode':>7} {'peak RSS MB':>12} {'+decode MB':>11} {'ms':>8}")
+    for size in args.sizes:
+        img = cxr_phantom(size=size, seed=size, dtype=np.uint16)
+        with tempfile.NamedTemporaryFile(suffix=".dcm", delete=False) as f:
+            f.write(dicom_bytes(img, photometric="MONOCHROME1"))
+        try:
+            for mode in ("legacy", "fused"):
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_dicom_memory",
+                                      "--child", mode, f.name],
+                                     capture_output=True, text=True, check=True).stdout.split()
+                print(f"{size:>5} {mode:>7} {float(out[0]):>12.1f} {float(out[1]):>11.1f} {float(out[2]):>8.1f}")
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Storage and query cost of the history schema before and after migration 3.
+
+Builds a database on the old text schema (migrations 1-2), times typical
+queries, upgrades it in place with migrate() and times the same queries on
+the normalized tables. Sizes are measured after VACUUM with SQLite's dbstat
+table, per table plus its indexes. Run from the repo root:
+
+    python -m benchmarks.bench_history_schema --rows 200000 --users 50
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from utils import db_manager
+
+LEGACY_INSERT_SQL = f"""
+    INSERT INTO prediction_history (email, timestamp, {", ".join(db_manager.HISTORY_FIELDS)})
+    VALUES ({", ".join("?" * (len(db_manager.HISTORY_FIELDS) + 2))})
+"""
+
+TIERS = [
+    ("🚨 Premium", "₹2 – ₹5 Lakh", "₹10,000+"),
+    ("⚠️ Standard", "₹5 – ₹10 Lakh", "₹6,000 – ₹9,000"),
+    ("✅ Basic", "₹10 – ₹15 Lakh", "₹4,000 – ₹6,000"),
+]
+
+# (name, legacy SQL, normalized SQL); "?" is the user's email
+QUERIES = [
+    ("user page (50 newest)",
+     "SELECT * FROM prediction_history WHERE email = ? ORDER BY timestamp DESC, id DESC LIMIT 50",
+     f"{db_manager._SELECT_HISTORY} {db_manager._WHERE_USER} ORDER BY p.ts DESC, p.id DESC LIMIT 50"),
+    ("user full history",
+     "SELECT * FROM prediction_history WHERE email = ? ORDER BY timestamp DESC, id DESC",
+     f"{db_manager._SELECT_HISTORY} {db_manager._WHERE_USER} ORDER BY p.ts DESC, p.id DESC"),
+    ("user risk trend",
+     "SELECT timestamp, Risk_Score FROM prediction_history WHERE email = ? ORDER BY timestamp, id",
+     f"SELECT p.ts, p.Risk_Score FROM predictions p {db_manager._WHERE_USER} ORDER BY p.ts, p.id"),
+    ("tier counts, all rows",
+     "SELECT Tier, COUNT(*) FROM prediction_history GROUP BY Tier",
+     "SELECT t.tier, COUNT(*) FROM predictions p LEFT JOIN tiers t ON t.code = p.tier_code GROUP BY p.tier_code"),
+    ("50 newest, all users",
+     "SELECT * FROM prediction_history ORDER BY timestamp DESC LIMIT 50",
+     f"{db_manager._SELECT_HISTORY} ORDER BY p.ts DESC LIMIT 50"),
+]
+
+
+def fill_legacy(path, n_rows, n_users, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    emails = [f"user{i}@example.com" for i in range(n_users)]
+    step = 2 * 365 * 86400 / n_rows
+    conn = sqlite3.connect(path)
+    for lo in range(0, n_rows, 50_000):
+        rows = []
+        for i in range(lo, min(lo + 50_000, n_rows)):
+            risk = rng.random()
+            tier = TIERS[0] if risk >= 0.75 else TIERS[1] if risk >= 0.4 else TIERS[2]
+            ts = (start + datetime.timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S")
+            rows.append((rng.choice(emails), ts, rng.randint(20, 90), rng.randint(90, 180),
+                         rng.randint(150, 320), rng.randint(80, 200), *(rng.randint(0, 1) for _ in range(5)),
+                         rng.randint(0, 3), rng.randint(0, 3), rng.randint(0, 720), risk, int(risk >= 0.5), *tier))
+        conn.executemany(LEGACY_INSERT_SQL, rows)
+        conn.commit()
+    conn.close()
+    return emails
+
+
+def table_sizes(path):
+    """Bytes per table, with each index counted towards its table."""
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    owner = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    sizes = {}
+    for name, nbytes in conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"):
+        table = owner.get(name, name)
+        sizes[table] = sizes.get(table, 0) + nbytes
+    conn.close()
+    return sizes, os.path.getsize(path)
+
+
+def time_queries(path, emails, sql_index, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for query in QUERIES:
+        name, sql = query[0], query[sql_index]
+        times = []
+        for r in range(repeat):
+            params = (emails[r % len(emails)],) if "?" in sql else ()
+            t = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            times.append(time.perf_counter() - t)
+        results[name] = statistics.median(times) * 1e3
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=7, help="runs per query (median reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager.DB_PATH = path = os.path.join(tmp, "bench.db")
+        db_manager.write_transaction(lambda conn: conn.execute(db_manager.HISTORY_V0_SQL))
+        emails = fill_legacy(path, args.rows, args.users)
+        db_manager.migrate(target=2)
+        db_manager.close_all_connections()
+        old_sizes, old_file = table_sizes(path)
+        old_times = time_queries(path, emails, 1, args.repeat)
+
+        start = time.perf_counter()
+        db_manager.init_db()
+        migrate_s = time.perf_counter() - start
+        db_manager.close_all_connections()
+        new_sizes, new_file = table_sizes(path)
+        new_times = time_queries(path, emails, 2, args.repeat)
+
+    old_rows = old_sizes["prediction_history"] / args.rows
+    new_rows = new_sizes["predictions"] / args.rows
+    print(f"{args.rows:,} rows, {args.users} users; migrated in place in {migrate_s:.1f}s "
+          f"({args.rows / migrate_s:,.0f} rows/s, batches of {db_manager.MIGRATION_BATCH_ROWS:,})")
+    print(f"{'':<24} {'text':>10} {'normalized':>11}")
+    print(f"{'history bytes/row':<24} {old_rows:>10.1f} {new_rows:>11.1f}")
+    print(f"{'database file, MB':<24} {old_file / 1e6:>10.1f} {new_file / 1e6:>11.1f}")
+    for name, *_ in QUERIES:
+        print(f"{name + ', ms':<24} {old_times[name]:>10.2f} {new_times[name]:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
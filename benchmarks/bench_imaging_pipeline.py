@@ -0,0 +1,207 @@
+"""Per-stage timings and memory of the Imaging page pipeline, with a stored baseline.
+
+Every stage 2_Imaging_Beta_CXR.py runs (decode, preprocess, lung mask, mask
+padding, abnormal map, overlay, PNG encode, measurements) is timed on its
+own, best of --repeat, on deterministic phantoms at each raw size and
+working resolution. "peak MB" is the largest tracemalloc peak of any one
+stage (NumPy/OpenCV result arrays; OpenCV's internal scratch is not
+traced), measured on a separate untimed pass.
+
+Identity checks run alongside:
+  * the abnormal-map kernel against the original skimage loop (exact);
+  * run_stages (cached page path) against analyze_cxr (batch path) (exact);
+  * read_dicom against the original float32 decode, whose truncation
+    differs by a grey level or two: % affected must agree within
+    --decode-tolerance points.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_imaging_pipeline                  # compare with the baseline
+    python -m benchmarks.bench_imaging_pipeline --save-baseline  # record a new baseline
+
+Exits non-zero on an identity mismatch, or on a stage slower than the
+baseline by more than --tolerance (and MIN_REGRESSION_MS) when
+--fail-on-regression is given. Baselines are machine-specific: record one
+on the machine you compare on.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from benchmarks.bench_abnormal_map import reference_percentile, reference_zscore
+from benchmarks.bench_dicom_memory import legacy_decode
+from benchmarks.phantoms import cxr_phantom, dicom_bytes, encode
+from utils.imaging import (
+    DEFAULT_SETTINGS, abnormal_map, analyze_cxr, decode_cxr_bytes, encode_png,
+    lung_mask_quick, measure_masks, overlay_for, pad_mask, preprocess, run_stages,
+)
+from utils.stage_cache import StageCache, content_digest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "imaging_pipeline.json")
+# Stage slowdowns smaller than this are timer noise, whatever the ratio
+MIN_REGRESSION_MS = 1.0
+STAGES = ["decode", "preprocess", "lung_mask", "pad_mask", "abnormal_map", "overlay", "encode_png", "measure"]
+
+
+def stage_fns(name, data, settings):
+    """(stage, fn(prev results) -> value) in pipeline order."""
+    s = settings
+    return [
+        ("decode", lambda r: decode_cxr_bytes(name, data)),
+        ("preprocess", lambda r: preprocess(r["decode"], target=s["target_size"])),
+        ("lung_mask", lambda r: lung_mask_quick(r["preprocess"])),
+        ("pad_mask", lambda r: pad_mask(r["lung_mask"], s["mask_pad"])),
+        ("abnormal_map", lambda r: abnormal_map(r["preprocess"], r["pad_mask"], method=s["method"],
+                                                z_thresh=s["z_thresh"], pct_thresh=s["pct_thresh"],
+                                                min_region_px=s["min_region"])[0]),
+        ("overlay", lambda r: overlay_for(r["preprocess"], r["abnormal_map"], alpha=s["alpha"])),
+        ("encode_png", lambda r: encode_png(r["overlay"])),
+        ("measure", lambda r: measure_masks(r["preprocess"], r["pad_mask"], r["abnormal_map"])),
+    ]
+
+
+def time_stages(fns, repeat):
+    results, times = {}, {}
+    for stage, fn in fns:
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            out = fn(results)
+            best = min(best, time.perf_counter() - t)
+        results[stage], times[stage] = out, best * 1e3
+    return results, times
+
+
+def peak_memory_mb(fns):
+    results, peak = {}, 0
+    tracemalloc.start()
+    try:
+        for stage, fn in fns:
+            tracemalloc.reset_peak()
+            results[stage] = fn(results)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def check_identity(name, data, fmt, settings, results, decode_tolerance):
+    """List of failed checks for one case (empty when everything matches)."""
+    s, failures = settings, []
+    img, lung = results["preprocess"], results["pad_mask"]
+
+    ref = reference_zscore(img, lung, z_thresh=s["z_thresh"], min_region_px=s["min_region"])
+    new = abnormal_map(img, lung, method="zscore", z_thresh=s["z_thresh"], min_region_px=s["min_region"])[0]
+    if not np.array_equal(ref, new):
+        failures.append("zscore mask != reference")
+    ref = reference_percentile(img, lung, pct_thresh=s["pct_thresh"], min_region_px=s["min_region"])
+    new = abnormal_map(img, lung, method="percentile", pct_thresh=s["pct_thresh"], min_region_px=s["min_region"])[0]
+    if not np.array_equal(ref, new):
+        failures.append("percentile mask != reference")
+
+    batch = analyze_cxr(name, data, s)
+    page = run_stages(StageCache(), content_digest(data), lambda: data, name, s)
+    page_pct = measure_masks(page["img"], page["lung"], page["abn"])["percent_affected"]
+    if batch["error"] or batch["percent_affected"] != page_pct or batch["overlay_png"] != page["overlay_png"]:
+        failures.append("run_stages != analyze_cxr")
+    if page_pct != results["measure"]["percent_affected"]:
+        failures.append("run_stages != staged pipeline")
+
+    if fmt == "dcm":
+        legacy = preprocess(legacy_decode(data), target=s["target_size"])
+        legacy_lung = pad_mask(lung_mask_quick(legacy), s["mask_pad"])
+        legacy_abn = abnormal_map(legacy, legacy_lung, method=s["method"], z_thresh=s["z_thresh"],
+                                  pct_thresh=s["pct_thresh"], min_region_px=s["min_region"])[0]
+        drift = abs(measure_masks(legacy, legacy_lung, legacy_abn)["percent_affected"] - page_pct)
+        if drift > decode_tolerance:
+            failures.append(f"decode drift {drift:.2f} pts")
+    return failures
+
+
+def make_input(raw, fmt):
+    img = cxr_phantom(size=raw, seed=raw, n_opacities=4, dtype=np.uint16 if fmt == "dcm" else np.uint8)
+    if fmt == "dcm":
+        return f"phantom_{raw}.dcm", dicom_bytes(img, photometric="MONOCHROME1")
+    return f"phantom_{raw}.png", encode(img, ".png")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raw-sizes", type=int, nargs="+", default=[1024, 2048, 3000])
+    parser.add_argument("--targets", type=int, nargs="+", default=[384, 448, 512, 640])
+    parser.add_argument("--formats", nargs="+", choices=["png", "dcm"], default=["png", "dcm"])
+    parser.add_argument("--method", choices=["zscore", "percentile"], default=DEFAULT_SETTINGS["method"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--decode-tolerance", type=float, default=1.0,
+                        help="allowed %% affected difference vs the original DICOM decode")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)  # what each process-pool worker runs with; keeps runs comparable
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored["method"] == args.method:
+            baseline = stored["cases"]
+        else:
+            print(f"Baseline was recorded with --method {stored['method']}; not comparing.")
+
+    settings = dict(DEFAULT_SETTINGS, method=args.method)
+    cases, mismatches, regressions = {}, 0, 0
+    print(f"{'case':<16} " + " ".join(f"{s[:10]:>10}" for s in STAGES) + f" {'total ms':>9} {'peak MB':>8} {'vs base':>8}  checks")
+    for raw in args.raw_sizes:
+        for fmt in args.formats:
+            name, data = make_input(raw, fmt)
+            for target in args.targets:
+                key = f"{fmt}-{raw}-{target}"
+                s = dict(settings, target_size=target)
+                fns = stage_fns(name, data, s)
+                results, times = time_stages(fns, args.repeat)
+                peak = peak_memory_mb(fns)
+                failures = check_identity(name, data, fmt, s, results, args.decode_tolerance)
+                mismatches += bool(failures)
+                total = sum(times.values())
+                cases[key] = {"stages_ms": times, "total_ms": total, "peak_mb": peak,
+                              "percent_affected": results["measure"]["percent_affected"]}
+
+                versus = ""
+                if key in baseline:
+                    ratio = total / baseline[key]["total_ms"]
+                    slow = [st for st in STAGES if times[st] > baseline[key]["stages_ms"][st] * (1 + args.tolerance)
+                            and times[st] - baseline[key]["stages_ms"][st] > MIN_REGRESSION_MS]
+                    versus = f"{ratio:.2f}x"
+                    if slow:
+                        regressions += 1
+                        failures.append("slower: " + ",".join(slow))
+                print(f"{key:<16} " + " ".join(f"{times[st]:>10.2f}" for st in STAGES)
+                      + f" {total:>9.2f} {peak:>8.1f} {versus:>8}  {'; '.join(failures) or 'ok'}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                                   "opencv": cv2.__version__, "numpy": np.__version__, "cpus": os.cpu_count()},
+                       "method": args.method, "repeat": args.repeat, "cases": cases}, f, indent=1)
+        print(f"Baseline written to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+
+    if mismatches:
+        sys.exit(f"{mismatches} case(s) failed identity checks")
+    if regressions and args.fail_on_regression:
+        sys.exit(f"{regressions} case(s) regressed beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
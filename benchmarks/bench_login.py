@@ -0,0 +1,85 @@
+"""Login throughput vs password KDF cost, to size CARDIOCARE_PASSWORD_KDF.
+
+For each KDF setting, creates users hashed with it and runs
+authenticate_user() from many threads at once (a login burst), through
+the bounded KDF pool the app uses. Reports the cost of one hash, logins/s
+and login latency percentiles. Run from the repo root:
+
+    python -m benchmarks.bench_login --threads 1 8 32 --logins 64
+    python -m benchmarks.bench_login --kdf scrypt:n=65536 pbkdf2_sha256:iterations=600000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils import db_manager
+
+DEFAULT_SETTINGS = [
+    "scrypt:n=4096", "scrypt:n=16384", "scrypt:n=32768", "scrypt:n=65536",
+    "pbkdf2_sha256:iterations=100000", "pbkdf2_sha256:iterations=300000", "pbkdf2_sha256:iterations=600000",
+]
+
+
+def burst(n_threads, n_logins, users):
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def worker(i):
+        for k in range(i, n_logins, n_threads):
+            email, password = users[k % len(users)]
+            t = time.perf_counter()
+            ok = db_manager.authenticate_user(email, password)
+            elapsed = time.perf_counter() - t
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    failures.append(email)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1e3
+    return {"logins_per_s": len(latencies) / wall, "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "failed": len(failures)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kdf", nargs="+", default=DEFAULT_SETTINGS, help="KDF settings to compare")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32], help="concurrent logins")
+    parser.add_argument("--logins", type=int, default=48, help="logins per burst")
+    parser.add_argument("--users", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"KDF pool: {db_manager.KDF_WORKERS} worker(s), {os.cpu_count()} CPU(s)")
+    print(f"{'kdf':<34} {'hash ms':>8} {'threads':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for setting in args.kdf:
+        db_manager.set_password_kdf(setting)
+        t = time.perf_counter()
+        db_manager.hash_password("benchmark")
+        hash_ms = (time.perf_counter() - t) * 1e3
+        with tempfile.TemporaryDirectory() as tmp:
+            db_manager.DB_PATH = os.path.join(tmp, "bench.db")
+            users = [(f"user{i}@bench", f"password-{i}") for i in range(args.users)]
+            db_manager.ensure_schema()
+            for email, password in users:
+                db_manager.create_user(email, password)
+            for n in args.threads:
+                stats = burst(n, args.logins, users)
+                if stats["failed"]:
+                    raise SystemExit(f"{stats['failed']} logins failed under {setting}")
+                print(f"{setting:<34} {hash_ms:>8.1f} {n:>7} {stats['logins_per_s']:>9.1f} "
+                      f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f}")
+            db_manager.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Per-call cost of the utils.metrics instrumentation.
+
+Times a no-op function bare and wrapped by each instrumentation primitive
+(timed decorator, bound histogram timer, ad hoc metrics.timer() lookup,
+counter increment), single-threaded and with threads contending for the
+same histogram, and reports the added cost in microseconds per call. Also
+times render() with every metric the app registers. Run from the repo root:
+
+    python -m benchmarks.bench_metrics --calls 200000 --threads 1 4
+"""
+import argparse
+import importlib
+import threading
+import time
+
+from utils import metrics
+
+
+def noop():
+    return None
+
+
+def per_call_us(fn, calls, n_threads):
+    def worker():
+        for _ in range(calls // n_threads):
+            fn()
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best reported)")
+    args = parser.parse_args()
+
+    hist = metrics.histogram("bench_seconds", case="bound")
+    count = metrics.counter("bench_total")
+    decorated = metrics.timed("bench_seconds", case="decorated")(noop)
+
+    def bound_timer():
+        with hist.time():
+            noop()
+
+    def adhoc_timer():
+        with metrics.timer("bench_seconds", case="adhoc"):
+            noop()
+
+    def counted():
+        count.inc()
+        noop()
+
+    cases = [("@timed decorator", decorated), ("histogram.time()", bound_timer),
+             ("metrics.timer(...)", adhoc_timer), ("counter.inc()", counted)]
+    print(f"{'instrumentation':<22} {'threads':>7} {'bare us':>8} {'with us':>8} {'added us':>9}")
+    for n in args.threads:
+        bare = min(per_call_us(noop, args.calls, n) for _ in range(args.repeat))
+        for name, fn in cases:
+            timed = min(per_call_us(fn, args.calls, n) for _ in range(args.repeat))
+            print(f"{name:<22} {n:>7} {bare:>8.3f} {timed:>8.3f} {timed - bare:>9.3f}")
+
+    # the app's own metrics, registered when its modules are imported
+    for module in ("utils.db_manager", "utils.imaging", "utils.scoring"):
+        importlib.import_module(module)
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"render(): {(time.perf_counter() - start) * 1e3:.2f} ms for "
+          f"{len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
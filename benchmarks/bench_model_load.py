@@ -0,0 +1,79 @@
+"""Model load time and memory: joblib pickle vs the memory-mapped model.forest bundle.
+
+Each mode runs in a fresh interpreter (median of --runs). "load ms" covers
+everything the Predict page does to get a servable model, including the
+sklearn import that unpickling triggers. Memory is measured after loading
+and scoring --rows rows, as growth over the RSS just before loading, split
+into anonymous memory (private to the process) and file-backed pages
+(RssAnon/RssFile, Linux only). Bundle arrays are file-backed, so every
+Streamlit worker mapping the same model.forest shares one copy of them;
+the file-backed growth of the pickle modes is mostly sklearn's own code.
+Run from the repo root:
+
+    python -m benchmarks.bench_model_load
+"""
+import argparse
+import subprocess
+import sys
+
+MODES = ("pickle", "pickle+compile", "bundle")
+
+
+def _memory_mb():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(rest.split()[0]) / 1024
+    return fields["VmRSS"], fields.get("RssAnon", float("nan")), fields.get("RssFile", float("nan"))
+
+
+def child(mode, model_path, bundle_path, rows):
+    import time
+    import warnings
+    import numpy as np
+    from utils.forest_engine import CompiledForest
+
+    warnings.simplefilter("ignore")
+    X = np.random.default_rng(0).integers(0, 300, (rows, 10)).astype(np.float32)
+    before = _memory_mb()
+    t = time.perf_counter()
+    if mode == "bundle":
+        model = CompiledForest.load(bundle_path)
+    else:
+        import joblib
+        model = joblib.load(model_path)
+        if mode == "pickle+compile":
+            model = CompiledForest.from_estimator(model)
+    load_ms = (time.perf_counter() - t) * 1e3
+    model.predict_proba(X[:, :model.n_features_in_])
+    after = _memory_mb()
+    print(load_ms, *(a - b for a, b in zip(after, before)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--bundle", default="model.forest")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", metavar="MODE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.model, args.bundle, args.rows)
+
+    print(f"{'mode':>15} {'load ms':>9} {'+RSS MB':>9} {'+anon MB':>9} {'+file MB':>9}")
+    for mode in MODES:
+        samples = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_model_load", "--child", mode,
+                                  "--model", args.model, "--bundle", args.bundle, "--rows", str(args.rows)],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            samples.append([float(x) for x in out])
+        load, rss, anon, file_ = (sorted(col)[len(col) // 2] for col in zip(*samples))
+        print(f"{mode:>15} {load:>9.1f} {rss:>9.1f} {anon:>9.1f} {file_:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
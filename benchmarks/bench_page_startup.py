@@ -0,0 +1,149 @@
+"""Import time and first-render time of every Streamlit page.
+
+Each measurement runs in a fresh interpreter, the way a page is first
+served after a deploy or restart:
+
+  * imports: the page's import header (parsed from its source; imports
+    deferred to later in the script are not counted), with ``import
+    streamlit`` timed separately since every page pays it;
+  * first render / rerun: the page executed with streamlit's AppTest as a
+    logged-in user, then rerun in the same process (what every widget
+    interaction costs). Needs streamlit; skipped without it;
+  * "Predict after Home": Predict's first render once Home.py's
+    background model warm-up has finished.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_page_startup --runs 3
+"""
+import argparse
+import ast
+import glob
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PAGES = ["Home.py", *sorted(glob.glob(os.path.join("pages", "*.py")))]
+
+IMPORT_PROBE = """
+import json, sys, time
+try:
+    t = time.perf_counter()
+    import streamlit
+    st_ms = (time.perf_counter() - t) * 1e3
+except ImportError:
+    st_ms = None
+t = time.perf_counter()
+for name in {modules!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+print(json.dumps({{"streamlit_ms": st_ms, "imports_ms": (time.perf_counter() - t) * 1e3}}))
+"""
+
+RENDER_PROBE = """
+import json, os, sys, tempfile, time
+from streamlit.testing.v1 import AppTest
+from utils import db_manager
+
+tmp = tempfile.mkdtemp()
+db_manager.DB_PATH = os.path.join(tmp, "bench.db")
+
+def render(page):
+    at = AppTest.from_file(page, default_timeout=300)
+    at.session_state["logged_in"] = True
+    at.session_state["email"] = "bench@demo.com"
+    t = time.perf_counter()
+    at.run()
+    first = (time.perf_counter() - t) * 1e3
+    t = time.perf_counter()
+    at.run()
+    rerun = (time.perf_counter() - t) * 1e3
+    return first, rerun, [str(e.message) for e in at.exception]
+
+if {after_home!r}:
+    render("Home.py")
+    from utils import model_store
+    model_store.warm_up().join()
+first, rerun, errors = render({page!r})
+print(json.dumps({{"first_ms": first, "rerun_ms": rerun, "errors": errors}}))
+"""
+
+
+def module_imports(path):
+    """Modules imported by a page's header: the imports (and try blocks of
+    imports) before its first other statement."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, ast.Try) and all(isinstance(n, (ast.Import, ast.ImportFrom, ast.Assign))
+                                             for n in node.body):
+            nodes[:0] = [n for n in node.body if not isinstance(n, ast.Assign)]
+        elif isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+        else:
+            break
+    return [n for n in dict.fromkeys(names) if n.split(".")[0] != "streamlit"]
+
+
+def probe(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def median_of(runs, key):
+    values = [r[key] for r in runs if r.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+def fmt(ms):
+    return f"{ms:>10.0f}" if ms is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement (median)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        can_render = importlib.util.find_spec("streamlit.testing.v1") is not None
+    except ModuleNotFoundError:
+        can_render = False
+    if not can_render:
+        print("streamlit not installed: reporting import times only", file=sys.stderr)
+
+    cases = [(page, False) for page in PAGES]
+    if can_render:
+        cases.append((os.path.join("pages", "1_Predict.py"), True))
+    results = []
+    print(f"{'page':<32} {'st import':>10} {'imports':>10} {'1st render':>10} {'rerun':>10}")
+    for page, after_home in cases:
+        imports = [probe(IMPORT_PROBE.format(modules=module_imports(page))) for _ in range(args.runs)]
+        row = {"page": page + (" after Home" if after_home else ""),
+               "streamlit_import_ms": median_of(imports, "streamlit_ms"),
+               "imports_ms": median_of(imports, "imports_ms")}
+        if can_render:
+            renders = [probe(RENDER_PROBE.format(page=page, after_home=after_home)) for _ in range(args.runs)]
+            row.update(first_render_ms=median_of(renders, "first_ms"), rerun_ms=median_of(renders, "rerun_ms"),
+                       errors=renders[-1]["errors"])
+        results.append(row)
+        print(f"{row['page']:<32} {fmt(row['streamlit_import_ms'])} {fmt(row['imports_ms'])} "
+              f"{fmt(row.get('first_render_ms'))} {fmt(row.get('rerun_ms'))}"
+              + ("  (page raised: " + "; ".join(row["errors"]) + ")" if row.get("errors") else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
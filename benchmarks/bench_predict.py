@@ -0,0 +1,214 @@
+"""Latency and throughput of the Predict page's risk path, as JSON.
+
+Measures, for the sklearn model and the compiled engine the page serves:
+  * cold start in a fresh interpreter: importing sklearn (which unpickling
+    does implicitly on the page), joblib.load(model.pkl) and compiling;
+  * single-row latency p50/p95/p99 for the full submit path: row dict →
+    predict_row (DataFrame construction for sklearn) → assign_tier;
+  * batch throughput of score_batch from 1 to 100k rows, per backend and
+    as the page serves it (compiled, sklearn from BATCH_MODEL_MIN_ROWS),
+    with the batch size where sklearn starts to beat the compiled engine;
+  * save_history cost per row (synchronous and write-behind) and
+    save_history_batch cost per row, on a throwaway database.
+
+A human-readable summary goes to stderr and the results, with library and
+model versions, go to --out (stdout by default) as one JSON document, so
+runs can be diffed across model and library upgrades. Run from the repo root:
+
+    python -m benchmarks.bench_predict --out predict-$(date +%F).json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from utils import db_manager
+from utils.forest_engine import CompiledForest
+from utils.prediction_cache import model_version
+from utils.scoring import (
+    BATCH_MODEL_MIN_ROWS, FEATURES, NUMERIC_BOUNDS, VACCINE_MAP, YES_NO_FEATURES, assign_tier, predict_row,
+    score_batch,
+)
+
+_COLD_LOAD = """
+import sys, time
+t0 = time.perf_counter()
+import joblib
+from utils.forest_engine import CompiledForest
+t1 = time.perf_counter()
+import sklearn.ensemble
+t2 = time.perf_counter()
+model = joblib.load(sys.argv[1])
+t3 = time.perf_counter()
+CompiledForest.from_estimator(model)
+t4 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2, t4 - t3)
+"""
+
+
+def log(msg=""):
+    print(msg, file=sys.stderr)
+
+
+def random_applicants(n, seed=0):
+    """Encoded applicant rows (FEATURES order, int64) within the form's bounds."""
+    rng = np.random.default_rng(seed)
+    cols = {}
+    for col in FEATURES:
+        if col in NUMERIC_BOUNDS:
+            lo, hi = NUMERIC_BOUNDS[col]
+            cols[col] = rng.integers(lo, hi + 1, n)
+        elif col in YES_NO_FEATURES:
+            cols[col] = rng.integers(0, 2, n)
+        else:
+            cols[col] = rng.choice(list(VACCINE_MAP.values()), n)
+    return pd.DataFrame(cols, columns=FEATURES).astype(np.int64)
+
+
+def percentiles_ms(samples):
+    arr = np.asarray(samples) * 1e3
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95)),
+            "p99_ms": float(np.percentile(arr, 99)), "mean_ms": float(arr.mean()), "n": len(arr)}
+
+
+def bench_cold_load(path, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _COLD_LOAD, path], capture_output=True,
+                             text=True, check=True, cwd=os.getcwd()).stdout.split()
+        samples.append([float(x) for x in out])
+    imports, sk_import, load, compile_ = (sorted(col)[len(col) // 2] * 1e3 for col in zip(*samples))
+    return {"import_ms": imports, "sklearn_import_ms": sk_import, "joblib_load_ms": load,
+            "compile_ms": compile_, "runs": runs}
+
+
+def bench_single_row(model, rows):
+    def submit(row):
+        prob = predict_row(model, row)
+        assign_tier(prob)
+        return prob
+
+    submit(rows[0])  # warm-up
+    samples = []
+    for row in rows:
+        t = time.perf_counter()
+        submit(row)
+        samples.append(time.perf_counter() - t)
+    return percentiles_ms(samples)
+
+
+def bench_batch(model, frame, batch_model=None, min_seconds=0.5):
+    runs, start = 0, time.perf_counter()
+    while True:
+        score_batch(model, frame, batch_model)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    per_call = elapsed / runs
+    return {"rows": len(frame), "ms_per_call": per_call * 1e3, "rows_per_s": len(frame) / per_call}
+
+
+def bench_history(n_rows, model):
+    records = score_batch(model, random_applicants(n_rows, seed=7)).to_dict("records")
+    results = {}
+    for mode in ("sync", "write_behind", "batch"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_manager.DB_PATH = os.path.join(tmp, "bench.db")
+            db_manager.init_db()
+            if mode == "write_behind":
+                db_manager.enable_write_behind()
+            start = time.perf_counter()
+            if mode == "batch":
+                db_manager.save_history_batch("bench@demo.com", records)
+            else:
+                for rec in records:
+                    db_manager.save_history("bench@demo.com", rec)
+            # call cost only: what the page waits for before rendering
+            submitted = time.perf_counter() - start
+            db_manager.disable_write_behind()
+            total = time.perf_counter() - start
+            db_manager.close_all_connections()
+        results[mode] = {"rows": n_rows, "us_per_row": submitted / n_rows * 1e6,
+                         "us_per_row_durable": total / n_rows * 1e6}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--out", default="-", help="JSON output file ('-' for stdout)")
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--single-rows", type=int, default=1000, help="rows timed per backend")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 500, 1000, 10_000, 100_000])
+    parser.add_argument("--history-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    sk_model = joblib.load(args.model)
+    backends = {"sklearn": sk_model, "compiled": CompiledForest.from_estimator(sk_model)}
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "versions": {"python": platform.python_version(), "sklearn": sklearn.__version__,
+                     "numpy": np.__version__, "pandas": pd.__version__, "joblib": joblib.__version__},
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "model": {"path": args.model, "version": model_version(args.model),
+                  "bytes": os.path.getsize(args.model), "n_estimators": len(sk_model.estimators_),
+                  "n_features": int(sk_model.n_features_in_)},
+    }
+
+    log("cold start (median of fresh interpreters)")
+    report["cold_start"] = bench_cold_load(args.model, args.cold_runs)
+    log("  import {import_ms:.0f} ms, sklearn import {sklearn_import_ms:.0f} ms, "
+        "joblib.load {joblib_load_ms:.0f} ms, compile {compile_ms:.0f} ms"
+        .format(**report["cold_start"]))
+
+    rows = random_applicants(args.single_rows, seed=1).to_dict("records")
+    frames = {n: random_applicants(n, seed=n) for n in args.batch_sizes}
+    report["single_row"], report["batch"] = {}, {}
+    for name, model in backends.items():
+        # sklearn at ~10 ms/row: cap its sample so the run stays short
+        sample = rows if name != "sklearn" else rows[:min(len(rows), 300)]
+        stats = report["single_row"][name] = bench_single_row(model, sample)
+        log(f"single row [{name}]  p50 {stats['p50_ms']:.3f}  p95 {stats['p95_ms']:.3f}  "
+            f"p99 {stats['p99_ms']:.3f} ms")
+        report["batch"][name] = []
+        for n, frame in frames.items():
+            stats = bench_batch(model, frame)
+            report["batch"][name].append(stats)
+            log(f"batch [{name}] {n:>7,} rows  {stats['ms_per_call']:>9.2f} ms  {stats['rows_per_s']:>12,.0f} rows/s")
+    report["batch"]["served"] = []
+    for n, frame in frames.items():
+        stats = bench_batch(backends["compiled"], frame, batch_model=sk_model)
+        report["batch"]["served"].append(stats)
+        log(f"batch [served] {n:>7,} rows  {stats['ms_per_call']:>9.2f} ms  {stats['rows_per_s']:>12,.0f} rows/s")
+    faster = [sk["rows"] for sk, cf in zip(report["batch"]["sklearn"], report["batch"]["compiled"])
+              if sk["ms_per_call"] < cf["ms_per_call"]]
+    report["batch_crossover_rows"] = min(faster) if faster else None
+    log(f"sklearn beats the compiled engine from {report['batch_crossover_rows']} rows "
+        f"(BATCH_MODEL_MIN_ROWS = {BATCH_MODEL_MIN_ROWS})")
+
+    report["history"] = bench_history(args.history_rows, backends["compiled"])
+    for mode, stats in report["history"].items():
+        log(f"history [{mode}]  {stats['us_per_row']:.1f} µs/row on the caller, "
+            f"{stats['us_per_row_durable']:.1f} µs/row until durable")
+
+    text = json.dumps(report, indent=1)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        log(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
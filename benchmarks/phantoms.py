@@ -0,0 +1,89 @@
+"""Deterministic synthetic chest X-ray phantoms for imaging benchmarks.
+
+Not anatomically faithful: just enough structure (bright mediastinum and
+soft tissue, two dark lung fields, rib bands, a few opacity blobs, noise)
+to exercise every stage of the opacity pipeline the same way each run.
+"""
+import numpy as np
+import cv2
+
+
+def cxr_phantom(size=512, noise=8.0, n_opacities=3, seed=0, dtype=np.uint8):
+    """Return a ``size`` x ``size`` grayscale phantom.
+
+    ``noise`` is the Gaussian noise sigma in 8-bit grey levels. With
+    ``dtype=np.uint16`` the image is scaled to 12 bits like a CR/DX study.
+    """
+    rng = np.random.default_rng(seed)
+    s = size / 512.0
+    img = np.full((size, size), 190.0, np.float32)
+
+    # Lung fields
+    lungs = np.zeros((size, size), np.uint8)
+    for cx in (0.32, 0.68):
+        cv2.ellipse(lungs, (int(cx * size), int(0.52 * size)), (int(95 * s), int(170 * s)),
+                    0, 0, 360, 255, -1)
+    img[lungs > 0] = 70.0
+
+    # Ribs: soft bright bands across the lung fields
+    yy = np.arange(size, dtype=np.float32)[:, None]
+    xx = np.arange(size, dtype=np.float32)[None, :]
+    bands = np.sin((yy + 0.15 * np.abs(xx - size / 2)) / (14.0 * s)) > 0.75
+    img[(lungs > 0) & bands] += 35.0
+
+    # Opacities: Gaussian blobs inside the lungs
+    ys, xs = np.nonzero(lungs)
+    for _ in range(n_opacities):
+        i = rng.integers(len(ys))
+        radius = rng.uniform(12, 35) * s
+        blob = np.exp(-((yy - ys[i]) ** 2 + (xx - xs[i]) ** 2) / (2 * radius ** 2))
+        img += 80.0 * blob * (lungs > 0)
+
+    img = cv2.GaussianBlur(img, (0, 0), 2.0 * s)
+    img += rng.normal(0.0, noise, img.shape).astype(np.float32)
+    img = np.clip(img, 0, 255)
+    if dtype == np.uint16:
+        return (img * (4095.0 / 255.0)).astype(np.uint16)
+    return img.astype(np.uint8)
+
+
+def encode(img, ext=".png"):
+    ok, buf = cv2.imencode(ext, img)
+    if not ok:
+        raise ValueError(f"Could not encode phantom as {ext}")
+    return buf.tobytes()
+
+
+def dicom_bytes(img, photometric="MONOCHROME2", slope=1.0, intercept=0.0):
+    """Wrap a uint8/uint16 array as an uncompressed single-frame DICOM file."""
+    import io
+    import pydicom
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"  # CR image storage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CR"
+    ds.Rows, ds.Columns = img.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = photometric
+    bits = img.dtype.itemsize * 8
+    ds.BitsAllocated = bits
+    ds.BitsStored = 12 if bits == 16 else 8
+    ds.HighBit = ds.BitsStored - 1
+    ds.PixelRepresentation = 0
+    ds.RescaleSlope = str(slope)
+    ds.RescaleIntercept = str(intercept)
+    ds.PixelData = np.ascontiguousarray(img).tobytes()
+    buf = io.BytesIO()
+    if int(pydicom.__version__.split(".")[0]) >= 3:
+        ds.save_as(buf, enforce_file_format=True)
+    else:
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+        ds.save_as(buf, write_like_original=False)
+    return buf.getvalue()
@@ -0,0 +1,133 @@
+"""Shrink the trained forest for latency and report what it costs in AUC.
+
+Builds variants of model.pkl that keep only the k best trees and/or cut
+every tree at a maximum depth, measures each on the held-out split that
+train_model.py leaves out (AUC, single-row latency, batch throughput,
+bundle size), marks the Pareto-optimal ones and writes the fastest variant
+within --max-auc-drop of the full model to model.fast.forest. Serve it with
+CARDIOCARE_MODEL_VARIANT=fast.
+
+    python compact_model.py --data enhanced_dataset.csv
+    python compact_model.py --trees 10 25 50 --depths 8 12 --max-auc-drop 0.002
+"""
+import argparse
+import json
+import sys
+import time
+
+import joblib
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from train_model import load_dataset
+from utils.forest_engine import CompiledForest, file_sha256
+from utils.scoring import FEATURES
+
+FAST_BUNDLE_PATH = "model.fast.forest"
+
+
+def rank_trees(forest, X, y):
+    """Tree indices, best first, by each tree's own AUC on (X, y)."""
+    scores = [roc_auc_score(y, forest.compact(trees=[i]).predict_proba(X)[:, 1])
+              for i in range(forest.roots.size)]
+    return list(np.argsort(scores)[::-1])
+
+
+def measure(forest, X, y, rows=300, repeat=3):
+    records = X.iloc[:rows].to_dict("records")
+    times = []
+    for r in records:
+        # best of a few calls per row, so scheduler noise doesn't reorder variants
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            forest.predict_one(r)
+            best = min(best, time.perf_counter() - t)
+        times.append(best)
+    t = time.perf_counter()
+    prob = forest.predict_proba(X)[:, 1]
+    batch = time.perf_counter() - t
+    return {
+        "auc": float(roc_auc_score(y, prob)),
+        "single_row_p50_ms": float(np.percentile(times, 50) * 1e3),
+        "batch_rows_per_s": len(X) / batch,
+        "nodes": int(forest.left.size),
+        "bytes": int(forest.nbytes),
+    }
+
+
+def pareto(variants):
+    """Flag variants no other variant beats on AUC, latency and size at once."""
+    for v in variants:
+        v["pareto"] = not any(
+            o is not v and o["auc"] >= v["auc"] and o["single_row_p50_ms"] <= v["single_row_p50_ms"]
+            and o["bytes"] <= v["bytes"]
+            and (o["auc"], -o["single_row_p50_ms"], -o["bytes"]) != (v["auc"], -v["single_row_p50_ms"], -v["bytes"])
+            for o in variants)
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact model.pkl and report AUC vs latency/size.")
+    parser.add_argument("--data", default="enhanced_dataset.csv")
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--trees", type=int, nargs="+", default=[5, 10, 20, 30, 50, 75, 100])
+    parser.add_argument("--depths", type=int, nargs="+", default=[4, 6, 8, 10, 12, 16, 0],
+                        help="depth caps to try (0 = uncapped)")
+    parser.add_argument("--max-auc-drop", type=float, default=0.005,
+                        help="largest AUC loss vs the full model accepted for the fast variant")
+    parser.add_argument("--report", default="compaction_report.json")
+    parser.add_argument("--out", default=FAST_BUNDLE_PATH)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    full = CompiledForest.from_estimator(model)
+    df = load_dataset(args.data)
+    cols = list(full.feature_names_in_) if hasattr(full, "feature_names_in_") else FEATURES
+    # Same split as train_model.py: its test fifth is unseen by every tree.
+    # Half of it ranks trees, the other half scores the variants.
+    _, X_test, _, y_test = train_test_split(df[FEATURES], df["Target"], test_size=0.2, random_state=42)
+    X_rank, X_eval, y_rank, y_eval = train_test_split(X_test[cols], y_test, test_size=0.5,
+                                                      random_state=0, stratify=y_test)
+
+    order = rank_trees(full, X_rank, y_rank)
+    n_total = full.roots.size
+    variants = []
+    # the full model is always a variant: it is what the others are judged against
+    for k in sorted({min(k, n_total) for k in args.trees} | {n_total}):
+        for depth in sorted(set(args.depths) | {0}, key=lambda d: d or 1 << 30):
+            forest = full.compact(trees=order[:k], max_depth=depth or None)
+            stats = measure(forest, X_eval, y_eval)
+            variants.append({"trees": k, "max_depth": depth or None, **stats})
+    pareto(variants)
+
+    baseline = next(v for v in variants if v["trees"] == n_total and v["max_depth"] is None)
+    eligible = [v for v in variants if v["pareto"] and v["auc"] >= baseline["auc"] - args.max_auc_drop]
+    chosen = min(eligible, key=lambda v: (v["single_row_p50_ms"], v["bytes"]))
+
+    print(f"{'trees':>5} {'depth':>5} {'AUC':>7} {'p50 ms':>7} {'rows/s':>9} {'KB':>7}")
+    for v in variants:
+        if v["pareto"]:
+            mark = "  <- fast" if v is chosen else ""
+            print(f"{v['trees']:>5} {str(v['max_depth'] or '-'):>5} {v['auc']:>7.4f} "
+                  f"{v['single_row_p50_ms']:>7.3f} {v['batch_rows_per_s']:>9,.0f} {v['bytes'] / 1024:>7.0f}{mark}")
+
+    fast = full.compact(trees=order[:chosen["trees"]], max_depth=chosen["max_depth"])
+    fast.save(args.out, metadata={
+        "source_sha256": file_sha256(args.model),
+        "training_sha256": file_sha256(args.data),
+        "variant": {"trees": [int(i) for i in order[:chosen["trees"]]], "max_depth": chosen["max_depth"],
+                    "auc": chosen["auc"], "full_auc": baseline["auc"]},
+    })
+    with open(args.report, "w") as f:
+        json.dump({"full": baseline, "chosen": chosen, "max_auc_drop": args.max_auc_drop,
+                   "eval_rows": len(X_eval), "variants": variants}, f, indent=1)
+    print(f"✅ {args.out}: {chosen['trees']} trees, depth {chosen['max_depth'] or 'uncapped'}, "
+          f"AUC {chosen['auc']:.4f} vs {baseline['auc']:.4f}, "
+          f"{baseline['single_row_p50_ms'] / chosen['single_row_p50_ms']:.1f}x faster per row. "
+          f"Report: {args.report}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Headless batch runner for the CXR opacity pipeline (no Streamlit needed).
+
+Walks a directory for PNG/JPG/DICOM files, scores them on all cores and
+appends one JSON line per image to --out. The JSONL file doubles as the
+checkpoint: rerunning the same command skips every image already in it,
+so an interrupted run resumes where it stopped.
+
+    python cxr_batch.py scans/ --out results.jsonl --csv results.csv
+    python cxr_batch.py scans/ --out results.jsonl --method percentile --pct-thresh 92
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from utils.imaging import DEFAULT_SETTINGS, analyze_cxr, init_worker
+
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".dcm", ".dicom")
+CSV_FIELDS = ["path", "error", "percent_affected", "lung_ratio", "lung_pixels",
+              "flagged_pixels", "threshold", "seconds"]
+
+_settings = None
+_overlay_dir = None
+_root = None
+
+
+def find_images(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def load_checkpoint(path, retry_errors=False):
+    """Paths already recorded in the JSONL output (a torn last line is ignored)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if retry_errors and rec.get("error"):
+                continue
+            done.add(rec["path"])
+    return done
+
+
+def _init(settings, overlay_dir, root):
+    global _settings, _overlay_dir, _root
+    init_worker()
+    _settings, _overlay_dir, _root = settings, overlay_dir, root
+
+
+def process(path):
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return {"path": path, "error": str(e), "seconds": 0.0}
+    res = analyze_cxr(os.path.basename(path), data, _settings, with_overlay=_overlay_dir is not None)
+    png = res.pop("overlay_png", None)
+    res.pop("name", None)
+    if png is not None:
+        stem = os.path.splitext(os.path.relpath(path, _root).replace(os.sep, "__"))[0]
+        try:
+            with open(os.path.join(_overlay_dir, f"{stem}_overlay.png"), "wb") as f:
+                f.write(png)
+        except OSError as e:
+            # failed rather than fatal: the run goes on and --retry-errors redoes it
+            res["error"] = f"Could not write overlay: {e}"
+    res["path"] = path
+    res["seconds"] = round(time.perf_counter() - start, 4)
+    return res
+
+
+def parse_args(argv=None):
+    d = DEFAULT_SETTINGS
+    p = argparse.ArgumentParser(description="Batch CXR opacity scoring with resumable JSONL output.")
+    p.add_argument("input_dir")
+    p.add_argument("--out", required=True, help="JSONL results file (also the resume checkpoint)")
+    p.add_argument("--csv", help="also append results to this CSV file")
+    p.add_argument("--overlays", help="directory to write overlay PNGs into")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunksize", type=int, default=8, help="images handed to a worker at a time")
+    p.add_argument("--retry-errors", action="store_true", help="reprocess images that failed last time")
+    p.add_argument("--method", choices=["zscore", "percentile"], default=d["method"])
+    p.add_argument("--z-thresh", type=float, default=d["z_thresh"])
+    p.add_argument("--pct-thresh", type=float, default=d["pct_thresh"])
+    p.add_argument("--min-region", type=int, default=d["min_region"])
+    p.add_argument("--mask-pad", type=int, default=d["mask_pad"])
+    p.add_argument("--target", type=int, default=d["target_size"], choices=[384, 448, 512, 640])
+    p.add_argument("--alpha", type=float, default=d["alpha"])
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = {
+        "method": args.method, "z_thresh": args.z_thresh, "pct_thresh": args.pct_thresh,
+        "min_region": args.min_region, "mask_pad": args.mask_pad, "alpha": args.alpha,
+        "target_size": args.target,
+    }
+    if args.overlays:
+        os.makedirs(args.overlays, exist_ok=True)
+
+    done = load_checkpoint(args.out, retry_errors=args.retry_errors)
+    todo = [p for p in find_images(args.input_dir) if p not in done]
+    print(f"{len(done):,} already done, {len(todo):,} to process with {args.workers} worker(s)")
+    if not todo:
+        return 0
+
+    csv_file = writer = None
+    if args.csv:
+        new_csv = not os.path.exists(args.csv) or os.path.getsize(args.csv) == 0
+        csv_file = open(args.csv, "a", newline="", encoding="utf-8")
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_csv:
+            writer.writeheader()
+
+    failed = 0
+    start = last_report = time.perf_counter()
+    with open(args.out, "a", encoding="utf-8") as out, multiprocessing.Pool(
+            args.workers, initializer=_init, initargs=(settings, args.overlays, args.input_dir)) as pool:
+        try:
+            for n, res in enumerate(pool.imap_unordered(process, todo, chunksize=args.chunksize), start=1):
+                out.write(json.dumps(res) + "\n")
+                out.flush()
+                if writer:
+                    writer.writerow(res)
+                failed += bool(res.get("error"))
+                now = time.perf_counter()
+                if now - last_report >= 5 or n == len(todo):
+                    rate = n / (now - start)
+                    eta = (len(todo) - n) / rate if rate else 0
+                    print(f"{n:,}/{len(todo):,} images  {rate:.1f} img/s  ETA {eta/60:.1f} min", flush=True)
+                    last_report = now
+        except KeyboardInterrupt:
+            pool.terminate()
+            print("Interrupted; rerun the same command to resume.", file=sys.stderr)
+            return 130
+        finally:
+            if csv_file:
+                csv_file.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {len(todo):,} images in {elapsed:.1f}s ({len(todo) / elapsed:.1f} img/s), {failed:,} failed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
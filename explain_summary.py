@@ -0,0 +1,87 @@
+"""Regenerate shap_summary.png from a random sample of stored predictions.
+
+Attributions come from the same path explainer the Predict page shows per
+prediction (utils/explain.py), computed in one batch over rows sampled
+from prediction_history, so the global picture reflects who actually uses
+the app rather than the training set. Needs matplotlib for the plot
+(pip install matplotlib); the mean |contribution| table is always printed.
+
+    python explain_summary.py --sample 5000
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from utils.db_manager import ensure_schema, sample_history
+from utils.explain import PathExplainer
+from utils.forest_engine import CompiledForest
+from utils.scoring import FEATURES
+
+
+def load_forest(model_path, bundle_path):
+    try:
+        return CompiledForest.load(bundle_path)
+    except FileNotFoundError:
+        import joblib
+        return CompiledForest.from_estimator(joblib.load(model_path))
+
+
+def plot_summary(names, phi, values, path, max_features=12):
+    """SHAP-style beeswarm: one row per feature, colored by the feature's value."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise SystemExit("matplotlib is needed to draw the summary: pip install matplotlib")
+
+    order = np.argsort(np.abs(phi).mean(axis=0))[::-1][:max_features][::-1]
+    rng = np.random.default_rng(0)
+    fig, ax = plt.subplots(figsize=(8, 0.45 * len(order) + 1.5))
+    for y, j in enumerate(order):
+        v = values[:, j].astype(float)
+        span = v.max() - v.min()
+        color = (v - v.min()) / span if span else np.full_like(v, 0.5)
+        ax.scatter(phi[:, j], y + rng.uniform(-0.3, 0.3, len(v)), c=color, cmap="coolwarm",
+                   s=6, alpha=0.6, linewidths=0)
+    ax.axvline(0, color="grey", linewidth=0.8)
+    ax.set_yticks(range(len(order)))
+    ax.set_yticklabels([names[j] for j in order])
+    ax.set_xlabel("Contribution to risk score")
+    ax.set_title(f"Feature contributions over {len(phi):,} sampled predictions")
+    cbar = fig.colorbar(plt.cm.ScalarMappable(cmap="coolwarm"), ax=ax, ticks=[0, 1], pad=0.01)
+    cbar.ax.set_yticklabels(["Low", "High"])
+    cbar.set_label("Feature value")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the global feature-contribution summary.")
+    parser.add_argument("--sample", type=int, default=5000, help="history rows to sample")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--bundle", default="model.forest")
+    parser.add_argument("--out", default="shap_summary.png")
+    args = parser.parse_args()
+
+    ensure_schema()  # the history tables may predate the last migration
+    forest = load_forest(args.model, args.bundle)
+    names = list(forest.feature_names_in_)
+    rows = sample_history(args.sample, columns=FEATURES, seed=args.seed)
+    if not rows:
+        raise SystemExit("No stored predictions to summarize yet.")
+    X = np.asarray(rows, dtype=np.float32)[:, [FEATURES.index(n) for n in names]]
+    phi = PathExplainer(forest).explain(X)
+
+    print(f"Mean |contribution| over {len(X):,} sampled predictions:")
+    for j in np.argsort(np.abs(phi).mean(axis=0))[::-1]:
+        print(f"  {names[j]:<20} {np.abs(phi[:, j]).mean():.4f}")
+    plot_summary(names, phi, X, args.out)
+    print(f"✅ Saved {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
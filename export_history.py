@@ -0,0 +1,179 @@
+"""Incremental columnar export of prediction_history for analytics.
+
+Streams the table in primary-key chunks into Parquet (or Arrow IPC) files
+partitioned by month, with compact typed columns (int8 flags, int16
+vitals, timestamps, dictionary-encoded strings in Parquet):
+
+    exports/history/month=2025-08/part-000000000001.parquet
+
+The highest exported id is stored in _watermark.json in the output
+directory, and the next run only reads rows above it, so a nightly run
+costs what was added that day rather than the whole table. Months moved
+to user_history_archive/ by archive_history.py are read from there, so a
+--full re-export (or a first export made after archiving) still covers
+them. A run writes one file per month it touches, named after its first
+id, and moves the watermark only after every file is complete; a crashed
+run is simply redone and overwrites its own partial output. Needs pyarrow.
+
+    python export_history.py --out exports/history
+    python export_history.py --out exports/history --full   # re-export everything
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # checked in main() so --help still works
+    pa = None
+
+from utils import db_manager
+from utils.db_manager import HISTORY_COLUMNS, iter_history_since
+
+WATERMARK_FILE = "_watermark.json"
+
+
+def history_schema(fmt="parquet"):
+    i8, i16 = pa.int8(), pa.int16()
+    # Arrow IPC files allow one dictionary per column for the whole file, but
+    # every chunk builds its own, so IPC gets plain strings
+    text = pa.dictionary(pa.int32(), pa.string()) if fmt == "parquet" else pa.string()
+    types = {
+        "id": pa.int64(), "email": text, "timestamp": pa.timestamp("s"),
+        "Age": i16, "RestingBP": i16, "Cholesterol": i16, "MaxHR": i16,
+        "Diabetes": i8, "Hypertension": i8, "Heart_Condition": i8, "Vaccinated": i8,
+        "Hospitalized": i8, "Vaccine_Type": i8, "Doses": i8, "Days_Since_Vaccine": i16,
+        "Risk_Score": pa.float64(), "Prediction": i8, "Tier": text, "Coverage": text, "Premium": text,
+    }
+    return pa.schema([(name, types[name]) for name in HISTORY_COLUMNS])
+
+
+def to_table(rows, schema):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == "timestamp":
+            arrays.append(pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s"))
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class PartitionWriters:
+    """One open writer per month partition, written to temp names until close()."""
+
+    def __init__(self, out_dir, schema, fmt, first_id):
+        self.out_dir, self.schema, self.fmt = out_dir, schema, fmt
+        self.name = f"part-{first_id:012d}.{'parquet' if fmt == 'parquet' else 'arrow'}"
+        self._writers = {}
+
+    def write(self, month, table):
+        if month not in self._writers:
+            part_dir = os.path.join(self.out_dir, f"month={month}")
+            os.makedirs(part_dir, exist_ok=True)
+            tmp = os.path.join(part_dir, self.name + ".tmp")
+            if self.fmt == "parquet":
+                writer = pq.ParquetWriter(tmp, self.schema, compression="zstd")
+            else:
+                writer = ipc.new_file(tmp, self.schema)
+            self._writers[month] = (writer, tmp)
+        self._writers[month][0].write_table(table)
+
+    def abort(self):
+        for writer, tmp in self._writers.values():
+            writer.close()
+            os.remove(tmp)
+
+    def close(self):
+        """Finish every file and move it into place; returns the months written."""
+        for writer, tmp in self._writers.values():
+            writer.close()
+        for writer, tmp in self._writers.values():
+            os.replace(tmp, tmp[:-len(".tmp")])
+        return sorted(self._writers)
+
+
+def read_watermark(out_dir):
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": 0}
+
+
+def write_watermark(out_dir, state):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def export(out_dir, fmt="parquet", chunk_size=50_000, full=False):
+    """Export rows added since the watermark; returns (rows, months, last_id)."""
+    os.makedirs(out_dir, exist_ok=True)
+    for leftover in glob.glob(os.path.join(out_dir, "month=*", "*.tmp")):
+        os.remove(leftover)
+    state = {"last_id": 0} if full else read_watermark(out_dir)
+    schema = history_schema(fmt)
+    writers = PartitionWriters(out_dir, schema, fmt, state["last_id"] + 1)
+    rows_written, last_id = 0, state["last_id"]
+    try:
+        for rows in iter_history_since(state["last_id"], chunk_size=chunk_size, include_archive=True):
+            table = to_table(rows, schema)
+            months = pc.strftime(table["timestamp"], format="%Y-%m")
+            for month in pc.unique(months).to_pylist():
+                writers.write(month, table.filter(pc.equal(months, month)))
+            rows_written += len(rows)
+            last_id = max(last_id, rows[-1][0])
+    except BaseException:
+        writers.abort()
+        raise
+    months = writers.close()
+    if full:
+        # a full export replaces earlier incremental parts instead of duplicating them
+        for path in glob.glob(os.path.join(out_dir, "month=*", "part-*")):
+            if os.path.basename(path) != writers.name:
+                os.remove(path)
+    if rows_written:
+        write_watermark(out_dir, {
+            "last_id": last_id, "exported_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "rows_last_run": rows_written, "rows_total": (0 if full else state.get("rows_total", 0)) + rows_written,
+            "format": fmt,
+        })
+    return rows_written, months, last_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export prediction_history to month-partitioned Parquet/Arrow.")
+    parser.add_argument("--out", default=os.path.join("exports", "history"))
+    parser.add_argument("--db", default=db_manager.DB_PATH)
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows fetched per query")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export every row")
+    args = parser.parse_args()
+    if pa is None:
+        raise SystemExit("pyarrow is needed for the export: pip install pyarrow")
+
+    db_manager.DB_PATH = args.db
+    db_manager.ensure_schema()  # the history tables may predate the last migration
+    start = time.perf_counter()
+    rows, months, last_id = export(args.out, args.format, args.chunk_size, args.full)
+    elapsed = time.perf_counter() - start
+    if rows:
+        print(f"✅ Exported {rows:,} rows up to id {last_id:,} into {len(months)} month(s) "
+              f"({', '.join(months)}) in {elapsed:.1f}s")
+    else:
+        print(f"Nothing new since id {last_id:,}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
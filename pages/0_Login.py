@@ -1,10 +1,11 @@
 # pages/0_Login.py
 import streamlit as st
-from utils.db_manager import init_user_db, init_db, create_user, authenticate_user
+from utils import metrics
+from utils.db_manager import ensure_schema, create_user, authenticate_user
 
-# init (idempotent)
-init_user_db()
-init_db()
+# Creates/upgrades the DB on the first run in this process; a no-op afterwards
+ensure_schema()
+metrics.start_exporter()
 
 st.title("🔐 Login or Sign Up")
 
@@ -1,8 +1,13 @@
 # pages/1_Predict.py
 import streamlit as st
-import pandas as pd
-import joblib
-from utils.db_manager import save_history
+import time
+from utils import metrics
+from utils.db_manager import ensure_schema, save_history, save_history_batch
+from utils.model_store import BUNDLE_PATH, MODEL_PATH, load_batch_model, load_explainer, load_model
+from utils.prediction_cache import PREDICTION_CACHE, model_version
+from utils.scoring import (
+    BATCH_MODEL_MIN_ROWS, CSV_READ_OPTIONS, FEATURES, VACCINE_MAP, assign_tier, predict_row, score_batch, validate_batch
+)
 
 st.title("🔍 Post-COVID Heart Risk & Insurance Estimator")
 
@@ -12,20 +17,79 @@ if not st.session_state.get("logged_in", False):
     st.stop()
 
 email = st.session_state.get("email", "guest@demo.com")
+ensure_schema()
+metrics.start_exporter()
 
-# Lazy-load model with helpful error
-@st.cache_resource(show_spinner=False)
-def load_model(path="model.pkl"):
-    return joblib.load(path)
-
+# Loaded once per process (Home.py starts this in the background); `version`
+# is part of the cache key, so a rewritten model file is reloaded.
 try:
-    model = load_model("model.pkl")
+    version = model_version(MODEL_PATH, BUNDLE_PATH)
+    model = load_model(MODEL_PATH, BUNDLE_PATH, version)
+    PREDICTION_CACHE.set_version(version)
 except Exception as e:
     st.error(f"Failed to load `model.pkl`. Details: {e}")
-    st.info("Confirm scikit-learn/joblib versions match those used when saving the model.")
+    st.info("Confirm scikit-learn/joblib versions match those used when saving the model, "
+            "or run `python train_model.py --export-only` to write model.forest.")
     st.stop()
 
-vaccine_map = {"Covaxin": 0, "Covishield": 1, "Pfizer": 2, "None": 3}
+explainer = load_explainer(model, version)
+
+vaccine_map = VACCINE_MAP
+
+mode = st.radio("Mode", ["Single entry", "Batch CSV"], horizontal=True)
+
+if mode == "Batch CSV":
+    st.subheader("📄 Batch scoring")
+    st.caption(
+        "Upload a CSV with one applicant per row and these columns: "
+        + ", ".join(f"`{c}`" for c in FEATURES)
+        + ". Yes/No columns accept Yes/No or 1/0; `Vaccine_Type` accepts the vaccine name or its code."
+    )
+    batch_file = st.file_uploader("Upload applicants CSV", type=["csv"])
+    if not batch_file:
+        st.stop()
+
+    import pandas as pd
+    try:
+        raw = pd.read_csv(batch_file, **CSV_READ_OPTIONS)
+        encoded, errors = validate_batch(raw)
+    except Exception as e:
+        st.error(f"Could not read this CSV: {e}")
+        st.stop()
+
+    if errors:
+        st.warning(f"⚠️ Skipped {len(errors):,} invalid row(s).")
+        with st.expander("Show rejected rows"):
+            st.text("\n".join(errors[:500]) + ("\n…" if len(errors) > 500 else ""))
+    if encoded.empty:
+        st.error("No valid rows to score.")
+        st.stop()
+
+    with_contrib = st.checkbox("Add per-feature contributions to the scored CSV", value=False)
+    if st.button(f"🔍 Score {len(encoded):,} applicants"):
+        # large uploads go to the sklearn estimator, which is faster past the crossover
+        batch_model = load_batch_model(model, MODEL_PATH, version) if len(encoded) >= BATCH_MODEL_MIN_ROWS else None
+        results = score_batch(model, encoded, batch_model)
+        if with_contrib:
+            phi = explainer.explain(encoded)
+            for j, name in enumerate(explainer.feature_names):
+                results[f"Contrib_{name}"] = phi[:, j]
+        saved = save_history_batch(email, results.to_dict("records"))
+
+        m1, m2, m3 = st.columns(3)
+        with m1:
+            st.metric("Scored", f"{len(results):,}")
+        with m2:
+            st.metric("High risk", f"{int(results['Prediction'].sum()):,}")
+        with m3:
+            st.metric("Mean risk score", f"{results['Risk_Score'].mean():.2f}")
+        st.dataframe(results["Tier"].value_counts().rename("Applicants"), use_container_width=True)
+        st.dataframe(results, use_container_width=True)
+        st.success(f"✅ Saved {saved:,} predictions to your history.")
+
+        csv = results.to_csv(index=False).encode("utf-8")
+        st.download_button("⬇️ Download scored CSV", data=csv, file_name="scored_applicants.csv", mime="text/csv")
+    st.stop()
 
 with st.form("risk_form"):
     st.subheader("🧑‍⚕️ Basic Health Information")
@@ -65,20 +129,12 @@ if submit:
         "Days_Since_Vaccine": days_since_vaccine
     }
 
-    if hasattr(model, "feature_names_in_"):
-        input_df = pd.DataFrame([row], columns=model.feature_names_in_)
-    else:
-        input_df = pd.DataFrame([row])
-
-    prob = float(model.predict_proba(input_df)[0][1])
+    # All inputs are bounded ints/categories, so repeat submissions hit the cache
+    key = (version, tuple(row[f] for f in FEATURES))
+    prob = PREDICTION_CACHE.get_or_compute(key, lambda: predict_row(model, row))
     pred = 1 if prob > 0.5 else 0
 
-    if prob > 0.75:
-        tier, coverage, premium = "🚨 Premium", "₹2 – ₹5 Lakh", "₹10,000+"
-    elif prob > 0.4:
-        tier, coverage, premium = "⚠️ Standard", "₹5 – ₹10 Lakh", "₹6,000 – ₹9,000"
-    else:
-        tier, coverage, premium = "✅ Basic", "₹10 – ₹15 Lakh", "₹4,000 – ₹6,000"
+    tier, coverage, premium = assign_tier(prob)
 
     if pred == 1:
         st.markdown(f"""
@@ -106,6 +162,24 @@ if submit:
     </div>
     """, unsafe_allow_html=True)
 
+    import pandas as pd
+    start = time.perf_counter()
+    contrib = pd.Series(explainer.explain_one(row), index=explainer.feature_names)
+    explain_ms = (time.perf_counter() - start) * 1e3
+    contrib = contrib.reindex(contrib.abs().sort_values(ascending=False).index)
+    st.subheader("🔎 What drove this score")
+    st.bar_chart(contrib.rename("Contribution to risk score"))
+    up = [f"{name} (+{v:.2f})" for name, v in contrib.items() if v >= 0.01][:3]
+    down = [f"{name} ({v:.2f})" for name, v in contrib.items() if v <= -0.01][:3]
+    st.markdown(
+        (f"**Raised your score:** {', '.join(up)}  \n" if up else "")
+        + (f"**Lowered your score:** {', '.join(down)}" if down else "")
+    )
+    st.caption(
+        f"Contributions start from the average score {explainer.base_value:.2f} and add up to "
+        f"{explainer.base_value + contrib.sum():.2f} (tree-path attribution, {explain_ms:.1f} ms)."
+    )
+
     out = dict(row)
     out.update({
         "Risk_Score": prob,
@@ -115,3 +189,9 @@ if submit:
         "Premium": premium
     })
     save_history(email, out)
+
+    stats = PREDICTION_CACHE.stats()
+    st.caption(
+        f"Prediction cache: {stats['hits']:,} hits / {stats['misses']:,} misses "
+        f"({stats['hit_rate']:.0%} hit rate, {stats['size']:,}/{stats['maxsize']:,} entries)"
+    )
@@ -1,16 +1,18 @@
 # pages/2_Imaging_Beta_CXR.py
+import importlib.util
 import io
-import numpy as np
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 import streamlit as st
+from utils import metrics
 
-# Optional imaging deps
-try:
-    import cv2
-    from skimage import measure
-    import pydicom
-    _IMAGING_READY = True
-except Exception:
-    _IMAGING_READY = False
+# Optional imaging deps: only checked for here; OpenCV and pydicom are imported
+# once there is an upload to analyze, so opening the page stays fast
+_IMAGING_READY = all(importlib.util.find_spec(m) is not None for m in ("cv2", "pydicom"))
+
+metrics.start_exporter()
 
 st.title("🫁 Imaging (beta): Post-COVID Lung Opacities (heuristic)")
 
@@ -29,95 +31,21 @@ if not _IMAGING_READY:
     st.stop()
 
 # ---------- Utils ----------
-def read_cxr_file(uploaded_file):
-    name = uploaded_file.name.lower()
-    data = uploaded_file.read()
-    if name.endswith((".dcm", ".dicom")):
-        ds = pydicom.dcmread(io.BytesIO(data))
-        arr = ds.pixel_array.astype(np.float32)
-        slope = float(getattr(ds, "RescaleSlope", 1.0))
-        intercept = float(getattr(ds, "RescaleIntercept", 0.0))
-        arr = arr * slope + intercept
-        photometric = getattr(ds, "PhotometricInterpretation", "MONOCHROME2")
-        if photometric and str(photometric).upper() == "MONOCHROME1":
-            arr = arr.max() - arr
-        img = arr
-    else:
-        img_gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
-        if img_gray is None:
-            raise ValueError("Unsupported or corrupted image file.")
-        img = img_gray.astype(np.float32)
-    img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-    return img
-
-def preprocess(img, target=512):
-    img = cv2.resize(img, (target, target), interpolation=cv2.INTER_AREA)
-    img = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)).apply(img)
-    img = cv2.medianBlur(img, 3)
-    return img
-
-def lung_mask_quick(img):
-    inv = cv2.bitwise_not(img)
-    _, th = cv2.threshold(inv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    th = cv2.morphologyEx(th, cv2.MORPH_OPEN, np.ones((5,5), np.uint8), iterations=2)
-    num, labels, stats, _ = cv2.connectedComponentsWithStats(th, connectivity=8)
-    if num <= 1:
-        return np.zeros_like(img, dtype=np.uint8)
-    areas = [(i, stats[i, cv2.CC_STAT_AREA]) for i in range(1, num)]
-    areas.sort(key=lambda x: x[1], reverse=True)
-    keep = [i for i,_ in areas[:2]]
-    mask = np.isin(labels, keep).astype(np.uint8) * 255
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9,9), np.uint8), iterations=1)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_DILATE, np.ones((5,5), np.uint8), iterations=1)
-    return mask
-
-def abnormal_map_zscore(img, lung_mask, z_thresh=1.0, min_region_px=300):
-    """Bright-abnormal mask using Z-score within lung pixels."""
-    lung_pixels = img[lung_mask > 0].astype(np.float32)
-    if lung_pixels.size < 1000:
-        return np.zeros_like(img, dtype=np.uint8), None
-    mu = float(lung_pixels.mean())
-    sd = float(lung_pixels.std() + 1e-6)
-    z = (cv2.GaussianBlur(img, (0,0), 1.0).astype(np.float32) - mu) / sd
-    abn = np.zeros_like(img, dtype=np.uint8)
-    abn[(z > float(z_thresh)) & (lung_mask > 0)] = 255
-
-    abn = cv2.morphologyEx(abn, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=1)
-    abn = cv2.morphologyEx(abn, cv2.MORPH_CLOSE, np.ones((5,5), np.uint8), iterations=1)
-
-    lab = measure.label(abn > 0, connectivity=2)
-    cleaned = np.zeros_like(abn)
-    for region in measure.regionprops(lab):
-        if region.area >= int(min_region_px):
-            cleaned[lab == region.label] = 255
-    return cleaned, {"mean": mu, "std": sd, "z_thresh": z_thresh}
-
-def abnormal_map_percentile(img, lung_mask, pct_thresh=90, min_region_px=300):
-    """Bright-abnormal mask using intensity percentile within lung pixels."""
-    lung_vals = img[lung_mask > 0].astype(np.float32)
-    if lung_vals.size < 1000:
-        return np.zeros_like(img, dtype=np.uint8), None
-    thr = float(np.percentile(lung_vals, pct_thresh))
-    abn = np.zeros_like(img, dtype=np.uint8)
-    abn[(img >= thr) & (lung_mask > 0)] = 255
-
-    abn = cv2.morphologyEx(abn, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=1)
-    abn = cv2.morphologyEx(abn, cv2.MORPH_CLOSE, np.ones((5,5), np.uint8), iterations=1)
-
-    lab = measure.label(abn > 0, connectivity=2)
-    cleaned = np.zeros_like(abn)
-    for region in measure.regionprops(lab):
-        if region.area >= int(min_region_px):
-            cleaned[lab == region.label] = 255
-    return cleaned, {"pct_thresh": pct_thresh, "intensity_thr": thr}
-
-def color_overlay(gray_0_255, heat_0_255, alpha=0.45):
-    gray_rgb = cv2.cvtColor(gray_0_255, cv2.COLOR_GRAY2BGR)
-    color = cv2.applyColorMap(heat_0_255, cv2.COLORMAP_JET)
-    return cv2.addWeighted(gray_rgb, 1.0, color, float(alpha), 0.0)
-
-def pct(n, d): 
-    return float(n) * 100.0 / float(d) if d > 0 else 0.0
+@st.cache_resource(show_spinner=False)
+def get_process_pool():
+    # spawn: forking the multi-threaded Streamlit server is not safe
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 2,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker)
+
+STAGE_CACHE_BYTES = 96 * 1024 * 1024  # per session
+
+def upload_digest(uploaded):
+    # Hash each upload once; reruns reuse the digest via Streamlit's file_id
+    digests = st.session_state.setdefault("imaging_digests", {})
+    if uploaded.file_id not in digests:
+        digests[uploaded.file_id] = content_digest(uploaded.getvalue())
+    return digests[uploaded.file_id]
 
 # ---------- Controls ----------
 with st.sidebar:
@@ -140,23 +68,147 @@ with st.sidebar:
     target_size = st.select_slider("Working resolution", options=[384, 448, 512, 640], value=512)
     debug = st.toggle("Show debug details", value=False)
 
-uploaded = st.file_uploader(
-    "Upload chest X-ray", type=["png","jpg","jpeg","dcm","dicom"], accept_multiple_files=False
+uploads = st.file_uploader(
+    "Upload chest X-ray(s)", type=["png","jpg","jpeg","dcm","dicom","zip"], accept_multiple_files=True
 )
-if not uploaded:
-    st.info("Supported: PNG, JPG/JPEG, DICOM. For CT series, use a representative slice for now.")
+if not uploads:
+    st.info("Supported: PNG, JPG/JPEG, DICOM. Drop several files to process them as a batch. "
+            "For CT series, upload a multi-frame DICOM or a ZIP of slices.")
     st.stop()
 
-# ---------- Run ----------
 try:
-    img_raw = read_cxr_file(uploaded)
-    img = preprocess(img_raw, target=target_size)
-    lung = lung_mask_quick(img)
+    from utils.imaging import STAGES, analyze_cxr, init_worker, measure_masks, run_stages
+    from utils.series import SeriesSummary, analyze_series, is_series, series_length
+    from utils.stage_cache import StageCache, content_digest
+except Exception as e:
+    st.error(f"Could not load the imaging pipeline: {e}")
+    st.stop()
 
-    # Optional padding of lung mask to include periphery
-    if mask_pad > 0:
-        kernel = np.ones((mask_pad, mask_pad), np.uint8)
-        lung = cv2.dilate(lung, kernel, iterations=1)
+settings = {
+    "method": "zscore" if method.startswith("Z-score") else "percentile",
+    "z_thresh": z_thresh,
+    "pct_thresh": pct_thresh,
+    "min_region": int(min_region),
+    "mask_pad": int(mask_pad),
+    "alpha": float(alpha),
+    "target_size": int(target_size),
+}
+
+# ---------- Batch (multi-file) ----------
+if len(uploads) > 1:
+    st.subheader(f"Batch: {len(uploads)} studies")
+    # Results are kept for this exact set of uploads and settings, so reruns
+    # (e.g. the one the download button triggers) don't reprocess the batch
+    batch_key = (tuple(f.file_id for f in uploads), tuple(sorted(settings.items())))
+    batch = st.session_state.get("imaging_batch")
+    if batch is None or batch["key"] != batch_key:
+        progress = st.progress(0.0, text="Queued…")
+        table = st.empty()
+        rows, overlays = [], []
+        try:
+            pool = get_process_pool()
+            futures = {pool.submit(analyze_cxr, f.name, f.getvalue(), settings): i
+                       for i, f in enumerate(uploads, start=1)}
+        except Exception as e:
+            st.error(f"Could not start the worker pool: {e}")
+            st.stop()
+        # Results stream into the table in completion order
+        for done, fut in enumerate(as_completed(futures), start=1):
+            res = fut.result()
+            if res["error"]:
+                rows.append({"File": res["name"], "Lung affected %": None, "Lung ratio %": None,
+                             "Flagged pixels": None, "Error": res["error"]})
+            else:
+                rows.append({"File": res["name"], "Lung affected %": round(res["percent_affected"], 1),
+                             "Lung ratio %": round(res["lung_ratio"] * 100.0, 1),
+                             "Flagged pixels": res["flagged_pixels"], "Error": ""})
+                if res["overlay_png"] is not None:
+                    overlays.append((futures[fut], res["name"], res["overlay_png"]))
+            table.dataframe(rows, use_container_width=True)
+            progress.progress(done / len(futures), text=f"Processed {done}/{len(futures)}")
+        overlay_zip = None
+        if overlays:
+            zbuf = io.BytesIO()
+            with zipfile.ZipFile(zbuf, "w", zipfile.ZIP_STORED) as zf:  # PNGs are already compressed
+                # upload index in the name: two uploads may share a file name
+                for index, name, png in sorted(overlays, key=lambda o: o[0]):
+                    zf.writestr(f"{index:03d}_{os.path.splitext(name)[0]}_overlay.png", png)
+            overlay_zip = zbuf.getvalue()
+        batch = st.session_state["imaging_batch"] = {"key": batch_key, "rows": rows, "zip": overlay_zip}
+    else:
+        st.dataframe(batch["rows"], use_container_width=True)
+
+    failed = sum(1 for r in batch["rows"] if r["Error"])
+    if failed:
+        st.warning(f"⚠️ {failed} file(s) could not be processed.")
+    if batch["zip"] is not None:
+        st.download_button("⬇️ Download all overlays (ZIP)", data=batch["zip"],
+                           file_name="cxr_overlays.zip", mime="application/zip")
+    st.stop()
+
+uploaded = uploads[0]
+
+# ---------- Series (multi-frame DICOM / ZIP of slices) ----------
+try:
+    series = is_series(uploaded.name, uploaded.getvalue())
+except Exception as e:
+    st.error(f"Could not read this file: {e}")
+    st.stop()
+
+if series:
+    st.subheader(f"Series: {uploaded.name}")
+    total = max(series_length(uploaded.name, uploaded.getvalue()), 1)
+    progress = st.progress(0.0, text="Reading slices…")
+    table = st.empty()
+    summary = SeriesSummary()
+    rows = []
+    try:
+        # One slice in memory at a time; only scalar metrics are kept per slice
+        for res in analyze_series(uploaded.name, uploaded.getvalue(), settings):
+            summary.add(res)
+            rows.append({"Slice": res["slice"],
+                         "Lung affected %": None if res["error"] else round(res["percent_affected"], 2),
+                         "Lung pixels": None if res["error"] else res["lung_pixels"],
+                         "Flagged pixels": None if res["error"] else res["flagged_pixels"],
+                         "Error": res["error"] or ""})
+            progress.progress(min(summary.slices / total, 1.0), text=f"Processed {summary.slices} slice(s)")
+            if summary.slices % 10 == 0:
+                table.dataframe(rows, use_container_width=True)
+    except Exception as e:
+        st.error(f"Could not process this series: {e}")
+        st.stop()
+    progress.progress(1.0, text=f"Processed {summary.slices} slice(s)")
+    table.dataframe(rows, use_container_width=True)
+
+    vol = summary.as_dict()
+    m1, m2, m3, m4 = st.columns(4)
+    with m1:
+        st.metric("Volume affected", f"{vol['volume_percent_affected']:.1f}%")
+    with m2:
+        st.metric("Mean per slice", f"{vol['mean_slice_percent']:.1f}%")
+    with m3:
+        st.metric("Worst slice", f"{vol['max_slice_percent']:.1f}%")
+    with m4:
+        st.metric("Slices with findings", f"{vol['slices_with_findings']}/{vol['slices'] - vol['failed']}")
+    if vol["failed"]:
+        st.warning(f"⚠️ {vol['failed']} slice(s) could not be processed.")
+    st.caption("Volume affected = flagged pixels ÷ lung pixels summed over all slices.")
+    if summary.worst_overlay is not None:
+        st.image(summary.worst_overlay, use_container_width=True,
+                 caption=f"Worst slice: {vol['worst_slice']} (overlay)")
+        st.download_button("⬇️ Download worst-slice overlay PNG", data=summary.worst_overlay,
+                           file_name="cxr_series_worst_overlay.png", mime="image/png")
+    if debug:
+        st.write(vol)
+    st.stop()
+
+# ---------- Run ----------
+try:
+    # Stages are memoized per session: a slider change only recomputes what depends on it
+    cache = st.session_state.setdefault("imaging_stage_cache", StageCache(max_bytes=STAGE_CACHE_BYTES))
+    result = run_stages(cache, upload_digest(uploaded), uploaded.getvalue, uploaded.name, settings)
+    img, lung, abn, overlay = result["img"], result["lung"], result["abn"], result["overlay"]
+    threshold_expl = result["threshold"]
 
     # Sanity check on mask size (too small = under-segmentation → % affected looks small)
     total_pixels = img.size
@@ -169,17 +221,6 @@ try:
             "or use a higher working resolution."
         )
 
-    # Abnormal map via chosen method
-    if method.startswith("Z-score"):
-        abn, info = abnormal_map_zscore(img, lung, z_thresh=z_thresh, min_region_px=min_region)
-        threshold_expl = f"Z-score > {info['z_thresh']:.2f} (mean={info['mean']:.1f}, std={info['std']:.1f})" if info else "n/a"
-    else:
-        abn, info = abnormal_map_percentile(img, lung, pct_thresh=pct_thresh, min_region_px=min_region)
-        threshold_expl = f"Top {info['pct_thresh']}% brightest (intensity ≥ {info['intensity_thr']:.1f})" if info else "n/a"
-
-    heat = cv2.normalize(abn, None, 0, 255, cv2.NORM_MINMAX)
-    overlay = color_overlay(img, heat, alpha=alpha)
-
     c1, c2, c3 = st.columns(3)
     with c1:
         st.image(img, clamp=True, use_container_width=True, caption="Input (processed)")
@@ -189,9 +230,10 @@ try:
         st.image(overlay, channels="BGR", use_container_width=True, caption="Opacity Map (overlay)")
 
     # Metrics & explanation
-    total_lung = int((lung > 0).sum())
-    total_abn = int((abn > 0).sum())
-    percent_affected = pct(total_abn, total_lung)
+    metrics = measure_masks(img, lung, abn)
+    total_lung = metrics["lung_pixels"]
+    total_abn = metrics["flagged_pixels"]
+    percent_affected = metrics["percent_affected"]
 
     st.markdown("---")
     st.subheader("Quantitative cues (heuristic)")
@@ -224,13 +266,16 @@ try:
             "min_region_px": int(min_region),
             "mask_padding_px": int(mask_pad),
             "working_resolution": int(target_size),
+            "stage_cache": cache.stats(),
+            # this rerun only: stages served from the cache cost nothing
+            "stage_ms": {name: round(result["stage_ms"][name], 2) if name in result["stage_ms"] else "cached"
+                         for name in STAGES},
         })
 
     # Download overlay
-    out_rgb = cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB)
-    ok, buf = cv2.imencode(".png", out_rgb)
-    if ok:
-        st.download_button("⬇️ Download overlay PNG", data=buf.tobytes(), file_name="cxr_overlay.png", mime="image/png")
+    png = result["overlay_png"]
+    if png is not None:
+        st.download_button("⬇️ Download overlay PNG", data=png, file_name="cxr_overlay.png", mime="image/png")
 
     st.info(
         "Interpretation tips:\n"
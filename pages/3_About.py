@@ -20,7 +20,7 @@ st.markdown("""
 - **What it does:** Uses features like Age, Blood Pressure, Cholesterol, Diabetes/Hypertension history, Vaccination, etc., to estimate a probability of heart-related complications post-COVID.
 - **Model (current):** `RandomForestClassifier` (loaded from `model.pkl`).
 - **Output:** Risk score (0–1), **High/Low Risk** tag, and a **sample insurance tier** suggestion (for demo).
-- **Explainability:** You can add SHAP plots later to explain per-feature contributions.
+- **Explainability:** Every prediction shows which features raised or lowered the score (tree-path attributions); `explain_summary.py` redraws the global summary from a sample of stored predictions.
 """)
 
 st.markdown("**Try it:**")
@@ -1,10 +1,19 @@
+import io
+import tempfile
 import streamlit as st
 import pandas as pd
-from utils.db_manager import get_user_history, init_db
+from utils import metrics
+from utils.db_manager import (
+    ensure_schema, export_history_csv, get_risk_trend, get_user_history_page, get_user_summary
+)
+from utils.downsample import lttb
 
+PAGE_SIZE = 50
+TREND_POINTS = 300
 
-# Initialize database
-init_db()
+# Initialize database (once per process)
+ensure_schema()
+metrics.start_exporter()
 
 st.set_page_config(page_title="Prediction History", layout="centered")
 
@@ -13,8 +22,55 @@ st.title("📜 Prediction History")
 # Simulated logged-in user (replace with session-based logic later)
 email = "admin@demo.com"
 
-# Get user prediction history
-history = get_user_history(email)
+summary = get_user_summary(email)
+if summary:
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Predictions", f"{summary['count']:,}")
+    m2.metric("Latest risk", f"{summary['latest_risk']:.2f}")
+    m3.metric("Average risk", f"{summary['avg_risk']:.2f}")
+    m4.metric("Highest risk", f"{summary['max_risk']:.2f}")
+
+    # The trend only changes when the count does; downsampled so long histories draw instantly
+    trend_key = (email, summary["count"], summary["latest_ts"])
+    if st.session_state.get("trend_key") != trend_key:
+        points = get_risk_trend(email)
+        ts = pd.to_datetime([p[0] for p in points])
+        risk = [p[1] for p in points]
+        keep = lttb(ts.asi8, risk, TREND_POINTS)
+        st.session_state.trend = pd.DataFrame({"Risk score": [risk[i] for i in keep]}, index=ts[keep])
+        st.session_state.trend_key = trend_key
+    st.subheader("📈 Risk over time")
+    st.line_chart(st.session_state.trend)
+    if summary["count"] > TREND_POINTS:
+        st.caption(f"{summary['count']:,} predictions, drawn as {TREND_POINTS} representative points.")
+
+    st.subheader("🛡 Tier distribution")
+    st.bar_chart(pd.Series(summary["tiers"], name="Predictions"))
+
+# Rows are fetched one keyset page at a time and accumulated in the session,
+# so long histories never load in full just to show the newest entries.
+if st.session_state.get("history_email") != email:
+    st.session_state.history_email = email
+    st.session_state.history_rows = []
+    st.session_state.history_cursor = None
+
+def load_more():
+    rows, cursor = get_user_history_page(email, limit=PAGE_SIZE, cursor=st.session_state.history_cursor)
+    st.session_state.history_rows.extend(rows)
+    st.session_state.history_cursor = cursor
+
+# Always refresh the newest page so predictions made since the last visit show up
+newest, newest_cursor = get_user_history_page(email, limit=PAGE_SIZE)
+loaded = st.session_state.history_rows
+known = {r[0] for r in loaded[:PAGE_SIZE]}
+if not loaded or not newest or newest[-1][0] not in known:
+    # first visit, or too many new rows to stitch onto what we had: start over
+    st.session_state.history_rows = list(newest)
+    st.session_state.history_cursor = newest_cursor
+else:
+    st.session_state.history_rows = [r for r in newest if r[0] not in known] + loaded
+
+history = st.session_state.history_rows
 
 if not history:
     st.info("No prediction history found.")
@@ -30,7 +86,20 @@ else:
     df = pd.DataFrame(history, columns=columns)
     st.dataframe(df.drop(columns=["ID", "Email"]), use_container_width=True)
 
+    if st.session_state.history_cursor is not None:
+        st.button(f"⬇️ Load {PAGE_SIZE} more", on_click=load_more)
+    st.caption(f"Showing {len(history):,} prediction(s).")
 
-    # Export option
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Download History as CSV", data=csv, file_name="my_predictions.csv", mime="text/csv")
+    # Export option, built only on an explicit click. Rows are streamed from
+    # the DB in chunks into a temp file, so no DataFrame or second copy of the
+    # history is ever built; st.download_button still reads the finished
+    # file into memory once (Streamlit serves downloads from memory), so
+    # peak memory is about the size of the CSV.
+    if st.button("📄 Prepare full history CSV"):
+        with tempfile.TemporaryFile() as tmp:
+            text = io.TextIOWrapper(tmp, encoding="utf-8", newline="")
+            n = export_history_csv(email, text)
+            text.detach()
+            tmp.seek(0)
+            st.download_button(f"⬇️ Download History as CSV ({n:,} rows)", data=tmp,
+                               file_name="my_predictions.csv", mime="text/csv")
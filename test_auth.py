@@ -10,7 +10,7 @@ email = "nagi.gayatri@gmail.com"  # Use your exact signup email
 password = "1234"          # Use your exact signup password
 
 print(f"Authenticating user: '{email}' with password: '{password}'")
-print(f"Password SHA256 hash: {hash_password(password)}")
+print(f"Fresh hash with the current KDF: {hash_password(password)}")
 
 result = authenticate_user(email, password)
 
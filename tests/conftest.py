@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db_manager  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """db_manager pointed at a fresh database file for one test."""
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "history.db"))
+    yield db_manager
+    db_manager.disable_write_behind()
+    db_manager.close_all_connections()
+
+
+@pytest.fixture(scope="session")
+def fitted_forest():
+    """A small RandomForestClassifier on applicant-like integer features, with its data."""
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    from utils.scoring import FEATURES, NUMERIC_BOUNDS
+
+    rng = np.random.default_rng(0)
+    n = 600
+    cols = {f: rng.integers(*NUMERIC_BOUNDS.get(f, (0, 1)), endpoint=True, size=n) for f in FEATURES}
+    X = pd.DataFrame(cols, columns=FEATURES)
+    y = ((X["Age"] > 55) ^ (X["Cholesterol"] > 250) | (rng.random(n) < 0.1)).astype(int)
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    return model, X
+
+
+DAY = 86400
+HISTORY_VALUES = dict(Age=50, RestingBP=120, Cholesterol=200, MaxHR=150, Diabetes=0, Hypertension=1,
+                      Heart_Condition=0, Vaccinated=1, Hospitalized=0, Vaccine_Type=2, Doses=2,
+                      Days_Since_Vaccine=100, Risk_Score=0.3, Prediction=0, Tier="✅ Basic",
+                      Coverage="₹10 – ₹15 Lakh", Premium="₹4,000 – ₹6,000")
+
+
+@pytest.fixture
+def fill_history(db):
+    """``fill_history(n_days)`` inserts one row per day for the last ``n_days``
+    days, alternating between two users, oldest first. Rows sit half a day off
+    the day boundaries, so an ``archive_history(days)`` cutoff computed a few
+    seconds later still falls between the same two rows."""
+    def fill(n_days, emails=("a@example.com", "b@example.com")):
+        now = int(time.time())
+        rows = []
+        for i in range(n_days):
+            values = {**HISTORY_VALUES, "Age": 40 + i % 7}
+            rows.append((emails[i % len(emails)], now - (n_days - i) * DAY + DAY // 2,
+                         *(values[f] for f in db.HISTORY_FIELDS)))
+        db.write_transaction(lambda conn: db._insert_history(conn, rows))
+        return rows
+    return fill
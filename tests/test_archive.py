@@ -0,0 +1,76 @@
+import os
+import sqlite3
+
+
+def live_count(db):
+    return db.read(lambda conn: conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0])
+
+
+def test_archived_rows_stay_readable(db, fill_history):
+    db.ensure_schema()
+    fill_history(300)
+    before = {e: db.get_user_history(e) for e in ("a@example.com", "b@example.com")}
+    summaries = {e: db.get_user_summary(e) for e in before}
+
+    moved = db.archive_history(older_than_days=90, batch_size=17)
+    assert sum(moved.values()) == 300 - 90
+    assert live_count(db) == 90
+    assert len(db.archive_paths()) == len(moved)
+    assert all(os.path.basename(p)[len("history-"):-len(".db")] in moved for p in db.archive_paths())
+
+    for email, rows in before.items():
+        assert db.get_user_history(email) == rows
+        live = db.get_user_history(email, include_archive=False)
+        assert live == rows[:len(live)]
+        assert db.get_user_summary(email) == summaries[email]
+    assert db.archive_history(older_than_days=90) == {}
+
+
+def test_history_scan_with_archive_sees_every_row_once(db, fill_history):
+    db.ensure_schema()
+    fill_history(120)
+    db.archive_history(older_than_days=30)
+    ids = [r[0] for chunk in db.iter_history_since(0, chunk_size=13, include_archive=True) for r in chunk]
+    assert sorted(ids) == ids == list(range(1, 121))
+    live = [r[0] for chunk in db.iter_history_since(0) for r in chunk]
+    assert len(live) == 30
+
+
+def test_new_database_shrinks_as_it_archives(db, fill_history):
+    db.ensure_schema()
+    assert db.incremental_vacuum_enabled()
+    fill_history(2000)
+    db.archive_history(older_than_days=30)
+    assert db.read(lambda conn: conn.execute("PRAGMA freelist_count").fetchone()[0]) == 0
+
+
+def test_archiving_never_vacuums_an_older_database(db, fill_history, monkeypatch):
+    # a file that already had tables before auto_vacuum=INCREMENTAL was set
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(db.USERS_TABLE_SQL)
+    conn.close()
+    db.ensure_schema()
+    assert not db.incremental_vacuum_enabled()
+    fill_history(400)
+    statements = []
+    db.close_all_connections()
+    monkeypatch.setattr(db.ConnectionPool, "_connect", _traced(db.ConnectionPool._connect, statements))
+    db.archive_history(older_than_days=30, batch_size=50)
+    assert any(s.startswith("DELETE FROM main.predictions") for s in statements)
+    assert "VACUUM" not in statements
+    assert not any("incremental_vacuum;" in s for s in statements)
+    assert not db.incremental_vacuum_enabled()
+    assert live_count(db) == 30
+
+    assert db.enable_incremental_vacuum()
+    assert db.incremental_vacuum_enabled()
+    assert not db.enable_incremental_vacuum()
+    assert len(db.get_user_history("a@example.com")) == 200
+
+
+def _traced(connect, statements):
+    def traced(pool):
+        conn = connect(pool)
+        conn.set_trace_callback(statements.append)
+        return conn
+    return traced
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.downsample import lttb
+
+
+def reference_lttb(x, y, n_out):
+    """Textbook LTTB (Steinarsson 2013), one point at a time."""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    keep, prev = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = math.floor(i * every) + 1, math.floor((i + 1) * every) + 1
+        nxt_lo, nxt_hi = hi, min(math.floor((i + 2) * every) + 1, n)
+        bx = sum(x[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        by = sum(y[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        areas = [abs((x[prev] - bx) * (y[j] - y[prev]) - (x[prev] - x[j]) * (by - y[prev]))
+                 for j in range(lo, hi)]
+        prev = lo + areas.index(max(areas))
+        keep.append(prev)
+    return keep + [n - 1]
+
+
+@pytest.mark.parametrize("n, n_out", [(10, 3), (1000, 300), (1001, 7), (5000, 299)])
+def test_matches_the_reference_bucket_by_bucket(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.integers(1, 3600, size=n)).astype(float)
+    y = rng.random(n)
+    assert lttb(x, y, n_out).tolist() == reference_lttb(x.tolist(), y.tolist(), n_out)
+
+
+@pytest.mark.parametrize("n, n_out", [(50, 3), (1000, 300), (12345, 300)])
+def test_keeps_endpoints_and_the_point_budget(n, n_out):
+    rng = np.random.default_rng(1)
+    keep = lttb(np.arange(n), rng.random(n), n_out)
+    assert keep.size == n_out
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_one_point_per_bucket():
+    n, n_out = 1000, 52
+    keep = lttb(np.arange(n), np.sin(np.arange(n) / 17.0), n_out)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    for i, k in enumerate(keep[1:-1]):
+        assert edges[i] <= k < edges[i + 1]
+
+
+def test_short_series_and_tiny_budgets_are_returned_whole():
+    assert lttb([1, 2, 3], [0, 1, 0], 300).tolist() == [0, 1, 2]
+    assert lttb(np.arange(10), np.zeros(10), 2).tolist() == list(range(10))
+
+
+def test_a_lone_spike_survives():
+    y = np.zeros(10_000)
+    y[4321] = 1.0
+    assert 4321 in lttb(np.arange(y.size), y, 100)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from utils.explain import PathExplainer
+from utils.forest_engine import CompiledForest
+
+
+def test_attributions_add_up_to_the_score(fitted_forest):
+    model, X = fitted_forest
+    forest = CompiledForest.from_estimator(model)
+    explainer = PathExplainer(forest)
+    phi = explainer.explain(X)
+    assert phi.shape == X.shape
+    np.testing.assert_allclose(explainer.base_value + phi.sum(axis=1), model.predict_proba(X)[:, 1],
+                               rtol=0, atol=1e-12)
+
+
+def test_explain_one_matches_batch(fitted_forest):
+    model, X = fitted_forest
+    explainer = PathExplainer(CompiledForest.from_estimator(model))
+    batch = explainer.explain(X.head(20), chunk_size=6)
+    for i, row in enumerate(X.head(20).to_dict("records")):
+        np.testing.assert_allclose(explainer.explain_one(row), batch[i], rtol=0, atol=1e-12)
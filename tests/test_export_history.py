@@ -0,0 +1,70 @@
+import glob
+import os
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+import export_history  # noqa: E402
+
+
+def exported_ids(out_dir):
+    ids = []
+    for path in glob.glob(os.path.join(out_dir, "month=*", "*.parquet")):
+        ids.extend(pq.read_table(path, columns=["id"])["id"].to_pylist())
+    return sorted(ids)
+
+
+def test_incremental_runs_export_only_new_rows(db, fill_history, tmp_path):
+    db.ensure_schema()
+    fill_history(40)
+    out = str(tmp_path / "export")
+    rows, months, last_id = export_history.export(out, chunk_size=9)
+    assert (rows, last_id) == (40, 40)
+    assert exported_ids(out) == list(range(1, 41))
+    assert export_history.export(out)[0] == 0
+
+    fill_history(5)
+    assert export_history.export(out)[:1] == (5,)
+    assert exported_ids(out) == list(range(1, 46))
+    assert export_history.read_watermark(out)["rows_total"] == 45
+
+
+def test_full_export_after_archiving_keeps_archived_months(db, fill_history, tmp_path):
+    db.ensure_schema()
+    fill_history(150)
+    out = str(tmp_path / "export")
+    export_history.export(out)
+    db.archive_history(older_than_days=60)
+    assert export_history.export(out, full=True)[0] == 150
+    assert exported_ids(out) == list(range(1, 151))
+
+    # a first export into a new directory after archiving sees everything too
+    fresh = str(tmp_path / "fresh")
+    export_history.export(fresh)
+    assert exported_ids(fresh) == list(range(1, 151))
+
+
+def test_exported_values_round_trip(db, fill_history, tmp_path):
+    db.ensure_schema()
+    fill_history(3)
+    out = str(tmp_path / "export")
+    export_history.export(out)
+    table = pq.read_table(sorted(glob.glob(os.path.join(out, "month=*", "*.parquet")))[0])
+    row = table.slice(0, 1).to_pylist()[0]
+    (expected,) = [r for r in db.get_user_history(row["email"]) if r[0] == row["id"]]
+    assert row["timestamp"].strftime("%Y-%m-%d %H:%M:%S") == expected[2]
+    assert [row[c] for c in db.HISTORY_COLUMNS[3:]] == list(expected[3:])
+
+
+def test_arrow_format_writes_ipc_files(db, fill_history, tmp_path):
+    import pyarrow.ipc as ipc
+
+    db.ensure_schema()
+    fill_history(10)
+    out = str(tmp_path / "export")
+    assert export_history.export(out, fmt="arrow")[0] == 10
+    ids = []
+    for path in glob.glob(os.path.join(out, "month=*", "*.arrow")):
+        ids.extend(ipc.open_file(path).read_all()["id"].to_pylist())
+    assert sorted(ids) == list(range(1, 11))
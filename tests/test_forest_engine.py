@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from utils.forest_engine import CompiledForest, read_bundle_header
+
+
+def test_predict_proba_matches_sklearn_exactly(fitted_forest):
+    model, X = fitted_forest
+    forest = CompiledForest.from_estimator(model)
+    np.testing.assert_array_equal(forest.predict_proba(X), model.predict_proba(X))
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+
+
+def test_chunking_does_not_change_results(fitted_forest):
+    model, X = fitted_forest
+    forest = CompiledForest.from_estimator(model)
+    np.testing.assert_array_equal(forest.predict_proba(X, chunk_size=7), forest.predict_proba(X))
+
+
+def test_predict_one_matches_batch(fitted_forest):
+    model, X = fitted_forest
+    forest = CompiledForest.from_estimator(model)
+    batch = model.predict_proba(X)[:, 1]
+    for i, row in enumerate(X.head(50).to_dict("records")):
+        # same leaves; only the order of the mean's summation differs
+        assert forest.predict_one(row) == pytest.approx(batch[i], rel=1e-12, abs=1e-15)
+
+
+def test_bundle_round_trip(fitted_forest, tmp_path):
+    model, X = fitted_forest
+    path = str(tmp_path / "model.forest")
+    CompiledForest.from_estimator(model).save(path, metadata={"source_sha256": "abc"})
+    loaded = CompiledForest.load(path)
+    assert loaded.metadata["source_sha256"] == "abc"
+    assert read_bundle_header(path)["metadata"]["source_sha256"] == "abc"
+    assert list(loaded.feature_names_in_) == list(X.columns)
+    np.testing.assert_array_equal(loaded.predict_proba(X), model.predict_proba(X))
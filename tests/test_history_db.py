@@ -0,0 +1,155 @@
+import datetime
+import random
+
+import pytest
+
+LEGACY_TIERS = [
+    ("🚨 Premium", "₹2 – ₹5 Lakh", "₹10,000+"),
+    ("⚠️ Standard", "₹5 – ₹10 Lakh", "₹6,000 – ₹9,000"),
+    ("✅ Basic", "₹10 – ₹15 Lakh", "₹4,000 – ₹6,000"),
+]
+
+
+def legacy_rows(db, n, emails, seed=0):
+    """Rows in the v0 prediction_history layout (text timestamps), oldest first."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 3, 1, 9, 30)
+    rows = []
+    for i in range(n):
+        risk = rng.random()
+        tier = LEGACY_TIERS[0] if risk >= 0.75 else LEGACY_TIERS[1] if risk >= 0.4 else LEGACY_TIERS[2]
+        ts = (start + datetime.timedelta(hours=7 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((rng.choice(emails), ts, rng.randint(20, 90), rng.randint(90, 180), rng.randint(150, 320),
+                     rng.randint(80, 200), *(rng.randint(0, 1) for _ in range(5)), rng.randint(0, 3),
+                     rng.randint(0, 3), rng.randint(0, 365), risk, int(risk >= 0.5), *tier))
+    return rows
+
+
+def make_legacy_db(db, rows, version=2):
+    """A database as an older release left it: v0 table with ``rows``, migrated up to ``version``."""
+    db.write_transaction(lambda conn: conn.execute(db.USERS_TABLE_SQL))
+    db.write_transaction(lambda conn: conn.execute(db.HISTORY_V0_SQL))
+    columns = ", ".join(["email", "timestamp", *db.HISTORY_FIELDS])
+    sql = f"INSERT INTO prediction_history ({columns}) VALUES ({', '.join('?' * (len(db.HISTORY_FIELDS) + 2))})"
+    db.write_transaction(lambda conn: conn.executemany(sql, rows))
+    db.migrate(target=version)
+
+
+def expected_history(rows, email):
+    """What get_user_history should return for ``email``: ids are 1-based insert order, newest first."""
+    mine = [(i, *row) for i, row in enumerate(rows, start=1) if row[0] == email]
+    return sorted(mine, key=lambda r: (r[2], r[0]), reverse=True)
+
+
+def user_version(db):
+    return db.read(lambda conn: conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+EMAILS = ["a@example.com", "b@example.com", "c@example.com"]
+
+
+def test_fresh_database_is_created_at_the_latest_version(db):
+    db.ensure_schema()
+    assert user_version(db) == db.SCHEMA_VERSION
+
+
+@pytest.mark.parametrize("from_version", [0, 1, 2])
+def test_upgrade_keeps_every_row_and_summary(db, monkeypatch, from_version):
+    monkeypatch.setattr(db, "MIGRATION_BATCH_ROWS", 7)  # many batches, with a partial last one
+    rows = legacy_rows(db, 100, EMAILS)
+    make_legacy_db(db, rows, version=from_version)
+    db.ensure_schema()
+    assert user_version(db) == db.SCHEMA_VERSION
+    for email in EMAILS:
+        assert [tuple(r) for r in db.get_user_history(email)] == expected_history(rows, email)
+        mine = [r for r in rows if r[0] == email]
+        summary = db.get_user_summary(email)
+        assert summary["count"] == len(mine)
+        assert summary["avg_risk"] == pytest.approx(sum(r[14] for r in mine) / len(mine))
+        assert summary["first_ts"] == min(r[1] for r in mine)
+        assert summary["latest_ts"] == max(r[1] for r in mine)
+        assert sum(summary["tiers"].values()) == len(mine)
+
+
+def test_interrupted_normalization_resumes(db, monkeypatch):
+    monkeypatch.setattr(db, "MIGRATION_BATCH_ROWS", 10)
+    rows = legacy_rows(db, 95, EMAILS)
+    make_legacy_db(db, rows)
+
+    real = db.write_transaction
+    calls = {"n": 0}
+
+    def crash_after_a_few(work):
+        calls["n"] += 1
+        if calls["n"] == 5:
+            raise KeyboardInterrupt  # the process dies mid-migration
+        return real(work)
+
+    monkeypatch.setattr(db, "write_transaction", crash_after_a_few)
+    with pytest.raises(KeyboardInterrupt):
+        db.init_db()
+    monkeypatch.setattr(db, "write_transaction", real)
+    assert user_version(db) == 2
+
+    # a prediction saved while the upgrade is half done must survive it too
+    db.save_history("new@example.com", dict(zip(db.HISTORY_FIELDS, rows[0][2:])))
+    db.init_db()
+    assert user_version(db) == db.SCHEMA_VERSION
+    for email in EMAILS:
+        assert [tuple(r) for r in db.get_user_history(email)] == expected_history(rows, email)
+    (row,) = db.get_user_history("new@example.com")
+    assert row[0] > len(rows)
+
+
+def test_new_rows_after_upgrade_get_fresh_ids(db):
+    rows = legacy_rows(db, 20, EMAILS)
+    make_legacy_db(db, rows)
+    db.ensure_schema()
+    record = dict(zip(db.HISTORY_FIELDS, rows[0][2:]))
+    db.save_history("new@example.com", record)
+    (row,) = db.get_user_history("new@example.com")
+    assert row[0] > len(rows)
+    assert tuple(row[3:]) == rows[0][2:]
+
+
+def test_keyset_pages_cover_history_once_across_equal_timestamps(db):
+    db.ensure_schema()
+    rows = legacy_rows(db, 30, EMAILS)
+    # one batch shares a single timestamp, so the cursor must break ties on id
+    db.save_history_batch("a@example.com", [dict(zip(db.HISTORY_FIELDS, r[2:])) for r in rows])
+    db.save_history_batch("b@example.com", [dict(zip(db.HISTORY_FIELDS, r[2:])) for r in rows[:5]])
+    full = db.get_user_history("a@example.com")
+    assert len(full) == 30
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = db.get_user_history_page("a@example.com", limit=7, cursor=cursor)
+        pages.append(page)
+        if cursor is None:
+            break
+    assert [len(p) for p in pages] == [7, 7, 7, 7, 2]
+    assert [r for p in pages for r in p] == full
+    assert [r for chunk in db.iter_user_history("a@example.com", chunk_size=10) for r in chunk] == full
+
+
+def test_page_of_exactly_the_remaining_rows_ends_the_cursor(db):
+    db.ensure_schema()
+    rows = legacy_rows(db, 6, EMAILS)
+    db.save_history_batch("a@example.com", [dict(zip(db.HISTORY_FIELDS, r[2:])) for r in rows])
+    page, cursor = db.get_user_history_page("a@example.com", limit=6)
+    assert len(page) == 6 and cursor is None
+    assert db.get_user_history_page("nobody@example.com") == ([], None)
+
+
+def test_csv_export_streams_every_row(db, tmp_path):
+    import csv
+
+    db.ensure_schema()
+    rows = legacy_rows(db, 25, EMAILS)
+    db.save_history_batch("a@example.com", [dict(zip(db.HISTORY_FIELDS, r[2:])) for r in rows])
+    with open(tmp_path / "out.csv", "w", newline="", encoding="utf-8") as f:
+        assert db.export_history_csv("a@example.com", f, chunk_size=4) == 25
+    with open(tmp_path / "out.csv", newline="", encoding="utf-8") as f:
+        exported = list(csv.reader(f))
+    assert len(exported) == 26
+    assert [int(r[0]) for r in exported[1:]] == [r[0] for r in db.get_user_history("a@example.com")]
@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+
+import pytest
+
+
+def record(db, age=50):
+    return {**dict.fromkeys(db.HISTORY_FIELDS, 0), "Age": age, "Risk_Score": 0.3,
+            "Tier": "✅ Basic", "Coverage": "₹10 – ₹15 Lakh", "Premium": "₹4,000 – ₹6,000"}
+
+
+def params(db, email="a@example.com", age=50):
+    return (email, int(time.time()), *(record(db, age)[f] for f in db.HISTORY_FIELDS))
+
+
+def row_count(db):
+    return db.read(lambda conn: conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0])
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def writer_db(db):
+    db.ensure_schema()
+    writers = []
+
+    def make(**kwargs):
+        writers.append(db.HistoryWriter(**kwargs))
+        return writers[-1]
+
+    yield db, make
+    for writer in writers:
+        writer.close()
+
+
+@pytest.fixture
+def gated_writes(db, monkeypatch):
+    """Holds the writer thread's transactions until the returned Event is set;
+    writes from any other thread go through."""
+    release = threading.Event()
+    real = db.write_transaction
+
+    def gated(work):
+        if threading.current_thread().name == "history-writer":
+            assert release.wait(10)
+        return real(work)
+
+    monkeypatch.setattr(db, "write_transaction", gated)
+    yield release
+    release.set()
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval(writer_db):
+    db, make = writer_db
+    writer = make(batch_size=5, flush_interval=60)
+    for i in range(4):
+        writer.submit(params(db, age=40 + i))
+    time.sleep(0.2)
+    assert row_count(db) == 0
+    writer.submit(params(db, age=44))
+    assert wait_until(lambda: row_count(db) == 5)
+
+
+def test_partial_batch_is_written_after_the_interval(writer_db):
+    db, make = writer_db
+    writer = make(batch_size=1000, flush_interval=0.2)
+    for i in range(3):
+        writer.submit(params(db, age=40 + i))
+    assert wait_until(lambda: row_count(db) == 3, timeout=2)
+
+
+def test_flush_writes_a_partial_batch_early(writer_db):
+    db, make = writer_db
+    writer = make(batch_size=1000, flush_interval=60)
+    writer.submit(params(db))
+    writer.flush()
+    assert wait_until(lambda: row_count(db) == 1, timeout=2)
+
+
+def test_full_queue_falls_back_to_a_synchronous_write(db, gated_writes):
+    db.ensure_schema()
+    db.enable_write_behind(batch_size=1, flush_interval=60, maxsize=2, put_timeout=0.05)
+    fallbacks = db._HISTORY_QUEUE_FULL.value
+    db.save_history("a@example.com", record(db, 40))
+    assert wait_until(lambda: db._writer._queue.empty())  # taken by the (held) writer thread
+    for i in range(1, 6):
+        db.save_history("a@example.com", record(db, 40 + i))
+    # one row is held in the writer, two fill the queue, the rest were written directly
+    assert db._HISTORY_QUEUE_FULL.value - fallbacks == 3
+    assert row_count(db) == 3
+    db._writer.flush()  # the queue is full: must not block
+    gated_writes.set()
+    db.disable_write_behind()
+    assert row_count(db) == 6
+    assert sorted(r[3] for r in db.get_user_history("a@example.com")) == list(range(40, 46))
+
+
+def test_full_queue_releases_the_pending_count(writer_db, gated_writes):
+    db, make = writer_db
+    writer = make(batch_size=1, flush_interval=60, maxsize=1, put_timeout=0.05)
+    writer.submit(params(db))
+    assert wait_until(lambda: writer._queue.empty())  # taken by the (held) writer thread
+    writer.submit(params(db))
+    with pytest.raises(queue.Full):
+        writer.submit(params(db))
+    assert writer._pending["a@example.com"] == 2
+    gated_writes.set()
+    assert writer.wait_for("a@example.com")
+
+
+def test_reads_see_the_callers_queued_writes(db):
+    db.ensure_schema()
+    db.enable_write_behind(batch_size=1000, flush_interval=60)
+    for i in range(3):
+        db.save_history("a@example.com", record(db, 40 + i))
+    db.save_history("b@example.com", record(db))
+    assert [r[3] for r in db.get_user_history("a@example.com")] == [42, 41, 40]
+    db.save_history("a@example.com", record(db, 43))
+    assert db.get_user_summary("a@example.com")["count"] == 4
+    assert db.get_risk_trend("b@example.com") != []
+
+
+def test_wait_for_only_waits_for_that_email(writer_db, gated_writes):
+    db, make = writer_db
+    writer = make(batch_size=1000, flush_interval=60)
+    writer.submit(params(db, "a@example.com"))
+    assert writer.wait_for("b@example.com", timeout=0)
+    assert not writer.wait_for("a@example.com", timeout=0.1)
+    gated_writes.set()
+    assert writer.wait_for("a@example.com")
+    assert row_count(db) == 1
+
+
+def test_close_drains_while_other_threads_keep_writing(db):
+    db.ensure_schema()
+    db.enable_write_behind(batch_size=50, flush_interval=0.05, maxsize=100, put_timeout=0.5)
+    n_threads, per_thread = 6, 300
+    start = threading.Barrier(n_threads + 1)
+
+    def worker(t):
+        start.wait()
+        for i in range(per_thread):
+            db.save_history(f"user{t}@example.com", record(db, 10 + i % 90))
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    time.sleep(0.05)
+    db.disable_write_behind()  # rows submitted after this are written synchronously
+    for thread in threads:
+        thread.join()
+    assert row_count(db) == n_threads * per_thread
+
+
+def test_submit_after_close_is_refused(writer_db):
+    db, make = writer_db
+    writer = make()
+    writer.submit(params(db))
+    writer.close()
+    assert row_count(db) == 1
+    with pytest.raises(RuntimeError):
+        writer.submit(params(db))
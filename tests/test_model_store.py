@@ -0,0 +1,28 @@
+import joblib
+import numpy as np
+
+from utils.forest_engine import CompiledForest, file_sha256
+from utils.model_store import load_batch_model
+
+
+def test_batch_model_is_the_matching_sklearn_estimator(fitted_forest, tmp_path):
+    model, X = fitted_forest
+    path = str(tmp_path / "model.pkl")
+    joblib.dump(model, path)
+    forest = CompiledForest.from_estimator(model)
+    batch_model = load_batch_model(forest, path, version="full")
+    assert not isinstance(batch_model, CompiledForest)
+    np.testing.assert_array_equal(batch_model.predict_proba(X), forest.predict_proba(X))
+
+
+def test_compacted_variant_scores_batches_itself(fitted_forest, tmp_path):
+    model, X = fitted_forest
+    path = str(tmp_path / "model.pkl")
+    joblib.dump(model, path)
+    bundle = str(tmp_path / "model.fast.forest")
+    # what compact_model.py writes: fewer trees, same source model hash
+    compact = CompiledForest.from_estimator(model)
+    compact.save(bundle, metadata={"source_sha256": file_sha256(path),
+                                   "variant": {"trees": [0, 1, 2], "max_depth": 4}})
+    fast = CompiledForest.load(bundle)
+    assert load_batch_model(fast, path, version="fast") is fast
@@ -0,0 +1,77 @@
+import hashlib
+import sqlite3
+
+import pytest
+
+FAST_SCRYPT = "scrypt:n=1024,r=8,p=1"
+
+
+@pytest.fixture
+def users(db, monkeypatch):
+    monkeypatch.setattr(db, "PASSWORD_KDF", db.parse_kdf_setting(FAST_SCRYPT))
+    db.ensure_schema()
+    return db
+
+
+def stored_hash(db, email):
+    return db.read(lambda conn: conn.execute(
+        "SELECT password_hash FROM users WHERE email = ?", (email,)).fetchone()[0])
+
+
+def test_hashes_are_salted_and_verify(users):
+    first, second = users.hash_password("s3cret"), users.hash_password("s3cret")
+    assert first != second
+    assert first.startswith("scrypt$n=1024,r=8,p=1$")
+    assert users.verify_password("s3cret", first) == (True, False)
+    assert users.verify_password("wrong", first) == (False, False)
+    assert users.verify_password("s3cret", "scrypt$garbage") == (False, False)
+
+
+def test_parse_kdf_setting_rejects_unknown_names_and_parameters(users):
+    assert users.parse_kdf_setting("pbkdf2_sha256:iterations=1000") == ("pbkdf2_sha256", {"iterations": 1000})
+    with pytest.raises(ValueError):
+        users.parse_kdf_setting("md5")
+    with pytest.raises(ValueError):
+        users.parse_kdf_setting("scrypt:rounds=3")
+
+
+def test_signup_login_and_duplicate(users):
+    assert users.create_user("Ann@Example.com ", "pw")
+    assert not users.create_user("ann@example.com", "other")
+    assert users.authenticate_user("ann@example.com", "pw")
+    assert not users.authenticate_user("ann@example.com", "other")
+    assert not users.authenticate_user("nobody@example.com", "pw")
+
+
+def test_legacy_sha256_hash_is_upgraded_on_login(users):
+    legacy = hashlib.sha256(b"pw").hexdigest()
+    users.write_transaction(lambda conn: conn.execute(
+        "INSERT INTO users (email, password_hash) VALUES (?, ?)", ("old@example.com", legacy)))
+    assert not users.authenticate_user("old@example.com", "wrong")
+    assert stored_hash(users, "old@example.com") == legacy
+    assert users.authenticate_user("old@example.com", "pw")
+    upgraded = stored_hash(users, "old@example.com")
+    assert upgraded.startswith("scrypt$")
+    assert users.authenticate_user("old@example.com", "pw")
+
+
+def test_kdf_change_rehashes_on_next_login(users, monkeypatch):
+    users.create_user("ann@example.com", "pw")
+    monkeypatch.setattr(users, "PASSWORD_KDF", users.parse_kdf_setting("pbkdf2_sha256:iterations=1000"))
+    assert users.authenticate_user("ann@example.com", "pw")
+    assert stored_hash(users, "ann@example.com").startswith("pbkdf2_sha256$iterations=1000$")
+
+
+def test_failed_upgrade_still_logs_in(users, monkeypatch):
+    legacy = hashlib.sha256(b"pw").hexdigest()
+    users.write_transaction(lambda conn: conn.execute(
+        "INSERT INTO users (email, password_hash) VALUES (?, ?)", ("old@example.com", legacy)))
+
+    def locked(work):
+        raise sqlite3.OperationalError("database is locked")
+
+    real = users.write_transaction
+    monkeypatch.setattr(users, "write_transaction", locked)
+    assert users.authenticate_user("old@example.com", "pw")
+    monkeypatch.setattr(users, "write_transaction", real)
+    assert stored_hash(users, "old@example.com") == legacy
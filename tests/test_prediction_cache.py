@@ -0,0 +1,89 @@
+import os
+import types
+
+import pytest
+
+from utils import prediction_cache
+from utils.prediction_cache import PredictionCache, model_version
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable stand-in for time.monotonic as prediction_cache sees it."""
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = PredictionCache(maxsize=3)
+    for key in "abc":
+        cache.put(key, ord(key))
+    assert cache.get("a") == ord("a")  # "b" is now the oldest
+    cache.put("d", 4)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == [ord("a"), ord("c"), 4]
+    assert cache.stats()["size"] == 3
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(ttl=10)
+    cache.put("a", 0.5)
+    clock[0] += 10
+    assert cache.get("a") == 0.5
+    clock[0] += 0.001
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_without_ttl_entries_never_expire(clock):
+    cache = PredictionCache()
+    cache.put("a", 0.5)
+    clock[0] += 10 ** 9
+    assert cache.get("a") == 0.5
+
+
+def test_hit_and_miss_counters():
+    cache = PredictionCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 0.25
+
+    assert [cache.get_or_compute("k", compute) for _ in range(4)] == [0.25] * 4
+    assert cache.get("other") is None
+    stats = cache.stats()
+    assert len(calls) == 1
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+    assert stats["hit_rate"] == pytest.approx(3 / 5)
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = PredictionCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_new_model_version_drops_every_entry():
+    cache = PredictionCache()
+    cache.set_version("v1")
+    cache.put("a", 0.1)
+    cache.set_version("v1")
+    assert cache.get("a") == 0.1
+    cache.set_version("v2")
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_model_version_changes_when_the_file_is_rewritten(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(b"first")
+    before = model_version(str(path), str(tmp_path / "missing.forest"))
+    path.write_bytes(b"second model")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert model_version(str(path)) != before
+    with pytest.raises(FileNotFoundError):
+        model_version(str(tmp_path / "missing.forest"))
@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.scoring import (
+    CSV_READ_OPTIONS, FEATURES, VACCINE_MAP, assign_tier, score_batch, validate_batch
+)
+
+HEADER = ",".join(FEATURES)
+
+
+def read(*lines):
+    return pd.read_csv(io.StringIO("\n".join([HEADER, *lines])), **CSV_READ_OPTIONS)
+
+
+def test_accepts_names_codes_and_yes_no_spellings():
+    encoded, errors = validate_batch(read(
+        "50,120,200,150,Yes,no,1,0,n,Pfizer,2,100",
+        "60,130,220,140,1,0,0,1,0,3,1,30",
+    ))
+    assert errors == []
+    assert list(encoded.columns) == FEATURES
+    assert (encoded.dtypes == np.int64).all()
+    assert encoded.loc[0, ["Diabetes", "Hypertension", "Vaccine_Type"]].tolist() == [1, 0, 2]
+    assert encoded.loc[1, "Vaccine_Type"] == 3
+
+
+def test_vaccine_name_none_is_accepted():
+    encoded, errors = validate_batch(read(
+        "50,120,200,150,1,0,0,0,0,None,0,0",
+        "60,130,220,140,1,0,0,1,0,Pfizer,1,30",
+    ))
+    assert errors == []
+    assert encoded["Vaccine_Type"].tolist() == [VACCINE_MAP["None"], VACCINE_MAP["Pfizer"]]
+
+
+def test_blank_flag_cell_rejects_only_its_row():
+    # the blank makes pandas read Heart_Condition as float (1.0/0.0)
+    encoded, errors = validate_batch(read(
+        "50,120,200,150,1,0,,1,0,Pfizer,2,100",
+        "51,120,200,150,1,0,1,1,0,Pfizer,2,100",
+        "52,120,200,150,1,0,0,1,0,Pfizer,2,100",
+    ))
+    assert errors == ["Line 2: invalid Heart_Condition"]
+    assert encoded.index.tolist() == [1, 2]
+    assert encoded["Heart_Condition"].tolist() == [1, 0]
+
+
+def test_rejects_out_of_bounds_and_unknown_values_per_row():
+    encoded, errors = validate_batch(read(
+        "5,120,200,150,1,0,0,1,0,Pfizer,2,100",
+        "50,120,200,150,1,0,0,maybe,0,Sputnik,2,100",
+        "50.5,120,200,150,1,0,0,1,0,Pfizer,2,100",
+        "50,120,200,150,1,0,0,1,0,Pfizer,2,100",
+    ))
+    assert errors == [
+        "Line 2: invalid Age",
+        "Line 3: invalid Vaccinated, Vaccine_Type",
+        "Line 4: invalid Age",
+    ]
+    assert encoded.index.tolist() == [3]
+
+
+def test_missing_columns_raise():
+    with pytest.raises(ValueError, match="Doses"):
+        validate_batch(read("1,2,3").drop(columns=["Doses"]))
+
+
+class _FixedModel:
+    def __init__(self, probs):
+        self.probs = np.asarray(probs)
+
+    def predict_proba(self, X):
+        return np.column_stack([1 - self.probs[:len(X)], self.probs[:len(X)]])
+
+
+def test_score_batch_matches_single_row_tiers():
+    encoded, _ = validate_batch(read(*["50,120,200,150,1,0,0,1,0,Pfizer,2,100"] * 4))
+    probs = [0.1, 0.4, 0.75, 0.9]
+    out = score_batch(_FixedModel(probs), encoded)
+    assert out["Risk_Score"].tolist() == probs
+    assert out["Prediction"].tolist() == [0, 0, 1, 1]
+    for prob, (_, row) in zip(probs, out.iterrows()):
+        assert (row["Tier"], row["Coverage"], row["Premium"]) == assign_tier(prob)
+
+
+def test_score_batch_uses_batch_model_only_for_large_frames():
+    encoded, _ = validate_batch(read(*["50,120,200,150,1,0,0,1,0,Pfizer,2,100"] * 3))
+    out = score_batch(_FixedModel([0.2] * 3), encoded, batch_model=_FixedModel([0.9] * 3))
+    assert out["Risk_Score"].tolist() == [0.2] * 3
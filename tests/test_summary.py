@@ -0,0 +1,110 @@
+import datetime
+import random
+import time
+
+import pytest
+
+TIERS = [("🚨 Premium", "₹2 – ₹5 Lakh", "₹10,000+"),
+         ("⚠️ Standard", "₹5 – ₹10 Lakh", "₹6,000 – ₹9,000"),
+         ("✅ Basic", "₹10 – ₹15 Lakh", "₹4,000 – ₹6,000")]
+DAY = 86400
+
+
+def random_rows(db, n, emails, rng, now):
+    """``(email, ts, *HISTORY_FIELDS)`` rows over the last 200 days, out of
+    time order and with repeated timestamps; none sits within an hour of a
+    whole number of days ago, where an archive cutoff could fall."""
+    rows = []
+    for _ in range(n):
+        values = {**dict.fromkeys(db.HISTORY_FIELDS, 0), "Age": rng.randint(20, 90),
+                  "Risk_Score": round(rng.random(), 4)}
+        values["Tier"], values["Coverage"], values["Premium"] = rng.choice(TIERS)
+        ts = now - rng.randrange(200) * DAY - DAY // 2 - rng.choice([0, 3600])
+        rows.append((rng.choice(emails), ts, *(values[f] for f in db.HISTORY_FIELDS)))
+    return rows
+
+
+def expected_summary(db, inserted, email):
+    """get_user_summary computed from scratch; ``inserted`` is every row in
+    insertion order, so list position + 1 is its id."""
+    risk, tier = 2 + db.HISTORY_FIELDS.index("Risk_Score"), 2 + db.HISTORY_FIELDS.index("Tier")
+    mine = [(i, r) for i, r in enumerate(inserted, start=1) if r[0] == email]
+    latest = max(mine, key=lambda m: (m[1][1], m[0]))[1]
+    tiers = {}
+    for _, r in mine:
+        tiers[r[tier]] = tiers.get(r[tier], 0) + 1
+
+    def fmt(ts):
+        return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+    return {"count": len(mine), "avg_risk": sum(r[risk] for _, r in mine) / len(mine),
+            "max_risk": max(r[risk] for _, r in mine), "first_ts": fmt(min(r[1] for _, r in mine)),
+            "latest_ts": fmt(latest[1]), "latest_risk": latest[risk], "tiers": tiers}
+
+
+def assert_summary(db, inserted, email):
+    summary = db.get_user_summary(email)
+    expected = expected_summary(db, inserted, email)
+    assert summary["avg_risk"] == pytest.approx(expected.pop("avg_risk"))
+    assert {k: summary[k] for k in expected} == expected
+    assert summary["count"] == len(db.get_user_history(email))
+
+
+def test_summary_follows_every_kind_of_insert(db):
+    db.ensure_schema()
+    rng, now = random.Random(3), int(time.time())
+    emails = ["a@example.com", "b@example.com", "c@example.com"]
+    inserted = []
+    for size in (1, 40, 7, 200):
+        rows = random_rows(db, size, emails, rng, now)
+        db.write_transaction(lambda conn: db._insert_history(conn, rows))
+        inserted += rows
+        for email in {r[0] for r in inserted}:
+            assert_summary(db, inserted, email)
+    assert db.get_user_summary("nobody@example.com") is None
+
+
+def test_summary_counts_saves_and_batches(db):
+    db.ensure_schema()
+    record = {**dict.fromkeys(db.HISTORY_FIELDS, 0), "Tier": TIERS[2][0], "Coverage": TIERS[2][1],
+              "Premium": TIERS[2][2]}
+    db.save_history("a@example.com", {**record, "Risk_Score": 0.2})
+    db.save_history_batch("a@example.com", [{**record, "Risk_Score": r} for r in (0.9, 0.1, 0.5)])
+    summary = db.get_user_summary("a@example.com")
+    assert summary["count"] == 4
+    assert summary["max_risk"] == 0.9
+    assert summary["avg_risk"] == pytest.approx(1.7 / 4)
+    # the batch shares one timestamp: its last row is the latest
+    assert summary["latest_risk"] == 0.5
+    assert summary["tiers"] == {TIERS[2][0]: 4}
+
+
+def test_summary_stays_consistent_across_archiving(db):
+    db.ensure_schema()
+    rng, now = random.Random(5), int(time.time())
+    emails = ["a@example.com", "b@example.com"]
+    # oldest first, as in production, so archiving has whole months to move
+    inserted = sorted(random_rows(db, 300, emails, rng, now), key=lambda r: r[1])
+    db.write_transaction(lambda conn: db._insert_history(conn, inserted))
+    before = {e: db.get_user_summary(e) for e in emails}
+    assert db.archive_history(older_than_days=60)
+    more = random_rows(db, 20, emails, rng, now)
+    db.write_transaction(lambda conn: db._insert_history(conn, more))
+    inserted += more
+    for email in emails:
+        assert_summary(db, inserted, email)
+        assert db.get_user_summary(email)["count"] == before[email]["count"] + sum(r[0] == email for r in more)
+
+
+def test_risk_trend_is_oldest_first_with_ties_in_insert_order(db):
+    db.ensure_schema()
+    rng, now = random.Random(7), int(time.time())
+    rows = random_rows(db, 120, ["a@example.com", "b@example.com"], rng, now)
+    db.write_transaction(lambda conn: db._insert_history(conn, rows))
+    risk = 2 + db.HISTORY_FIELDS.index("Risk_Score")
+    for email in ("a@example.com", "b@example.com"):
+        mine = sorted((r[1], i, r[risk]) for i, r in enumerate(rows) if r[0] == email)
+        trend = db.get_risk_trend(email)
+        assert [p[1] for p in trend] == [m[2] for m in mine]
+        assert [p[0] for p in trend] == sorted(p[0] for p in trend)
+    assert db.get_risk_trend("nobody@example.com") == []
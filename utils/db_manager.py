@@ -1,131 +1,1238 @@
 import sqlite3
+import atexit
+import base64
+import collections
+import csv
 import datetime
+import glob
 import hashlib
+import hmac
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils import metrics
+
+log = logging.getLogger(__name__)
 
 DB_PATH = "user_history.db"
 
-def init_user_db():
-    print("Initializing user DB...")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.02
+
+
+class ConnectionPool:
+    """Small pool of tuned SQLite connections for one database file.
+
+    Streamlit runs every rerun on a fresh script thread, so plain thread-locals
+    would almost never be reused. Instead each connection is handed to one
+    thread at a time and returned to the pool afterwards; idle connections
+    beyond ``size`` are closed.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves (see write_transaction)
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+        # only takes effect on a brand-new file; enable_incremental_vacuum() converts old ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool for the current DB_PATH (looked up each call so DB_PATH can be changed)."""
+    with _pools_lock:
+        pool = _pools.get(DB_PATH)
+        if pool is None:
+            pool = _pools[DB_PATH] = ConnectionPool(DB_PATH)
+        return pool
+
+
+def close_all_connections():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def _is_busy(exc):
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+_BUSY_RETRIES = metrics.counter("cardiocare_db_busy_retries_total",
+                                "Transactions retried because the database was locked")
+_READ_SECONDS = metrics.histogram("cardiocare_db_transaction_seconds",
+                                  "Time holding a pooled connection, retries included", kind="read")
+_WRITE_SECONDS = metrics.histogram("cardiocare_db_transaction_seconds", kind="write")
+
+
+def _db_call(name):
+    # Latency of one public db_manager function, per call name
+    return metrics.timed("cardiocare_db_call_seconds", "Latency of db_manager calls", call=name)
+
+
+def _with_retry(fn):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == MAX_RETRIES:
+                raise
+        _BUSY_RETRIES.inc()
+        time.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+
+
+def read(work):
+    """Run ``work(conn)`` on a pooled connection, retrying if the DB is busy."""
+    def attempt():
+        with get_pool().connection() as conn:
+            return work(conn)
+    with _READ_SECONDS.time():
+        return _with_retry(attempt)
+
+
+def write_transaction(work):
+    """Run ``work(conn)`` inside BEGIN IMMEDIATE/COMMIT, retrying if the DB is busy.
+
+    Taking the write lock up front avoids the deferred-transaction upgrade
+    that makes SQLite fail immediately with "database is locked".
+    """
+    def attempt():
+        with get_pool().connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn)
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.rollback()
+                raise
+    with _WRITE_SECONDS.time():
+        return _with_retry(attempt)
+
+
+USERS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE,
+        password_hash TEXT,
+        created_at TEXT
+    )
+"""
+
+# The original history table. Fresh databases still start from it and are
+# upgraded by MIGRATIONS like any old one (it is empty then, so that's free).
+HISTORY_V0_SQL = """
+    CREATE TABLE IF NOT EXISTS prediction_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT,
+        timestamp TEXT,
+        Age INTEGER,
+        RestingBP INTEGER,
+        Cholesterol INTEGER,
+        MaxHR INTEGER,
+        Diabetes INTEGER,
+        Hypertension INTEGER,
+        Heart_Condition INTEGER,
+        Vaccinated INTEGER,
+        Hospitalized INTEGER,
+        Vaccine_Type INTEGER,
+        Doses INTEGER,
+        Days_Since_Vaccine INTEGER,
+        Risk_Score REAL,
+        Prediction INTEGER,
+        Tier TEXT,
+        Coverage TEXT,
+        Premium TEXT
+    )
+"""
+
+MIGRATION_BATCH_ROWS = 20_000
+
+# Local "YYYY-MM-DD HH:MM:SS" text <-> epoch seconds, as SQL expressions
+_TEXT_TO_EPOCH = "CAST(strftime('%s', {}, 'utc') AS INTEGER)"
+_EPOCH_TO_TEXT = "datetime({}, 'unixepoch', 'localtime')"
+
+
+def _normalize_history(version, batch_size=None):
+    """Migration 3: prediction_history -> predictions + users + tiers.
+
+    Timestamps become epoch seconds, the email a users.id, and the three
+    tier strings one code into the tiers lookup table. The old table is
+    renamed to legacy_history and copied over in id order, one short
+    transaction per ``batch_size`` rows, with progress saved in
+    migration_progress so an interrupted upgrade resumes where it stopped.
+    New rows go straight to predictions meanwhile: its id sequence starts
+    above the legacy ids. prediction_history is recreated as a view with
+    the old columns for ad-hoc queries.
+    """
+    batch_size = batch_size or MIGRATION_BATCH_ROWS
+
+    def prepare(conn):
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            return False
+        conn.execute(USERS_TABLE_SQL)
+        conn.execute("""CREATE TABLE IF NOT EXISTS tiers (
+            code INTEGER PRIMARY KEY,
+            tier TEXT NOT NULL,
+            coverage TEXT,
+            premium TEXT,
+            UNIQUE (tier, coverage, premium)
+        )""")
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS predictions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE,
-            password_hash TEXT,
-            created_at TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("User DB initialized.")
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            ts INTEGER NOT NULL,
+            {", ".join(f"{f} {'REAL' if f == 'Risk_Score' else 'INTEGER'}" for f in _HISTORY_VALUES)},
+            tier_code INTEGER REFERENCES tiers (code)
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_user_ts ON predictions (user_id, ts)")
+        conn.execute("CREATE TABLE IF NOT EXISTS migration_progress (version INTEGER PRIMARY KEY, last_id INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO migration_progress VALUES (?, 0)", (version,))
+        kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'prediction_history'").fetchone()
+        if kind and kind[0] == "table":
+            conn.execute("DROP INDEX IF EXISTS idx_history_email_ts")
+            conn.execute("ALTER TABLE prediction_history RENAME TO legacy_history")
+            top = conn.execute("SELECT MAX(id) FROM legacy_history").fetchone()[0] or 0
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'predictions'").fetchone()
+            if seq is None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('predictions', ?)", (top,))
+            elif seq[0] < top:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'predictions'", (top,))
+        # user_summary timestamps move to epoch too (new writes store epoch from now on)
+        ts_type = conn.execute("SELECT type FROM pragma_table_info('user_summary') WHERE name = 'first_ts'").fetchone()
+        if ts_type and ts_type[0] == "TEXT":
+            conn.execute("""CREATE TABLE user_summary_epoch (
+                email TEXT PRIMARY KEY,
+                n INTEGER NOT NULL,
+                risk_sum REAL NOT NULL,
+                risk_max REAL,
+                first_ts INTEGER,
+                latest_ts INTEGER,
+                latest_risk REAL
+            )""")
+            conn.execute(f"""INSERT INTO user_summary_epoch
+                SELECT email, n, risk_sum, risk_max, {_TEXT_TO_EPOCH.format('first_ts')},
+                       {_TEXT_TO_EPOCH.format('latest_ts')}, latest_risk FROM user_summary""")
+            conn.execute("DROP TABLE user_summary")
+            conn.execute("ALTER TABLE user_summary_epoch RENAME TO user_summary")
+        return True
+
+    def copy_batch(conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'legacy_history'").fetchone() is None:
+            return None
+        last = conn.execute("SELECT last_id FROM migration_progress WHERE version = ?", (version,)).fetchone()[0]
+        hi = conn.execute("SELECT MAX(id) FROM (SELECT id FROM legacy_history WHERE id > ? ORDER BY id LIMIT ?)",
+                          (last, batch_size)).fetchone()[0]
+        if hi is None:
+            return None
+        span = (last, hi)
+        conn.execute("INSERT OR IGNORE INTO users (email) SELECT DISTINCT COALESCE(email, '') "
+                     "FROM legacy_history WHERE id > ? AND id <= ?", span)
+        conn.execute("INSERT OR IGNORE INTO tiers (tier, coverage, premium) SELECT DISTINCT Tier, Coverage, Premium "
+                     "FROM legacy_history WHERE id > ? AND id <= ? AND Tier IS NOT NULL", span)
+        conn.execute(f"""INSERT INTO predictions (id, user_id, ts, {", ".join(_HISTORY_VALUES)}, tier_code)
+            SELECT h.id, u.id, COALESCE({_TEXT_TO_EPOCH.format('h.timestamp')}, 0),
+                   {", ".join(f"h.{f}" for f in _HISTORY_VALUES)}, t.code
+            FROM legacy_history h
+            JOIN users u ON u.email = COALESCE(h.email, '')
+            LEFT JOIN tiers t ON t.tier = h.Tier AND t.coverage IS h.Coverage AND t.premium IS h.Premium
+            WHERE h.id > ? AND h.id <= ?""", span)
+        conn.execute("UPDATE migration_progress SET last_id = ? WHERE version = ?", (hi, version))
+        return hi
+
+    def finish(conn):
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            return
+        if copy_batch(conn) is not None:  # someone else may have migrated concurrently; never drop uncopied rows
+            return finish(conn)
+        conn.execute("DROP TABLE IF EXISTS legacy_history")
+        conn.execute(f"CREATE VIEW IF NOT EXISTS prediction_history AS {_SELECT_HISTORY}")
+        conn.execute("DELETE FROM migration_progress WHERE version = ?", (version,))
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    if not write_transaction(prepare):
+        return
+    batches = 0
+    while (last_id := write_transaction(copy_batch)) is not None:
+        batches += 1
+        if batches % 10 == 0:
+            log.info("Migration %d: copied history up to id %s", version, f"{last_id:,}")
+    write_transaction(finish)
+
+
+# Schema migrations, applied in order and tracked in PRAGMA user_version.
+# Each entry is (version, statements): a list of SQL run in one transaction,
+# or, for data moves too big for one, a function(version) that commits in
+# batches and sets user_version itself. Never edit one that has shipped.
+MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_history_email_ts ON prediction_history (email, timestamp)",
+    ]),
+    # Per-user aggregates kept current by _insert_history, backfilled once here
+    (2, [
+        """CREATE TABLE IF NOT EXISTS user_summary (
+            email TEXT PRIMARY KEY,
+            n INTEGER NOT NULL,
+            risk_sum REAL NOT NULL,
+            risk_max REAL,
+            first_ts TEXT,
+            latest_ts TEXT,
+            latest_risk REAL
+        )""",
+        """CREATE TABLE IF NOT EXISTS user_tier_counts (
+            email TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (email, tier)
+        )""",
+        """INSERT OR REPLACE INTO user_summary
+           SELECT email, COUNT(*), TOTAL(Risk_Score), MAX(Risk_Score), MIN(timestamp), MAX(timestamp),
+                  (SELECT h2.Risk_Score FROM prediction_history h2 WHERE h2.email = h.email
+                   ORDER BY h2.timestamp DESC, h2.id DESC LIMIT 1)
+           FROM prediction_history h GROUP BY email""",
+        """INSERT OR REPLACE INTO user_tier_counts
+           SELECT email, Tier, COUNT(*) FROM prediction_history
+           WHERE Tier IS NOT NULL GROUP BY email, Tier""",
+    ]),
+    # Normalized, compact history: epoch ts, user_id, tier code (see _normalize_history)
+    (3, _normalize_history),
+]
+
+
+def migrate(target=None):
+    """Bring the database up to the latest MIGRATIONS version (or ``target``)."""
+    current = read(lambda conn: conn.execute("PRAGMA user_version").fetchone()[0])
+    for version, statements in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        if callable(statements):
+            statements(version)
+        else:
+            def work(conn):
+                # re-checked under the write lock in case another process got here first
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    return
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+            write_transaction(work)
+        log.info("Applied DB migration %d", version)
+
+
+def init_user_db():
+    write_transaction(lambda conn: conn.execute(USERS_TABLE_SQL))
 
 def init_db():
-    print("Initializing prediction history DB...")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS prediction_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT,
-            timestamp TEXT,
-            Age INTEGER,
-            RestingBP INTEGER,
-            Cholesterol INTEGER,
-            MaxHR INTEGER,
-            Diabetes INTEGER,
-            Hypertension INTEGER,
-            Heart_Condition INTEGER,
-            Vaccinated INTEGER,
-            Hospitalized INTEGER,
-            Vaccine_Type INTEGER,
-            Doses INTEGER,
-            Days_Since_Vaccine INTEGER,
-            Risk_Score REAL,
-            Prediction INTEGER,
-            Tier TEXT,
-            Coverage TEXT,
-            Premium TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-    print("Prediction history DB initialized.")
-
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    def create(conn):
+        # only a brand-new database needs the v0 table; later versions replace it
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            conn.execute(HISTORY_V0_SQL)
+    write_transaction(create)
+    migrate()
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """Create or upgrade DB_PATH's schema once per process.
+
+    Pages call this on every Streamlit rerun: after the first call it is a
+    set lookup, and a process that finds the stored PRAGMA user_version
+    already at SCHEMA_VERSION only reads that one value.
+    """
+    path = DB_PATH
+    if path in _schema_ready:
+        return
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        current = read(lambda conn: conn.execute("PRAGMA user_version").fetchone()[0])
+        if current < SCHEMA_VERSION:
+            init_user_db()
+            init_db()
+        _schema_ready.add(path)
+
+# Password hashing. Stored hashes name their KDF and cost, so the setting can
+# change at any time: "scrypt$n=16384,r=8,p=1$<salt>$<hash>" (base64), or
+# "pbkdf2_sha256$iterations=600000$<salt>$<hash>". The original unsalted
+# sha256 hex digests still verify and are rehashed on the next login.
+# Configure with CARDIOCARE_PASSWORD_KDF, e.g. "scrypt:n=32768,r=8,p=1".
+def _scrypt(password, salt, n, r, p):
+    # OpenSSL refuses more than 32 MB unless told; scrypt needs 128*r*n bytes
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, dklen=32,
+                          maxmem=128 * r * (n + p + 2) + (1 << 20))
+
+
+def _pbkdf2_sha256(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password, salt, iterations)
+
+
+# name -> (derive(password_bytes, salt, **params), default params)
+KDFS = {
+    "scrypt": (_scrypt, {"n": 2 ** 14, "r": 8, "p": 1}),
+    "pbkdf2_sha256": (_pbkdf2_sha256, {"iterations": 600_000}),
+}
+SALT_BYTES = 16
+KDF_WORKERS = int(os.environ.get("CARDIOCARE_KDF_WORKERS", 0)) or max(1, min(4, os.cpu_count() or 1))
+KDF_MAX_PENDING = 8 * KDF_WORKERS
+KDF_QUEUE_TIMEOUT = 10.0
+
+
+def parse_kdf_setting(setting):
+    """``"scrypt:n=32768,r=8"`` -> ("scrypt", {"n": 32768, "r": 8, "p": 1})."""
+    name, _, params = setting.partition(":")
+    if name not in KDFS:
+        raise ValueError(f"Unknown password KDF {name!r}; choose from {', '.join(KDFS)}")
+    merged = dict(KDFS[name][1])
+    for item in filter(None, params.split(",")):
+        key, _, value = item.partition("=")
+        if key.strip() not in merged:
+            raise ValueError(f"Unknown {name} parameter {key.strip()!r}")
+        merged[key.strip()] = int(value)
+    return name, merged
+
+
+PASSWORD_KDF = parse_kdf_setting(os.environ.get("CARDIOCARE_PASSWORD_KDF", "scrypt"))
+
+
+def set_password_kdf(setting):
+    """Hash new and upgraded passwords with ``setting`` from now on."""
+    global PASSWORD_KDF
+    PASSWORD_KDF = parse_kdf_setting(setting)
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str, kdf=None) -> str:
+    """Salted hash of ``password`` with the configured (or given) KDF."""
+    name, params = kdf or PASSWORD_KDF
+    salt = os.urandom(SALT_BYTES)
+    digest = KDFS[name][0](password.encode(), salt, **params)
+    encoded = ",".join(f"{k}={v}" for k, v in params.items())
+    return f"{name}${encoded}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored) -> tuple:
+    """``(matches, needs_rehash)`` for ``password`` against a stored hash.
+
+    ``needs_rehash`` is true for legacy sha256 hashes and for hashes made
+    with a different KDF or cost than PASSWORD_KDF.
+    """
+    if not stored:
+        return False, False
+    if "$" not in stored:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+    try:
+        name, encoded, salt, digest = stored.split("$")
+        params = {k: int(v) for k, v in (item.split("=") for item in encoded.split(","))}
+        derived = KDFS[name][0](password.encode(), _unb64(salt), **params)
+    except (KeyError, ValueError) as e:
+        # the type only: the message can quote parts of the stored hash
+        log.warning("Unreadable password hash (%s)", type(e).__name__)
+        return False, False
+    return hmac.compare_digest(derived, _unb64(digest)), (name, params) != PASSWORD_KDF
+
+
+_kdf_pool = None
+_kdf_slots = threading.BoundedSemaphore(KDF_MAX_PENDING)
+_kdf_lock = threading.Lock()
+
+
+_KDF_SECONDS = metrics.histogram("cardiocare_password_kdf_seconds",
+                                 "Password hash/verify time, waiting for the KDF pool included")
+_KDF_REJECTED = metrics.counter("cardiocare_password_kdf_rejected_total",
+                                "Hashing calls turned away because the KDF queue was full")
+
+
+def _run_kdf(fn, *args):
+    """Run a hashing call on the bounded KDF pool and wait for it.
+
+    KDFs release the GIL, so other sessions keep running while one hashes.
+    At most KDF_WORKERS hashes run at once, which caps CPU and scrypt
+    memory under a login burst, and at most KDF_MAX_PENDING wait; past
+    that, callers wait up to KDF_QUEUE_TIMEOUT for a slot and then get
+    TimeoutError instead of piling up.
+    """
+    global _kdf_pool
+    if _kdf_pool is None:
+        with _kdf_lock:
+            if _kdf_pool is None:
+                _kdf_pool = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="kdf")
+    with _KDF_SECONDS.time():
+        if not _kdf_slots.acquire(timeout=KDF_QUEUE_TIMEOUT):
+            _KDF_REJECTED.inc()
+            raise TimeoutError("Too many logins in progress; try again shortly")
+        try:
+            return _kdf_pool.submit(fn, *args).result()
+        finally:
+            _kdf_slots.release()
+
+
+# Verified against for unknown emails, so they take as long as real ones
+_dummy_hashes = {}
+
+
+def _dummy_hash():
+    key = (PASSWORD_KDF[0], tuple(PASSWORD_KDF[1].items()))
+    if key not in _dummy_hashes:
+        _dummy_hashes[key] = hash_password(os.urandom(8).hex())
+    return _dummy_hashes[key]
+
+
+def _signups(result):
+    return metrics.counter("cardiocare_signups_total", "create_user() calls by outcome", result=result)
+
+
+def _logins(result):
+    return metrics.counter("cardiocare_logins_total", "authenticate_user() calls by outcome", result=result)
+
+
+_PASSWORD_UPGRADES = metrics.counter("cardiocare_password_rehash_total",
+                                     "Stored hashes upgraded to the current KDF at login")
 
+
+@_db_call("create_user")
 def create_user(email: str, password: str) -> bool:
-    print(f"Creating user: {email}")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
+        password_hash = _run_kdf(hash_password, password)
+        # History may already have created a placeholder row (no password) for
+        # this email; signing up claims it, an existing account is left alone.
+        created = write_transaction(lambda conn: conn.execute("""
             INSERT INTO users (email, password_hash, created_at)
             VALUES (?, ?, ?)
-        """, (email.strip().lower(), hash_password(password), datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        print(f"User {email} created successfully.")
+            ON CONFLICT(email) DO UPDATE SET
+                password_hash = excluded.password_hash, created_at = excluded.created_at
+            WHERE users.password_hash IS NULL
+        """, (email.strip().lower(), password_hash, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).rowcount)
+        if not created:
+            _signups("exists").inc()
+            return False
+        _signups("created").inc()
         return True
     except sqlite3.IntegrityError as e:
-        print(f"IntegrityError: {e}")  # Print exact error
-        print(f"User {email} already exists or some constraint violated.")
+        _signups("exists").inc()
+        log.warning("User creation hit a constraint: %s", e)
         return False
-    except Exception as e:
-        print(f"Unexpected error during user creation: {e}")
+    except Exception:
+        _signups("error").inc()
+        log.exception("Unexpected error during user creation")
         return False
-    finally:
-        conn.close()
 
+@_db_call("authenticate_user")
 def authenticate_user(email: str, password: str) -> bool:
     email = email.strip().lower()
-    print(f"Authenticating user: '{email}'")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT password_hash FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        print(f"User found. Stored hash: {row[0]}")
-    else:
-        print("User not found.")
-    if row and row[0] == hash_password(password):
-        print("Password match. Authentication successful.")
+    row = read(lambda conn: conn.execute(
+        "SELECT password_hash FROM users WHERE email = ?", (email,)
+    ).fetchone())
+    stored = row[0] if row and row[0] else None
+    try:
+        ok, needs_rehash = _run_kdf(verify_password, password, stored or _dummy_hash())
+    except TimeoutError as e:
+        _logins("busy").inc()
+        log.warning("Authentication skipped: %s", e)
+        return False
+    if stored and ok:
+        if needs_rehash:
+            # Upgrade to the current KDF now that we know the password; only
+            # if nobody changed the hash meanwhile. The login stands either
+            # way: a busy KDF pool or a locked DB just defers it to next time.
+            try:
+                new_hash = _run_kdf(hash_password, password)
+                write_transaction(lambda conn: conn.execute(
+                    "UPDATE users SET password_hash = ? WHERE email = ? AND password_hash = ?",
+                    (new_hash, email, stored)))
+                _PASSWORD_UPGRADES.inc()
+            except (TimeoutError, sqlite3.Error) as e:
+                log.warning("Password hash upgrade deferred: %s", e)
+        _logins("ok").inc()
         return True
     else:
-        print("Password mismatch or user not found. Authentication failed.")
+        _logins("failed").inc()
         return False
 
+HISTORY_FIELDS = [
+    "Age", "RestingBP", "Cholesterol", "MaxHR",
+    "Diabetes", "Hypertension", "Heart_Condition", "Vaccinated",
+    "Hospitalized", "Vaccine_Type", "Doses", "Days_Since_Vaccine",
+    "Risk_Score", "Prediction", "Tier", "Coverage", "Premium"
+]
+
+# Stored as-is in predictions; Tier/Coverage/Premium go through the tiers table
+_HISTORY_VALUES = HISTORY_FIELDS[:HISTORY_FIELDS.index("Tier")]
+
+INSERT_HISTORY_SQL = f"""
+    INSERT INTO predictions (user_id, ts, {", ".join(_HISTORY_VALUES)}, tier_code)
+    VALUES ({", ".join("?" * (len(_HISTORY_VALUES) + 3))})
+"""
+
+_RISK = 2 + HISTORY_FIELDS.index("Risk_Score")
+_TIER = 2 + HISTORY_FIELDS.index("Tier")
+
+UPSERT_SUMMARY_SQL = """
+    INSERT INTO user_summary (email, n, risk_sum, risk_max, first_ts, latest_ts, latest_risk)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(email) DO UPDATE SET
+        n = n + excluded.n,
+        risk_sum = risk_sum + excluded.risk_sum,
+        risk_max = MAX(COALESCE(risk_max, excluded.risk_max), excluded.risk_max),
+        first_ts = MIN(COALESCE(first_ts, excluded.first_ts), excluded.first_ts),
+        latest_risk = CASE WHEN latest_ts IS NULL OR excluded.latest_ts >= latest_ts
+                           THEN excluded.latest_risk ELSE latest_risk END,
+        latest_ts = MAX(COALESCE(latest_ts, excluded.latest_ts), excluded.latest_ts)
+"""
+
+UPSERT_TIER_SQL = """
+    INSERT INTO user_tier_counts (email, tier, n) VALUES (?, ?, ?)
+    ON CONFLICT(email, tier) DO UPDATE SET n = n + excluded.n
+"""
+
+
+def _lookup_id(conn, select, insert, key):
+    row = conn.execute(select, key).fetchone()
+    if row is None:
+        return conn.execute(insert, key).lastrowid
+    return row[0]
+
+
+def _insert_history(conn, rows):
+    """Insert history rows and fold them into the per-user summary tables.
+
+    ``rows`` are ``(email, epoch_ts, *HISTORY_FIELDS)``; emails and tier
+    strings are resolved to users.id and tiers.code here (users seen for
+    the first time get a row without a password). Runs inside the caller's
+    transaction, so the summary can never disagree with the history.
+    Aggregates per email in Python first: one upsert per user (and tier)
+    however many rows are written.
+    """
+    user_ids, tier_codes, values = {}, {None: None}, []
+    for r in rows:
+        if r[0] not in user_ids:
+            user_ids[r[0]] = _lookup_id(conn, "SELECT id FROM users WHERE email = ?",
+                                        "INSERT INTO users (email) VALUES (?)", (r[0],))
+        tier = tuple(r[_TIER:_TIER + 3]) if r[_TIER] is not None else None
+        if tier not in tier_codes:
+            tier_codes[tier] = _lookup_id(
+                conn, "SELECT code FROM tiers WHERE tier = ? AND coverage IS ? AND premium IS ?",
+                "INSERT INTO tiers (tier, coverage, premium) VALUES (?, ?, ?)", tier)
+        values.append((user_ids[r[0]], *r[1:_TIER], tier_codes[tier]))
+    conn.executemany(INSERT_HISTORY_SQL, values)
+    users, tiers = {}, collections.Counter()
+    for r in rows:
+        email, ts, risk = r[0], r[1], r[_RISK]
+        agg = users.get(email)
+        if agg is None:
+            users[email] = [1, risk or 0.0, risk, ts, ts, risk]
+        else:
+            agg[0] += 1
+            agg[1] += risk or 0.0
+            if risk is not None and (agg[2] is None or risk > agg[2]):
+                agg[2] = risk
+            agg[3] = min(agg[3], ts)
+            if ts >= agg[4]:
+                agg[4], agg[5] = ts, risk
+        if r[_TIER] is not None:
+            tiers[(email, r[_TIER])] += 1
+    conn.executemany(UPSERT_SUMMARY_SQL, [(email, *agg) for email, agg in users.items()])
+    conn.executemany(UPSERT_TIER_SQL, [(email, tier, n) for (email, tier), n in tiers.items()])
+
+
+_FLUSH = object()
+_STOP = object()
+
+_HISTORY_ROWS = metrics.counter("cardiocare_history_rows_written_total", "Prediction rows committed")
+_HISTORY_DROPPED = metrics.counter("cardiocare_history_rows_dropped_total",
+                                   "Queued prediction rows that could not be written")
+_HISTORY_QUEUE_FULL = metrics.counter("cardiocare_history_queue_full_total",
+                                      "save_history calls written synchronously because the queue was full")
+_WRITER_BATCH_SECONDS = metrics.histogram("cardiocare_history_writer_batch_seconds",
+                                          "Time to commit one write-behind batch")
+
+
+class HistoryWriter:
+    """Background write-behind queue for save_history.
+
+    Rows are queued with their timestamp already fixed and a daemon thread
+    inserts them with executemany once ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds have passed. The queue is bounded: when it
+    stays full for ``put_timeout`` seconds, submit() raises queue.Full and
+    the caller writes synchronously instead, as it does once the writer is
+    closed. Pending rows are counted per email so readers can wait for just
+    their own writes (wait_for).
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.5, maxsize=10000, put_timeout=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = collections.Counter()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._submitting = 0  # submit() calls between the closed check and their put
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, params):
+        email = params[0]
+        with self._cond:
+            # close() waits for submits past this check, so no row lands behind _STOP
+            if self._closed:
+                raise RuntimeError("HistoryWriter is closed")
+            self._pending[email] += 1
+            self._submitting += 1
+        try:
+            self._queue.put(params, timeout=self.put_timeout)
+        except queue.Full:
+            self._done([params])
+            raise
+        finally:
+            with self._cond:
+                self._submitting -= 1
+                self._cond.notify_all()
+
+    def flush(self):
+        """Ask the writer to insert whatever is queued without waiting for the interval."""
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass  # a full queue is already a full batch: the writer isn't waiting
+
+    def wait_for(self, email, timeout=5.0):
+        """Block until every queued row for ``email`` is committed (read-your-writes)."""
+        with self._cond:
+            if not self._pending[email]:
+                return True
+        self.flush()
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending[email], timeout=timeout)
+
+    def close(self, timeout=10.0):
+        """Flush everything still queued and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.wait_for(lambda: not self._submitting)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _done(self, rows):
+        with self._cond:
+            for params in rows:
+                self._pending[params[0]] -= 1
+                if self._pending[params[0]] <= 0:
+                    del self._pending[params[0]]
+            self._cond.notify_all()
+
+    def _write(self, rows):
+        try:
+            with _WRITER_BATCH_SECONDS.time():
+                write_transaction(lambda conn: _insert_history(conn, rows))
+            _HISTORY_ROWS.inc(len(rows))
+        except Exception as e:
+            # Don't let one bad row sink the batch: retry individually
+            log.warning("History batch of %d failed (%s); retrying row by row", len(rows), e)
+            for params in rows:
+                try:
+                    write_transaction(lambda conn: _insert_history(conn, [params]))
+                    _HISTORY_ROWS.inc()
+                except Exception as row_error:
+                    _HISTORY_DROPPED.inc()
+                    log.error("Dropped a history row: %s", row_error)
+        finally:
+            self._done(rows)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    if batch:
+                        self._write(batch)
+                    return
+                if item is _FLUSH:
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+
+WRITE_BEHIND = os.environ.get("CARDIOCARE_HISTORY_WRITE_BEHIND", "0") == "1"
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def enable_write_behind(**kwargs):
+    """Route save_history through a background HistoryWriter (flushed at exit)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter(**kwargs)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def disable_write_behind():
+    """Flush and stop the background writer; save_history writes synchronously again."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+        atexit.unregister(writer.close)
+
+
+def _get_writer():
+    if _writer is None and WRITE_BEHIND:
+        return enable_write_behind()
+    return _writer
+
+
+def _await_pending(email):
+    if _writer is not None:
+        _writer.wait_for(email)
+
+
+@_db_call("save_history")
 def save_history(email, data):
-    print(f"Saving history for {email}")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO prediction_history (
-            email, timestamp, Age, RestingBP, Cholesterol, MaxHR,
-            Diabetes, Hypertension, Heart_Condition, Vaccinated,
-            Hospitalized, Vaccine_Type, Doses, Days_Since_Vaccine,
-            Risk_Score, Prediction, Tier, Coverage, Premium
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        email, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        data["Age"], data["RestingBP"], data["Cholesterol"], data["MaxHR"],
-        data["Diabetes"], data["Hypertension"], data["Heart_Condition"],
-        data["Vaccinated"], data["Hospitalized"], data["Vaccine_Type"],
-        data["Doses"], data["Days_Since_Vaccine"],
-        data["Risk_Score"], data["Prediction"], data["Tier"],
-        data["Coverage"], data["Premium"]
-    ))
-    conn.commit()
-    conn.close()
-    print(f"History saved for {email}")
-
-def get_user_history(email):
-    print(f"Fetching history for {email}")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM prediction_history WHERE email = ? ORDER BY timestamp DESC", (email,))
-    rows = cursor.fetchall()
-    conn.close()
+    ts = int(time.time())
+    params = (email, ts, *(data[f] for f in HISTORY_FIELDS))
+    writer = _get_writer()
+    if writer is not None:
+        try:
+            writer.submit(params)
+            return
+        except (queue.Full, RuntimeError):
+            _HISTORY_QUEUE_FULL.inc()
+    write_transaction(lambda conn: _insert_history(conn, [params]))
+    _HISTORY_ROWS.inc()
+
+@_db_call("save_history_batch")
+def save_history_batch(email, records):
+    """Insert many prediction rows for one user in a single transaction.
+
+    ``records`` is an iterable of dicts with the same keys save_history expects.
+    Returns the number of rows written.
+    """
+    ts = int(time.time())
+    rows = [(email, ts, *(r[f] for f in HISTORY_FIELDS)) for r in records]
+    write_transaction(lambda conn: _insert_history(conn, rows))
+    _HISTORY_ROWS.inc(len(rows))
+    return len(rows)
+
+HISTORY_COLUMNS = ["id", "email", "timestamp", *HISTORY_FIELDS]
+# How each HISTORY_COLUMNS entry is read back from the normalized tables
+_COLUMN_SQL = {
+    "id": "p.id", "email": "u.email", "timestamp": _EPOCH_TO_TEXT.format("p.ts"),
+    **{f: f"p.{f}" for f in _HISTORY_VALUES},
+    "Tier": "t.tier", "Coverage": "t.coverage", "Premium": "t.premium",
+}
+_FROM_HISTORY = ("FROM predictions p JOIN users u ON u.id = p.user_id "
+                 "LEFT JOIN tiers t ON t.code = p.tier_code")
+_HISTORY_SELECT_LIST = ", ".join(f"{_COLUMN_SQL[c]} AS {c}" for c in HISTORY_COLUMNS)
+_SELECT_HISTORY = f"SELECT {_HISTORY_SELECT_LIST} {_FROM_HISTORY}"
+_WHERE_USER = "WHERE p.user_id = (SELECT id FROM users WHERE email = ?)"
+
+def _format_ts(ts):
+    return None if ts is None else datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+@_db_call("get_user_history")
+def get_user_history(email, include_archive=True):
+    """A user's whole history, newest first, including archived months."""
+    _await_pending(email)
+    rows = read(lambda conn: conn.execute(
+        f"{_SELECT_HISTORY} {_WHERE_USER} ORDER BY p.ts DESC, p.id DESC", (email,)
+    ).fetchall())
+    if include_archive:
+        for archived in iter_archived_history(email):
+            rows.extend(archived)
+        # months never overlap, but rows right at the cutoff can sit on either side of it
+        rows.sort(key=lambda r: (r[2], r[0]), reverse=True)
     return rows
+
+@_db_call("get_user_history_page")
+def get_user_history_page(email, limit=50, cursor=None):
+    """One page of a user's history, newest first, using keyset pagination.
+
+    ``cursor`` is the opaque ``(epoch_ts, id)`` of the last row already
+    shown (None for the first page). Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is None once there are no more rows. Served from
+    idx_predictions_user_ts, so cost depends on ``limit``, not on how deep
+    into the history we are.
+    """
+    _await_pending(email)
+    # p.ts rides along as a last column for the cursor and is cut off below
+    select = f"SELECT {_HISTORY_SELECT_LIST}, p.ts {_FROM_HISTORY} {_WHERE_USER}"
+    if cursor is None:
+        sql = f"{select} ORDER BY p.ts DESC, p.id DESC LIMIT ?"
+        params = (email, limit + 1)
+    else:
+        ts, last_id = cursor
+        sql = (f"{select} AND p.ts <= ? AND (p.ts < ? OR p.id < ?) "
+               "ORDER BY p.ts DESC, p.id DESC LIMIT ?")
+        params = (email, ts, ts, last_id, limit + 1)
+    rows = read(lambda conn: conn.execute(sql, params).fetchall())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][-1], rows[-1][0])
+    return [r[:-1] for r in rows], next_cursor
+
+def iter_user_history(email, chunk_size=1000):
+    """Yield a user's history in chunks of at most ``chunk_size`` rows."""
+    cursor = None
+    while True:
+        rows, cursor = get_user_history_page(email, limit=chunk_size, cursor=cursor)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+
+def iter_history_since(last_id=0, chunk_size=50_000, upto_id=None, include_archive=False):
+    """Yield all users' history rows with ``last_id < id <= upto_id`` in id order.
+
+    Each chunk is its own short query keyed on the primary key, so no read
+    transaction stays open across the whole scan and writers are never
+    held up. ``upto_id`` defaults to the current max id, fixing the end of
+    the scan before it starts. With ``include_archive`` the archived months
+    come first (see iter_archived_history_since).
+    """
+    if include_archive:
+        for rows in iter_archived_history_since(last_id, chunk_size):
+            # archives hold the oldest ids; a row still being moved is in both
+            # files, so the live scan resumes after the last archived id
+            last_id = max(last_id, rows[-1][0])
+            yield rows
+    if upto_id is None:
+        upto_id = read(lambda conn: conn.execute("SELECT MAX(id) FROM predictions").fetchone()[0]) or 0
+    sql = f"{_SELECT_HISTORY} WHERE p.id > ? AND p.id <= ? ORDER BY p.id LIMIT ?"
+    while last_id < upto_id:
+        rows = read(lambda conn: conn.execute(sql, (last_id, upto_id, chunk_size)).fetchall())
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+@_db_call("export_history_csv")
+def export_history_csv(email, out, chunk_size=1000, include_archive=True):
+    """Write a user's history as CSV to text file ``out``, one chunk at a time.
+
+    Archived months follow the live rows, newest first. Returns the number
+    of rows written.
+    """
+    writer = csv.writer(out)
+    writer.writerow(["ID", "Email", "Timestamp", *HISTORY_FIELDS])
+    total = 0
+    chunks = iter_user_history(email, chunk_size=chunk_size)
+    if include_archive:
+        chunks = itertools.chain(chunks, iter_archived_history(email))
+    for rows in chunks:
+        writer.writerows(rows)
+        total += len(rows)
+    return total
+
+@_db_call("get_user_summary")
+def get_user_summary(email):
+    """Aggregates over a user's whole history, read from the summary tables.
+
+    Returns None if the user has no history, else a dict with count,
+    latest_risk, latest_ts, first_ts, avg_risk, max_risk and tiers
+    ({tier: count}). Constant time however long the history is.
+    """
+    _await_pending(email)
+
+    def work(conn):
+        row = conn.execute(
+            "SELECT n, risk_sum, risk_max, first_ts, latest_ts, latest_risk FROM user_summary WHERE email = ?",
+            (email,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        tiers = dict(conn.execute(
+            "SELECT tier, n FROM user_tier_counts WHERE email = ? AND n > 0 ORDER BY n DESC", (email,)))
+        n, risk_sum, risk_max, first_ts, latest_ts, latest_risk = row
+        return {"count": n, "avg_risk": risk_sum / n, "max_risk": risk_max, "first_ts": _format_ts(first_ts),
+                "latest_ts": _format_ts(latest_ts), "latest_risk": latest_risk, "tiers": tiers}
+    return read(work)
+
+@_db_call("get_risk_trend")
+def get_risk_trend(email):
+    """``(timestamp, Risk_Score)`` pairs for a user, oldest first."""
+    _await_pending(email)
+    return read(lambda conn: conn.execute(
+        f"SELECT {_COLUMN_SQL['timestamp']}, p.Risk_Score FROM predictions p {_WHERE_USER} "
+        "ORDER BY p.ts, p.id", (email,)).fetchall())
+
+@_db_call("sample_history")
+def sample_history(n, columns=HISTORY_FIELDS, seed=None):
+    """Up to ``n`` random history rows (all users), only ``columns``.
+
+    Draws random ids between the table's min and max id and fetches them
+    by primary key, so the cost is O(n) however large the table is; ids
+    deleted since are simply missed, so fewer than ``n`` rows may come back.
+    """
+    unknown = set(columns) - set(HISTORY_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown history columns: {', '.join(sorted(unknown))}")
+
+    def work(conn):
+        lo, hi = conn.execute("SELECT MIN(id), MAX(id) FROM predictions").fetchone()
+        if lo is None:
+            return []
+        span = hi - lo + 1
+        if span <= n:
+            ids = range(lo, hi + 1)
+        else:
+            ids = sorted(random.Random(seed).sample(range(lo, hi + 1), n))
+        ids = list(ids)
+        rows = []
+        for i in range(0, len(ids), 500):  # stay under SQLite's bound-parameter limit
+            chunk = ids[i:i + 500]
+            sql = (f"SELECT {', '.join(_COLUMN_SQL[c] for c in columns)} {_FROM_HISTORY} "
+                   f"WHERE p.id IN ({', '.join('?' * len(chunk))})")
+            rows.extend(conn.execute(sql, chunk).fetchall())
+        return rows
+    if _writer is not None:
+        _writer.flush()
+    return read(work)
+
+
+# Archival: rows older than the retention window move out of the live
+# database into one SQLite file per month, next to it. users and tiers stay
+# in the live database (archives keep user_id/tier_code), and the summary
+# tables keep counting archived rows, so the History metrics stay all-time.
+ARCHIVE_BATCH_ROWS = 5000
+_MONTH_OF_TS = "strftime('%Y-%m', {}, 'unixepoch', 'localtime')"
+# No REFERENCES: users and tiers live in the main database, not the archive
+ARCHIVE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS archive.predictions (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        {", ".join(f"{f} {'REAL' if f == 'Risk_Score' else 'INTEGER'}" for f in _HISTORY_VALUES)},
+        tier_code INTEGER
+    )
+"""
+_ARCHIVE_COLUMNS = f"id, user_id, ts, {', '.join(_HISTORY_VALUES)}, tier_code"
+
+
+def archive_dir():
+    """Directory holding DB_PATH's monthly archives (user_history_archive/)."""
+    return os.path.splitext(DB_PATH)[0] + "_archive"
+
+
+def archive_paths():
+    """Monthly archive files, newest month first."""
+    return sorted(glob.glob(os.path.join(archive_dir(), "history-*.db")), reverse=True)
+
+
+@contextmanager
+def _attached(conn, path):
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("DETACH DATABASE archive")
+
+
+def iter_archived_history(email):
+    """Yield a user's archived rows, one list per archive month, newest first.
+
+    Each archive is ATTACHed to a pooled connection just for its query, so
+    only users who ask for their full history pay for opening them.
+    """
+    sql = (f"SELECT {_HISTORY_SELECT_LIST} FROM archive.predictions p JOIN users u ON u.id = p.user_id "
+           f"LEFT JOIN tiers t ON t.code = p.tier_code {_WHERE_USER} ORDER BY p.ts DESC, p.id DESC")
+    for path in archive_paths():
+        def work(conn):
+            with _attached(conn, path):
+                return conn.execute(sql, (email,)).fetchall()
+        rows = read(work)
+        if rows:
+            yield rows
+
+
+def iter_archived_history_since(last_id=0, chunk_size=50_000):
+    """Yield all users' archived rows with ``id > last_id``, oldest month
+    first and in id order within a month, in chunks of ``chunk_size``."""
+    sql = (f"SELECT {_HISTORY_SELECT_LIST} FROM archive.predictions p JOIN users u ON u.id = p.user_id "
+           "LEFT JOIN tiers t ON t.code = p.tier_code WHERE p.id > ? ORDER BY p.id LIMIT ?")
+    for path in reversed(archive_paths()):
+        after = last_id
+        while True:
+            def work(conn):
+                with _attached(conn, path):
+                    return conn.execute(sql, (after, chunk_size)).fetchall()
+            rows = read(work)
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                break
+            after = rows[-1][0]
+
+
+def _move_to_archive(month, lo, hi, cutoff):
+    """Move one id range of one month into its archive; returns rows moved.
+
+    Copy and delete are separate commits: a WAL database can't commit across
+    attached files atomically. A crash in between leaves the rows in both
+    places until the next run, which copies with INSERT OR IGNORE and only
+    deletes ids the archive already holds, so nothing is ever lost.
+    """
+    path = os.path.join(archive_dir(), f"history-{month}.db")
+    where = f"id BETWEEN ? AND ? AND ts < ? AND {_MONTH_OF_TS.format('ts')} = ?"
+    params = (lo, hi, cutoff, month)
+
+    def attempt():
+        with get_pool().connection() as conn, _attached(conn, path):
+            conn.execute(ARCHIVE_TABLE_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_predictions_user_ts ON predictions (user_id, ts)")
+            conn.execute("BEGIN")
+            conn.execute(f"INSERT OR IGNORE INTO archive.predictions SELECT {_ARCHIVE_COLUMNS} "
+                         f"FROM main.predictions WHERE {where}", params)
+            conn.execute("COMMIT")
+            conn.execute("BEGIN IMMEDIATE")
+            n = conn.execute(f"DELETE FROM main.predictions WHERE {where} AND id IN "
+                             "(SELECT id FROM archive.predictions WHERE id BETWEEN ? AND ?)",
+                             (*params, lo, hi)).rowcount
+            conn.execute("COMMIT")
+            return n
+    return _with_retry(attempt)
+
+
+def incremental_vacuum_enabled():
+    """Whether the live database can hand freed pages back with incremental_vacuum."""
+    return read(lambda conn: conn.execute("PRAGMA auto_vacuum").fetchone()[0]) == 2
+
+
+def enable_incremental_vacuum():
+    """Switch a database created before auto_vacuum was set to incremental mode.
+
+    This is a one-time maintenance step (archive_history.py
+    --enable-incremental-vacuum): SQLite only changes the mode with a full
+    VACUUM, which rewrites the whole file and blocks every writer until it
+    is done, so it never runs implicitly. Returns False if the database was
+    already incremental.
+    """
+    if incremental_vacuum_enabled():
+        return False
+    log.info("Switching history DB to incremental auto-vacuum (full VACUUM)")
+    with get_pool().connection() as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        # the rewritten file sits in the WAL until checkpointed
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return True
+
+
+def _incremental_vacuum():
+    with get_pool().connection() as conn:
+        # executescript steps the pragma to completion; execute() frees a single page
+        conn.executescript("PRAGMA incremental_vacuum;")
+
+
+@_db_call("archive_history")
+def archive_history(older_than_days, batch_size=None):
+    """Move history rows older than ``older_than_days`` into monthly archives.
+
+    Walks ids oldest first, since ids follow insertion time, and stops at
+    the first row still inside the window. Each batch is at most
+    ``batch_size`` rows of one month, copied and deleted in short
+    transactions, and the pages it freed are returned to the filesystem
+    with incremental_vacuum right away, so writers never wait long. On a
+    database older than incremental auto-vacuum the freed pages are only
+    reused by later inserts; see enable_incremental_vacuum. Returns
+    ``{month: rows moved}``.
+    """
+    batch_size = batch_size or ARCHIVE_BATCH_ROWS
+    cutoff = int(time.time() - older_than_days * 86400)
+    os.makedirs(archive_dir(), exist_ok=True)
+    shrink = incremental_vacuum_enabled()
+    moved = collections.Counter()
+    while True:
+        head = read(lambda conn: conn.execute(
+            f"SELECT id, ts, {_MONTH_OF_TS.format('ts')} FROM predictions ORDER BY id LIMIT ?",
+            (batch_size,)).fetchall())
+        run = []
+        for row in head:
+            if row[1] >= cutoff or (run and row[2] != run[0][2]):
+                break
+            run.append(row)
+        if not run:
+            break
+        month = run[0][2]
+        n = _move_to_archive(month, run[0][0], run[-1][0], cutoff)
+        if not n:
+            break
+        moved[month] += n
+        if shrink:
+            _with_retry(_incremental_vacuum)
+    if moved:
+        # let the WAL checkpoint truncate the file now rather than at some later write
+        read(lambda conn: conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall())
+    return dict(moved)
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling; returns the kept indices.
+
+    Keeps the first and last points and, from each of ``n_out - 2`` equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's mean. Peaks and trend
+    changes survive, unlike plain striding. ``x`` must be increasing.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < edges.size else n
+        ax, ay = x[prev], y[prev]
+        bx, by = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        # twice the triangle area for every candidate in the bucket
+        area = np.abs((ax - bx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (by - ay))
+        prev = lo + int(area.argmax())
+        keep[i + 1] = prev
+    return keep
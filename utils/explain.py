@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class PathExplainer:
+    """Per-prediction feature attributions for a CompiledForest.
+
+    Tree-path (Saabas) attributions: walking a row down a tree, each split
+    credits its feature with the change in positive-class probability
+    between the node and the child the row takes. Averaged over trees this
+    gives ``score == base_value + contributions.sum()`` exactly, like SHAP
+    values, at the cost of one extra lookup per step of the same walk the
+    model already does, so explaining a row costs about as much as scoring it.
+    It is an approximation of TreeSHAP: credit depends on split order.
+    """
+
+    def __init__(self, forest):
+        self.forest = forest
+        pos = np.asarray(forest.value[:, -1], dtype=np.float64)
+        # Leaves point at themselves, so their gains are zero and they can be walked past
+        self.gain_left = pos[forest.left] - pos
+        self.gain_right = pos[forest.right] - pos
+        self.base_value = float(pos[forest.roots].mean())
+        self.n_features = forest.n_features_in_
+        self.feature_names = (list(forest.feature_names_in_)
+                              if hasattr(forest, "feature_names_in_") else None)
+
+    def explain_one(self, row):
+        """Attributions for one row (dict keyed by feature name, or a sequence)."""
+        f = self.forest
+        if isinstance(row, dict):
+            x = np.fromiter((row[name] for name in self.feature_names), dtype=np.float32,
+                            count=self.n_features)
+        else:
+            x = np.asarray(row, dtype=np.float32)
+        phi = np.zeros(self.n_features)
+        nodes = f.roots
+        for _ in range(f.max_depth):
+            feat = f.feature[nodes]
+            go_left = x[feat] <= f.threshold[nodes]
+            phi += np.bincount(feat, np.where(go_left, self.gain_left[nodes], self.gain_right[nodes]),
+                               minlength=self.n_features)
+            nodes = np.where(go_left, f.left[nodes], f.right[nodes])
+        return phi / f.roots.size
+
+    def explain(self, X, chunk_size=1024):
+        """Attributions for a batch: an ``(n_rows, n_features)`` array."""
+        f = self.forest
+        X = np.ascontiguousarray(f._as_matrix(X))
+        n_rows, n_feat = X.shape
+        n_trees = f.roots.size
+        out = np.zeros((n_rows, n_feat))
+        for start in range(0, n_rows, chunk_size):
+            block = X[start:start + chunk_size]
+            m = block.shape[0]
+            # Same (row, tree) lanes as CompiledForest._leaves, retired at their leaf
+            nodes = np.tile(f.roots, m)
+            row = np.repeat(np.arange(m), n_trees)
+            flat = block.ravel()
+            phi = np.zeros(m * n_feat)
+            active = np.arange(nodes.size)
+            while active.size:
+                nd = nodes[active]
+                slot = row[active] * n_feat + f.feature[nd]
+                go_left = flat[slot] <= f.threshold[nd]
+                phi += np.bincount(slot, np.where(go_left, self.gain_left[nd], self.gain_right[nd]),
+                                   minlength=phi.size)
+                nd = np.where(go_left, f.left[nd], f.right[nd])
+                nodes[active] = nd
+                active = active[~f.is_leaf[nd]]
+            out[start:start + m] = phi.reshape(m, n_feat) / n_trees
+        return out
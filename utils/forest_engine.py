@@ -0,0 +1,253 @@
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+# Bundle layout: magic, format version (uint32), header length (uint64), JSON
+# header, then each array's raw little-endian bytes at a 64-byte-aligned offset.
+BUNDLE_MAGIC = b"CCFOREST"
+BUNDLE_VERSION = 1
+_PREAMBLE = struct.Struct("<8sIQ")
+_ALIGN = 64
+# Stored dtypes: node indices fit in int32, which halves the index arrays
+_BUNDLE_DTYPES = {
+    "feature": "<i4", "threshold": "<f8", "left": "<i4", "right": "<i4",
+    "value": "<f8", "roots": "<i4", "is_leaf": "|b1",
+}
+
+
+class CompiledForest:
+    """Array-backed evaluator for a fitted sklearn RandomForestClassifier.
+
+    All trees are flattened into one set of contiguous node arrays
+    (feature, threshold, left/right child, leaf class fractions) and walked
+    together, one depth level per step, so scoring a row costs ``max_depth``
+    small NumPy ops instead of a Python dispatch per tree. Leaves point back
+    to themselves with an infinite threshold, so a row that reaches a leaf
+    early simply stays there.
+
+    Exposes ``predict_proba``/``predict``, ``classes_`` and
+    ``feature_names_in_`` so it can stand in for the sklearn model.
+    ``save``/``load`` round-trip it through a memory-mappable bundle file,
+    so serving needs neither sklearn nor unpickling.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 classes, feature_names=None, is_leaf=None, metadata=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.is_leaf = left == np.arange(left.size) if is_leaf is None else is_leaf
+        self.metadata = dict(metadata or {})
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = int(feature.max()) + 1 if feature.size else 0
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+            self.n_features_in_ = len(feature_names)
+
+    @classmethod
+    def from_estimator(cls, model):
+        estimators = getattr(model, "estimators_", None)
+        if not estimators or not hasattr(estimators[0], "tree_"):
+            raise TypeError(f"Cannot compile {type(model).__name__}: expected a fitted tree ensemble.")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise TypeError("Multi-output forests are not supported.")
+
+        n_nodes = [est.tree_.node_count for est in estimators]
+        total = int(sum(n_nodes))
+        n_classes = len(model.classes_)
+        feature = np.zeros(total, dtype=np.intp)
+        threshold = np.full(total, np.inf, dtype=np.float64)
+        left = np.empty(total, dtype=np.intp)
+        right = np.empty(total, dtype=np.intp)
+        value = np.empty((total, n_classes), dtype=np.float64)
+        roots = np.empty(len(estimators), dtype=np.intp)
+
+        offset = 0
+        for i, est in enumerate(estimators):
+            t = est.tree_
+            n = t.node_count
+            sl = slice(offset, offset + n)
+            own = np.arange(offset, offset + n)
+            is_leaf = t.children_left == -1
+            feature[sl] = np.where(is_leaf, 0, t.feature)
+            threshold[sl] = np.where(is_leaf, np.inf, t.threshold)
+            left[sl] = np.where(is_leaf, own, t.children_left + offset)
+            right[sl] = np.where(is_leaf, own, t.children_right + offset)
+            v = t.value[:, 0, :].astype(np.float64)
+            sums = v.sum(axis=1, keepdims=True)
+            value[sl] = np.divide(v, sums, out=np.zeros_like(v), where=sums > 0)
+            roots[i] = offset
+            offset += n
+
+        max_depth = max(est.tree_.max_depth for est in estimators)
+        return cls(feature, threshold, left, right, value, roots, max_depth,
+                   model.classes_, getattr(model, "feature_names_in_", None))
+
+    def compact(self, trees=None, max_depth=None):
+        """Return a smaller forest: only ``trees`` (indices), cut at ``max_depth``.
+
+        Nodes at the depth cap become leaves predicting the class fractions
+        of the samples that reached them (stored for every node), which is
+        what a tree grown with that ``max_depth`` would predict there. Nodes
+        are renumbered level by level, so shallow levels stay contiguous.
+        """
+        roots = self.roots if trees is None else self.roots[np.asarray(trees, dtype=np.intp)]
+        limit = self.max_depth if max_depth is None else min(int(max_depth), self.max_depth)
+        levels, frontier = [], np.asarray(roots, dtype=np.intp)
+        while frontier.size and len(levels) <= limit:
+            levels.append(frontier)
+            inner = frontier[~self.is_leaf[frontier]]
+            frontier = np.column_stack([self.left[inner], self.right[inner]]).ravel()
+        old = np.concatenate(levels)
+        depth = np.repeat(np.arange(len(levels)), [lv.size for lv in levels])
+        new_id = np.full(self.left.size, -1, dtype=np.intp)
+        own = np.arange(old.size, dtype=np.intp)
+        new_id[old] = own
+        leaf = self.is_leaf[old] | (depth == limit)
+        return type(self)(
+            np.where(leaf, 0, self.feature[old]),
+            np.where(leaf, np.inf, self.threshold[old]),
+            np.where(leaf, own, new_id[self.left[old]]),
+            np.where(leaf, own, new_id[self.right[old]]),
+            np.ascontiguousarray(self.value[old]),
+            new_id[roots],
+            len(levels) - 1,
+            self.classes_,
+            getattr(self, "feature_names_in_", None),
+            metadata=self.metadata,
+        )
+
+    @property
+    def nbytes(self):
+        """Size of the node arrays as stored in a bundle."""
+        return sum(getattr(self, name).size * np.dtype(dt).itemsize for name, dt in _BUNDLE_DTYPES.items())
+
+    def save(self, path, metadata=None):
+        """Write the forest as a bundle file that ``load`` can memory-map.
+
+        ``metadata`` (JSON-serializable) is stored in the header next to
+        the arrays' layout, e.g. feature encodings and a training hash.
+        """
+        arrays = {name: np.ascontiguousarray(getattr(self, name), dtype=dt)
+                  for name, dt in _BUNDLE_DTYPES.items()}
+        header = {
+            "max_depth": self.max_depth,
+            "classes": self.classes_.tolist(),
+            "feature_names": (list(self.feature_names_in_)
+                              if hasattr(self, "feature_names_in_") else None),
+            "metadata": {**self.metadata, **(metadata or {})},
+            "arrays": {},
+        }
+        # Offsets are relative to the data section, so they don't depend on the header's length
+        offset = 0
+        for name, arr in arrays.items():
+            header["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+        blob = json.dumps(header).encode("utf-8")
+        blob += b" " * (-(_PREAMBLE.size + len(blob)) % _ALIGN)
+        with open(path, "wb") as f:
+            f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(blob)))
+            f.write(blob)
+            for arr in arrays.values():
+                f.write(arr.tobytes())
+                f.write(b"\0" * (-arr.nbytes % _ALIGN))
+
+    @classmethod
+    def load(cls, path):
+        """Open a bundle written by ``save`` with its arrays memory-mapped read-only.
+
+        Nothing is copied: node arrays are views onto one shared file
+        mapping, paged in on first use, so every server process loading the
+        same file shares the same physical pages.
+        """
+        header = read_bundle_header(path)
+        data_start = _PREAMBLE.size + header["header_bytes"]
+        mm = np.memmap(path, dtype=np.uint8, mode="r")
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count,
+                                         offset=data_start + spec["offset"]).reshape(spec["shape"])
+        forest = cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+                     arrays["value"], arrays["roots"], header["max_depth"], header["classes"],
+                     header["feature_names"], is_leaf=arrays["is_leaf"], metadata=header["metadata"])
+        forest.path = path
+        return forest
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns") and hasattr(self, "feature_names_in_"):
+            X = X[list(self.feature_names_in_)]
+        # sklearn compares float32 inputs against float64 thresholds
+        return np.asarray(X, dtype=np.float32)
+
+    def _leaves(self, X):
+        # One flat (row, tree) lane per pair; lanes drop out once they hit a
+        # leaf so shallow branches stop costing work after their last split.
+        n_rows, n_feat = X.shape
+        n_trees = self.roots.size
+        nodes = np.tile(self.roots, n_rows)
+        base = np.repeat(np.arange(n_rows) * n_feat, n_trees)
+        flat = X.ravel()
+        active = np.arange(nodes.size)
+        while active.size:
+            nd = nodes[active]
+            go_left = flat[base[active] + self.feature[nd]] <= self.threshold[nd]
+            nd = np.where(go_left, self.left[nd], self.right[nd])
+            nodes[active] = nd
+            active = active[~self.is_leaf[nd]]
+        return nodes.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X, chunk_size=1024):
+        X = np.ascontiguousarray(self._as_matrix(X))
+        if X.ndim == 1:
+            X = X[None, :]
+        out = np.empty((X.shape[0], self.classes_.size), dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            leaves = self._leaves(X[start:start + chunk_size])
+            out[start:start + chunk_size] = self.value[leaves].mean(axis=1)
+        return out
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def predict_one(self, row):
+        """Positive-class probability for one row (dict keyed by feature name, or a sequence)."""
+        if isinstance(row, dict):
+            x = np.fromiter((row[f] for f in self.feature_names_in_), dtype=np.float32,
+                            count=self.n_features_in_)
+        else:
+            x = np.asarray(row, dtype=np.float32)
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return float(self.value[nodes, -1].mean())
+
+
+def read_bundle_header(path):
+    """Parse a bundle's header without touching its arrays."""
+    with open(path, "rb") as f:
+        magic, version, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a CardioCare model bundle.")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"{path} has bundle format {version}; this code reads format {BUNDLE_VERSION}.")
+        header = json.loads(f.read(length))
+    header["format_version"] = version
+    header["header_bytes"] = length
+    return header
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,303 @@
+import io
+import threading
+import numpy as np
+import cv2
+
+from utils import metrics
+
+# Decoded images are shrunk to this longest side before anything else.
+# Everything downstream works at preprocess()'s target size, and every
+# measurement (lung/flagged pixel counts, % affected) is taken there, never
+# on the full-resolution image. So the shrink is harmless only while that
+# target is at most DECODE_MAX_SIDE (the page and cxr_batch offer ≤ 640),
+# and even then it changes results by resampling differences only.
+DECODE_MAX_SIDE = 1024
+# Reject DICOMs above this many pixels (all frames/samples) from the header alone
+MAX_DICOM_PIXELS = 60_000_000
+
+
+def to_uint8(arr, invert=False, max_side=DECODE_MAX_SIDE):
+    """Min-max scale ``arr`` to uint8, shrinking it first to ``max_side``.
+
+    Replaces the float32 copy → rescale → inversion → cv2.normalize chain:
+    all of those are affine, so one convertScaleAbs on the already-shrunk
+    array gives the same image. The range comes from the full-resolution
+    array so outliers still set the contrast.
+    """
+    if arr.dtype not in (np.uint8, np.uint16, np.int16, np.float32, np.float64):
+        arr = arr.astype(np.float32)
+    lo, hi, _, _ = cv2.minMaxLoc(arr)
+    h, w = arr.shape
+    scale = max_side / float(max(h, w))
+    if scale < 1.0:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        arr = cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+    if hi <= lo:
+        return np.zeros(arr.shape, np.uint8)
+    alpha = 255.0 / (hi - lo)
+    if invert:
+        return cv2.convertScaleAbs(arr, alpha=-alpha, beta=hi * alpha)
+    return cv2.convertScaleAbs(arr, alpha=alpha, beta=-lo * alpha)
+
+def dicom_inverted(ds):
+    """Whether min-max scaling must flip this dataset to get bright-is-dense.
+
+    Rescale intercept cancels out under min-max scaling; a negative slope or
+    MONOCHROME1 flips the image, and both together cancel each other.
+    """
+    slope = float(getattr(ds, "RescaleSlope", 1.0))
+    photometric = getattr(ds, "PhotometricInterpretation", "MONOCHROME2")
+    return (slope < 0) != bool(photometric and str(photometric).upper() == "MONOCHROME1")
+
+def read_dicom(data, max_side=DECODE_MAX_SIDE, max_pixels=MAX_DICOM_PIXELS):
+    """Decode a single-frame DICOM to a uint8 image no larger than ``max_side``.
+
+    The header is parsed first without pixel data so oversized studies are
+    rejected before anything big is allocated; after that, only the native
+    pixel array and the shrunk result exist at the same time.
+    """
+    import pydicom  # only DICOM uploads pay for it (~0.3 s)
+
+    header = pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True)
+    rows, cols = int(header.get("Rows", 0) or 0), int(header.get("Columns", 0) or 0)
+    frames = int(header.get("NumberOfFrames", 1) or 1)
+    samples = int(header.get("SamplesPerPixel", 1) or 1)
+    if rows * cols * frames * samples > max_pixels:
+        raise ValueError(f"DICOM is too large ({cols}×{rows}, {frames} frame(s)); "
+                         f"limit is {max_pixels:,} pixels.")
+    if frames > 1 or samples > 1:
+        raise ValueError("Only single-frame grayscale DICOM images are supported.")
+
+    ds = pydicom.dcmread(io.BytesIO(data))
+    return to_uint8(ds.pixel_array, invert=dicom_inverted(ds), max_side=max_side)
+
+def decode_cxr_bytes(name, data, max_side=DECODE_MAX_SIDE):
+    name = name.lower()
+    if name.endswith((".dcm", ".dicom")):
+        return read_dicom(data, max_side=max_side)
+    img_gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img_gray is None:
+        raise ValueError("Unsupported or corrupted image file.")
+    return to_uint8(img_gray, max_side=max_side)
+
+def read_cxr_file(uploaded_file):
+    return decode_cxr_bytes(uploaded_file.name, uploaded_file.read())
+
+def preprocess(img, target=512):
+    img = cv2.resize(img, (target, target), interpolation=cv2.INTER_AREA)
+    img = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)).apply(img)
+    img = cv2.medianBlur(img, 3)
+    return img
+
+def lung_mask_quick(img):
+    inv = cv2.bitwise_not(img)
+    _, th = cv2.threshold(inv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    th = cv2.morphologyEx(th, cv2.MORPH_OPEN, np.ones((5,5), np.uint8), iterations=2)
+    num, labels, stats, _ = cv2.connectedComponentsWithStats(th, connectivity=8)
+    if num <= 1:
+        return np.zeros_like(img, dtype=np.uint8)
+    areas = [(i, stats[i, cv2.CC_STAT_AREA]) for i in range(1, num)]
+    areas.sort(key=lambda x: x[1], reverse=True)
+    keep = [i for i,_ in areas[:2]]
+    mask = np.isin(labels, keep).astype(np.uint8) * 255
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9,9), np.uint8), iterations=1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_DILATE, np.ones((5,5), np.uint8), iterations=1)
+    return mask
+
+def pad_mask(lung, mask_pad):
+    """Optional padding of lung mask to include periphery."""
+    if mask_pad > 0:
+        kernel = np.ones((mask_pad, mask_pad), np.uint8)
+        lung = cv2.dilate(lung, kernel, iterations=1)
+    return lung
+
+_K3 = np.ones((3,3), np.uint8)
+_K5 = np.ones((5,5), np.uint8)
+_scratch = threading.local()
+
+def _buffers(shape):
+    """Per-thread scratch buffers, reused across calls at the same resolution."""
+    bufs = getattr(_scratch, "bufs", None)
+    if bufs is None or bufs[0].shape != shape:
+        bufs = (np.empty(shape, np.uint8), np.empty(shape, np.uint8), np.empty(shape, np.int32))
+        _scratch.bufs = bufs
+    return bufs
+
+def _abnormal_kernel(src, lung_mask, lut, min_region_px):
+    """Shared threshold → open/close → size-filter kernel for the abnormal maps.
+
+    ``lut`` is a 256-entry 0/255 table saying which intensities of ``src``
+    count as bright-abnormal, so thresholding is one table lookup. Small
+    components are dropped with one connected-components pass plus a
+    label → 0/255 lookup, instead of one full-image comparison per region.
+    """
+    a, b, labels = _buffers(src.shape)
+    cv2.LUT(src, lut, dst=a)
+    b.fill(0)
+    cv2.bitwise_and(a, a, dst=b, mask=lung_mask)
+
+    cv2.morphologyEx(b, cv2.MORPH_OPEN, _K3, dst=a, iterations=1)
+    cv2.morphologyEx(a, cv2.MORPH_CLOSE, _K5, dst=b, iterations=1)
+
+    # 8-connectivity, same as skimage.measure.label(connectivity=2). Grana's
+    # block-based labelling measured ~3x faster than OpenCV's default here.
+    _, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+        b, 8, cv2.CV_32S, cv2.CCL_GRANA, labels=labels)
+    keep = np.where(stats[:, cv2.CC_STAT_AREA] >= int(min_region_px), 255, 0).astype(np.uint8)
+    keep[0] = 0
+    if keep[1:].all():
+        return b.copy()
+    if not keep.any():
+        return np.zeros_like(b)
+    return np.take(keep, labels)
+
+_LEVELS = np.arange(256, dtype=np.uint8)
+
+def abnormal_map_zscore(img, lung_mask, z_thresh=1.0, min_region_px=300):
+    """Bright-abnormal mask using Z-score within lung pixels."""
+    lung_pixels = img[lung_mask > 0].astype(np.float32)
+    if lung_pixels.size < 1000:
+        return np.zeros_like(img, dtype=np.uint8), None
+    mu = float(lung_pixels.mean())
+    sd = float(lung_pixels.std() + 1e-6)
+    # z-score of every possible blurred intensity, evaluated exactly as per-pixel
+    lut = np.where((_LEVELS.astype(np.float32) - mu) / sd > float(z_thresh), 255, 0).astype(np.uint8)
+    cleaned = _abnormal_kernel(cv2.GaussianBlur(img, (0,0), 1.0), lung_mask, lut, min_region_px)
+    return cleaned, {"mean": mu, "std": sd, "z_thresh": z_thresh}
+
+def abnormal_map_percentile(img, lung_mask, pct_thresh=90, min_region_px=300):
+    """Bright-abnormal mask using intensity percentile within lung pixels."""
+    lung_vals = img[lung_mask > 0].astype(np.float32)
+    if lung_vals.size < 1000:
+        return np.zeros_like(img, dtype=np.uint8), None
+    thr = float(np.percentile(lung_vals, pct_thresh))
+    lut = np.where(_LEVELS >= thr, 255, 0).astype(np.uint8)
+    cleaned = _abnormal_kernel(img, lung_mask, lut, min_region_px)
+    return cleaned, {"pct_thresh": pct_thresh, "intensity_thr": thr}
+
+def abnormal_map(img, lung, method="zscore", z_thresh=0.9, pct_thresh=90, min_region_px=200):
+    """Run the chosen abnormal-map method; returns (mask, info, threshold explanation)."""
+    if method == "zscore":
+        abn, info = abnormal_map_zscore(img, lung, z_thresh=z_thresh, min_region_px=min_region_px)
+        expl = f"Z-score > {info['z_thresh']:.2f} (mean={info['mean']:.1f}, std={info['std']:.1f})" if info else "n/a"
+    else:
+        abn, info = abnormal_map_percentile(img, lung, pct_thresh=pct_thresh, min_region_px=min_region_px)
+        expl = f"Top {info['pct_thresh']}% brightest (intensity ≥ {info['intensity_thr']:.1f})" if info else "n/a"
+    return abn, info, expl
+
+def color_overlay(gray_0_255, heat_0_255, alpha=0.45):
+    gray_rgb = cv2.cvtColor(gray_0_255, cv2.COLOR_GRAY2BGR)
+    color = cv2.applyColorMap(heat_0_255, cv2.COLORMAP_JET)
+    return cv2.addWeighted(gray_rgb, 1.0, color, float(alpha), 0.0)
+
+def overlay_for(img, abn, alpha=0.45):
+    heat = cv2.normalize(abn, None, 0, 255, cv2.NORM_MINMAX)
+    return color_overlay(img, heat, alpha=alpha)
+
+def encode_png(overlay_bgr):
+    """PNG bytes of an overlay, as offered by the page's download button."""
+    out_rgb = cv2.cvtColor(overlay_bgr, cv2.COLOR_BGR2RGB)
+    ok, buf = cv2.imencode(".png", out_rgb)
+    return buf.tobytes() if ok else None
+
+def pct(n, d):
+    return float(n) * 100.0 / float(d) if d > 0 else 0.0
+
+def measure_masks(img, lung, abn):
+    total_lung = int((lung > 0).sum())
+    total_abn = int((abn > 0).sum())
+    return {
+        "lung_pixels": total_lung,
+        "flagged_pixels": total_abn,
+        "percent_affected": pct(total_abn, total_lung),
+        "lung_ratio": total_lung / float(img.size),
+    }
+
+DEFAULT_SETTINGS = {
+    "method": "zscore", "z_thresh": 0.9, "pct_thresh": 90, "min_region": 200,
+    "mask_pad": 5, "alpha": 0.45, "target_size": 512,
+}
+
+def analyze_cxr(name, data, settings, with_overlay=True):
+    """Full pipeline for one upload, safe to run in a worker process.
+
+    ``settings`` holds method ("zscore"/"percentile"), z_thresh, pct_thresh,
+    min_region, mask_pad, alpha and target_size (see DEFAULT_SETTINGS).
+    Returns a dict of metrics plus the overlay PNG bytes (None when
+    ``with_overlay`` is false); failures are reported in ``error`` instead
+    of raised so one bad file doesn't abort a batch.
+    """
+    try:
+        img = preprocess(decode_cxr_bytes(name, data), target=settings["target_size"])
+        lung = pad_mask(lung_mask_quick(img), settings["mask_pad"])
+        abn, _, expl = abnormal_map(img, lung, method=settings["method"],
+                                    z_thresh=settings.get("z_thresh"),
+                                    pct_thresh=settings.get("pct_thresh"),
+                                    min_region_px=settings["min_region"])
+        result = {"name": name, "error": None, "threshold": expl}
+        result.update(measure_masks(img, lung, abn))
+        result["overlay_png"] = (encode_png(overlay_for(img, abn, alpha=settings["alpha"]))
+                                 if with_overlay else None)
+        return result
+    except Exception as e:
+        return {"name": name, "error": str(e)}
+
+# run_stages() steps, in pipeline order; each is timed into its own histogram
+STAGES = ("decode", "preprocess", "lung", "pad", "abnormal", "overlay", "png")
+_STAGE_SECONDS = {name: metrics.histogram("cardiocare_imaging_stage_seconds",
+                                          "Imaging pipeline stage compute time (cache misses only)",
+                                          stage=name)
+                  for name in STAGES}
+
+def run_stages(cache, digest, load_bytes, name, settings):
+    """Pipeline for one upload with every stage memoized in ``cache``.
+
+    Stage keys carry the content ``digest`` plus only the settings the stage
+    depends on, and earlier stages are looked up lazily, so e.g. moving the
+    opacity slider recomputes just the overlay. ``load_bytes`` is only called
+    if the decoded image is not cached. Returns a dict with img, lung, abn,
+    info, threshold, overlay, overlay_png and stage_ms: milliseconds per
+    stage computed on this call (stages served from the cache are absent).
+    """
+    target, pad = settings["target_size"], settings["mask_pad"]
+    method = settings["method"]
+    thresh = settings["z_thresh"] if method == "zscore" else settings["pct_thresh"]
+    min_region = settings["min_region"]
+    stage_ms = {}
+
+    def stage(key, fn, *inputs):
+        # inputs are getters for earlier stages, resolved before the timer
+        # starts so each stage is charged only its own work
+        def compute():
+            args = [get() for get in inputs]
+            with _STAGE_SECONDS[key[0]].time() as t:
+                value = fn(*args)
+            stage_ms[key[0]] = t.elapsed * 1e3
+            return value
+        return cache.get_or_compute(key, compute)
+
+    def decoded():
+        return stage(("decode", digest), lambda data: decode_cxr_bytes(name, data), load_bytes)
+
+    def processed():
+        return stage(("preprocess", digest, target), lambda img: preprocess(img, target=target), decoded)
+
+    def lung_raw():
+        return stage(("lung", digest, target), lung_mask_quick, processed)
+
+    def lung():
+        return stage(("pad", digest, target, pad), lambda mask: pad_mask(mask, pad), lung_raw)
+
+    abn_key = ("abnormal", digest, target, pad, method, thresh, min_region)
+    abn, info, expl = stage(abn_key, lambda img, mask: abnormal_map(
+        img, mask, method=method, z_thresh=settings["z_thresh"],
+        pct_thresh=settings["pct_thresh"], min_region_px=min_region), processed, lung)
+    overlay_key = ("overlay", *abn_key[1:], settings["alpha"])
+    overlay = stage(overlay_key, lambda img: overlay_for(img, abn, alpha=settings["alpha"]), processed)
+    png = stage(("png", *overlay_key[1:]), lambda: encode_png(overlay))
+    return {"img": processed(), "lung": lung(), "abn": abn, "info": info,
+            "threshold": expl, "overlay": overlay, "overlay_png": png, "stage_ms": stage_ms}
+
+def init_worker():
+    # One OpenCV thread per worker process; the pool provides the parallelism
+    cv2.setNumThreads(1)
@@ -0,0 +1,263 @@
+"""Process-wide counters and latency histograms, exported as Prometheus text.
+
+Instrumented code binds its metric once, at import or decoration time, so a
+timed call costs two perf_counter() reads and one locked bucket increment
+(about a microsecond; see benchmarks/bench_metrics.py):
+
+    SAVE_SECONDS = metrics.histogram("cardiocare_db_call_seconds", "...", call="save")
+
+    with SAVE_SECONDS.time():
+        ...
+
+    @metrics.timed("cardiocare_db_call_seconds", call="get_user_history")
+    def get_user_history(...): ...
+
+Export is off unless configured, and only starts when the Streamlit pages
+call start_exporter(): CARDIOCARE_METRICS_FILE rewrites a text file every
+CARDIOCARE_METRICS_INTERVAL seconds (default 15) and at exit, for
+node_exporter's textfile collector; CARDIOCARE_METRICS_PORT serves /metrics
+on 127.0.0.1 (CARDIOCARE_METRICS_ADDR to change). Every Streamlit server
+process keeps its own numbers, so give each its own file or port.
+"""
+import atexit
+import bisect
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+# Seconds: 100 µs (a cached DB read) up to 30 s (a large CT series)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+log = logging.getLogger(__name__)
+
+_families = {}  # name -> [kind, help, {label items: metric}]
+_lock = threading.Lock()
+
+
+class Counter:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts[i]`` holds observations in bucket i only
+    (the last one past every bound), made cumulative when rendered."""
+
+    __slots__ = ("_lock", "bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager that observes the seconds spent in its block."""
+        return Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Timer:
+    """Times a ``with`` block into a histogram; ``elapsed`` holds the seconds
+    afterwards. Exceptions are timed too, then propagate."""
+
+    __slots__ = ("_histogram", "_start", "elapsed")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self._histogram.observe(self.elapsed)
+        return False
+
+
+def _get(kind, name, help, labels, make):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        family = _families.get(name)
+        if family is None:
+            family = _families[name] = [kind, help, {}]
+        elif family[0] != kind:
+            raise ValueError(f"metric {name} is already registered as a {family[0]}")
+        if help and not family[1]:
+            family[1] = help
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = make()
+        return metric
+
+
+def counter(name, help="", **labels):
+    """The Counter for ``name`` with these label values, created on first use."""
+    return _get("counter", name, help, labels, Counter)
+
+
+def histogram(name, help="", buckets=LATENCY_BUCKETS, **labels):
+    """The Histogram for ``name`` with these label values, created on first use."""
+    return _get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+
+def timer(name, **labels):
+    """``with metrics.timer(name, **labels):`` for one-off blocks. Looks the
+    histogram up on every call; bind it with histogram() on hot paths."""
+    return Timer(histogram(name, **labels))
+
+
+def timed(name, help="", **labels):
+    """Decorator timing every call of the function into histogram ``name``."""
+    def decorate(fn):
+        metric = histogram(name, help, **labels)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metric.observe(perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def reset():
+    """Forget every metric (for tests and benchmarks). Metrics already bound
+    by instrumented modules keep counting but are no longer exported."""
+    with _lock:
+        _families.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(items, extra=()):
+    pairs = [f'{k}="{_escape(v)}"' for k, v in (*items, *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        families = sorted((name, kind, help, list(metrics.items()))
+                          for name, (kind, help, metrics) in _families.items())
+    lines = []
+    for name, kind, help, metrics in families:
+        if help:
+            lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, metric in sorted(metrics):
+            if kind == "counter":
+                lines.append(f"{name}{_labels(key)} {metric.value}")
+                continue
+            counts, total = metric.snapshot()
+            cumulative = 0
+            for bound, n in zip((*metric.bounds, float("inf")), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(key, [('le', _bound(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(key)} {total!r}")
+            lines.append(f"{name}_count{_labels(key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path):
+    """Write render() to ``path`` atomically (scrapers never see half a file)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def serve(port, addr="127.0.0.1"):
+    """Serve render() at http://addr:port/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_exporting = False
+
+
+def start_exporter():
+    """Start the file writer and/or HTTP endpoint configured by the
+    CARDIOCARE_METRICS_* environment variables, once per process.
+
+    Does nothing in worker processes (the imaging pools): their registries
+    are nearly empty, and they would overwrite the server's file or fight
+    over its port.
+    """
+    global _exporting
+    if multiprocessing.parent_process() is not None:
+        return
+    with _lock:
+        if _exporting:
+            return
+        _exporting = True
+    path = os.environ.get("CARDIOCARE_METRICS_FILE")
+    if path:
+        interval = float(os.environ.get("CARDIOCARE_METRICS_INTERVAL", "15"))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write(path)
+                except OSError as e:
+                    log.warning("Could not write metrics to %s: %s", path, e)
+
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+        atexit.register(write, path)
+    port = os.environ.get("CARDIOCARE_METRICS_PORT")
+    if port:
+        try:
+            serve(int(port), os.environ.get("CARDIOCARE_METRICS_ADDR", "127.0.0.1"))
+        except OSError as e:
+            # e.g. a second server process on the same port; the app runs on without it
+            log.warning("Metrics endpoint not started on port %s: %s", port, e)
@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+
+from utils import metrics
+from utils.prediction_cache import model_version
+
+log = logging.getLogger(__name__)
+
+# model.forest (written by train_model.py) is memory-mapped, so it loads without
+# sklearn and all server processes share its pages; it is only used while it
+# matches model.pkl. CARDIOCARE_MODEL_BACKEND=sklearn skips the compiled engine
+# (e.g. to compare results); CARDIOCARE_MODEL_VARIANT=fast serves the compacted
+# model.fast.forest from compact_model.py when it exists.
+MODEL_PATH = "model.pkl"
+BUNDLE_PATH = "model.forest"
+if os.environ.get("CARDIOCARE_MODEL_VARIANT") == "fast" and os.path.exists("model.fast.forest"):
+    BUNDLE_PATH = "model.fast.forest"
+
+# One loaded model (and explainer) per process, keyed by file version so a
+# rewritten model file is reloaded. Loading holds the lock: a page that
+# asks while the warm-up thread is loading waits for it instead of loading twice.
+_lock = threading.Lock()
+_models = {}
+_explainers = {}
+_batch_models = {}
+_warm_lock = threading.Lock()
+_warm_thread = None
+
+
+@metrics.timed("cardiocare_model_load_seconds", "Time to load the served model from disk")
+def _load(path, bundle_path):
+    # numpy/forest engine imported here so importing this module stays cheap
+    from utils.forest_engine import CompiledForest, file_sha256
+
+    compiled = os.environ.get("CARDIOCARE_MODEL_BACKEND", "compiled") == "compiled"
+    if compiled and os.path.exists(bundle_path):
+        forest = CompiledForest.load(bundle_path)
+        if not os.path.exists(path) or forest.metadata.get("source_sha256") == file_sha256(path):
+            return forest
+    import joblib
+    model = joblib.load(path)
+    if compiled:
+        try:
+            return CompiledForest.from_estimator(model)
+        except TypeError:
+            pass
+    return model
+
+
+def load_model(path=MODEL_PATH, bundle_path=BUNDLE_PATH, version=None):
+    """The served model, loaded once per process and ``version``."""
+    key = (path, bundle_path, version)
+    with _lock:
+        if key not in _models:
+            model = _load(path, bundle_path)
+            _models.clear()
+            _models[key] = model
+        return _models[key]
+
+
+def load_batch_model(model, path=MODEL_PATH, version=None):
+    """Model to score large batches with (see scoring.score_batch).
+
+    For the compiled engine that is the sklearn estimator in ``path``, loaded
+    on first use and kept per ``version``; the full compiled forest is only
+    served while it matches that file, so both give the same scores. A
+    compacted variant (model.fast.forest) keeps fewer trees than that file,
+    so it scores batches itself, as do sklearn models. Falls back to
+    ``model`` itself when sklearn or the file is unavailable.
+    """
+    from utils.forest_engine import CompiledForest
+
+    if (not isinstance(model, CompiledForest) or model.metadata.get("variant")
+            or not os.path.exists(path)):
+        return model
+    with _lock:
+        if version not in _batch_models:
+            try:
+                import joblib
+                estimator = joblib.load(path)
+            except Exception as e:
+                log.warning("Batch scoring stays on the compiled model: %s", e)
+                estimator = model
+            _batch_models.clear()
+            _batch_models[version] = estimator
+        return _batch_models[version]
+
+
+def load_explainer(model, version=None):
+    """PathExplainer for ``model``, built once per model version."""
+    from utils.explain import PathExplainer
+    from utils.forest_engine import CompiledForest
+
+    with _lock:
+        if version not in _explainers:
+            forest = model if isinstance(model, CompiledForest) else CompiledForest.from_estimator(model)
+            _explainers.clear()
+            _explainers[version] = PathExplainer(forest)
+        return _explainers[version]
+
+
+def _warm():
+    try:
+        version = model_version(MODEL_PATH, BUNDLE_PATH)
+        model = load_model(MODEL_PATH, BUNDLE_PATH, version)
+        explainer = load_explainer(model, version)
+        from utils.scoring import FEATURES, predict_row  # pandas, on the first prediction's path
+        row = dict.fromkeys(FEATURES, 0)
+        predict_row(model, row)
+        explainer.explain_one(row)
+    except Exception as e:
+        # the Predict page reports load errors itself
+        log.warning("Model warm-up failed: %s", e)
+
+
+def warm_up():
+    """Load the model, explainer and scoring imports on a background thread.
+
+    Called from Home.py so they are ready by the time a user opens Predict;
+    starts at most one thread per process and returns it.
+    """
+    global _warm_thread
+    with _warm_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, name="model-warm-up", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def model_version(*paths):
+    """Cheap fingerprint of the model file(s); changes whenever one is rewritten.
+
+    Missing paths are skipped (e.g. a deployment that ships only the
+    bundle), but at least one must exist.
+    """
+    parts = []
+    for path in paths or ("model.pkl",):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        parts.append(f"{st.st_mtime_ns}-{st.st_size}")
+    if not parts:
+        raise FileNotFoundError(f"No model file found: {', '.join(paths)}")
+    return "/".join(parts)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of risk scores with an optional TTL.
+
+    Keys are ``(model_version, encoded feature tuple)``. Calling
+    ``set_version`` with a new model version drops every stored entry, so a
+    retrained ``model.pkl`` never serves stale scores.
+    """
+
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = int(maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or now - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_ttl = os.environ.get("CARDIOCARE_PREDICTION_CACHE_TTL")
+
+# Module-level so it is shared by every Streamlit session in this process
+PREDICTION_CACHE = PredictionCache(
+    maxsize=int(os.environ.get("CARDIOCARE_PREDICTION_CACHE_SIZE", "4096")),
+    ttl=float(_ttl) if _ttl else None,
+)
@@ -0,0 +1,161 @@
+import numpy as np
+
+from utils import metrics
+
+# pandas is imported inside the functions that need it: the Predict page's
+# single-row path (compiled model) never does, and pandas costs ~0.5 s to import.
+
+FEATURES = [
+    "Age", "RestingBP", "Cholesterol", "MaxHR",
+    "Diabetes", "Hypertension", "Heart_Condition",
+    "Vaccinated", "Hospitalized", "Vaccine_Type",
+    "Doses", "Days_Since_Vaccine"
+]
+
+VACCINE_MAP = {"Covaxin": 0, "Covishield": 1, "Pfizer": 2, "None": 3}
+
+# Same bounds as the number inputs on the Predict form
+NUMERIC_BOUNDS = {
+    "Age": (10, 100),
+    "RestingBP": (80, 200),
+    "Cholesterol": (100, 400),
+    "MaxHR": (60, 220),
+    "Doses": (0, 5),
+    "Days_Since_Vaccine": (0, 365),
+}
+
+YES_NO_FEATURES = ["Diabetes", "Hypertension", "Heart_Condition", "Vaccinated", "Hospitalized"]
+
+# (threshold, tier, coverage, premium), checked top-down with prob > threshold
+TIERS = [
+    (0.75, "🚨 Premium", "₹2 – ₹5 Lakh", "₹10,000+"),
+    (0.4, "⚠️ Standard", "₹5 – ₹10 Lakh", "₹6,000 – ₹9,000"),
+    (-np.inf, "✅ Basic", "₹10 – ₹15 Lakh", "₹4,000 – ₹6,000"),
+]
+
+# Batches at least this large are scored by the sklearn estimator when one is
+# given: the compiled engine wins on small batches (no per-call setup) but
+# walks trees in NumPy at about a third of sklearn's rate past ~500 rows
+# (benchmarks/bench_predict.py reports the crossover).
+BATCH_MODEL_MIN_ROWS = 512
+
+# pd.read_csv options for uploaded batches: pandas reads the literal vaccine
+# name "None" as missing by default, so only blank cells count as missing
+CSV_READ_OPTIONS = {"keep_default_na": False, "na_values": [""]}
+
+_YES_NO = {"yes": 1, "no": 0, "1": 1, "0": 0, "true": 1, "false": 0, "y": 1, "n": 0}
+
+
+def model_columns(model):
+    """Columns the model was fitted on (falls back to the full feature list)."""
+    if hasattr(model, "feature_names_in_"):
+        return list(model.feature_names_in_)
+    return list(FEATURES)
+
+
+_ROWS_SCORED = metrics.counter("cardiocare_model_rows_scored_total", "Rows scored by the risk model")
+
+
+@metrics.timed("cardiocare_model_predict_seconds", "Risk model scoring latency", kind="row")
+def predict_row(model, row):
+    """Positive-class probability for one encoded row dict."""
+    _ROWS_SCORED.inc()
+    if hasattr(model, "predict_one"):
+        return model.predict_one(row)
+    import pandas as pd
+    input_df = pd.DataFrame([row], columns=model_columns(model))
+    return float(model.predict_proba(input_df)[0][1])
+
+
+def assign_tier(prob):
+    for threshold, tier, coverage, premium in TIERS:
+        if prob > threshold:
+            return tier, coverage, premium
+    return TIERS[-1][1:]
+
+
+def assign_tiers(probs):
+    """Vectorized assign_tier: returns (tier, coverage, premium) object arrays."""
+    probs = np.asarray(probs, dtype=np.float64)
+    conds = [probs > t for t, *_ in TIERS[:-1]]
+    out = []
+    for col in (1, 2, 3):
+        choices = [row[col] for row in TIERS[:-1]]
+        out.append(np.select(conds, choices, default=TIERS[-1][col]).astype(object))
+    return tuple(out)
+
+
+def validate_batch(raw):
+    """Validate and encode an uploaded CSV frame.
+
+    Accepts Yes/No (or 1/0) for the history flags and either vaccine names or
+    their integer codes for Vaccine_Type. Returns ``(encoded, errors)`` where
+    ``encoded`` holds the valid rows as int64 columns in FEATURES order (index
+    preserved from ``raw``) and ``errors`` lists one message per rejected row.
+    """
+    import pandas as pd
+
+    missing = [c for c in FEATURES if c not in raw.columns]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+    encoded = pd.DataFrame(index=raw.index)
+    bad = pd.DataFrame(False, index=raw.index, columns=FEATURES)
+
+    for col, (lo, hi) in NUMERIC_BOUNDS.items():
+        vals = pd.to_numeric(raw[col], errors="coerce")
+        ok = vals.notna() & (vals == vals.round()) & vals.between(lo, hi)
+        bad[col] = ~ok
+        encoded[col] = vals.where(ok, 0)
+
+    for col in YES_NO_FEATURES:
+        # numeric first: a blank cell makes pandas read a 0/1 column as float ("1.0")
+        as_num = pd.to_numeric(raw[col], errors="coerce")
+        vals = as_num.where(as_num.isin([0, 1]))
+        vals = vals.fillna(raw[col].astype(str).str.strip().str.lower().map(_YES_NO))
+        bad[col] = vals.isna()
+        encoded[col] = vals.fillna(0)
+
+    vt = raw["Vaccine_Type"].astype(str).str.strip()
+    codes = vt.map(VACCINE_MAP)
+    as_num = pd.to_numeric(vt, errors="coerce")
+    codes = codes.fillna(as_num.where(as_num.isin(list(VACCINE_MAP.values()))))
+    bad["Vaccine_Type"] = codes.isna()
+    encoded["Vaccine_Type"] = codes.fillna(0)
+
+    encoded = encoded[FEATURES].astype(np.int64)
+    row_bad = bad.any(axis=1)
+    errors = []
+    if row_bad.any():
+        bad_rows = bad[row_bad]
+        for idx, flags in zip(bad_rows.index, bad_rows.to_numpy()):
+            cols = [c for c, f in zip(FEATURES, flags) if f]
+            # +2: header line and 1-based numbering, so this matches the CSV line
+            errors.append(f"Line {idx + 2}: invalid {', '.join(cols)}")
+    return encoded[~row_bad], errors
+
+
+@metrics.timed("cardiocare_model_predict_seconds", kind="batch")
+def score_batch(model, encoded, batch_model=None):
+    """Score an encoded frame in a single predict_proba call.
+
+    ``batch_model`` (see model_store.load_batch_model) is used instead of
+    ``model`` for frames of BATCH_MODEL_MIN_ROWS rows or more. Returns a
+    copy of ``encoded`` with Risk_Score, Prediction, Tier, Coverage and
+    Premium columns appended, ready for save_history_batch.
+    """
+    import pandas as pd
+
+    out = encoded.copy()
+    if out.empty:
+        for col in ("Risk_Score", "Prediction", "Tier", "Coverage", "Premium"):
+            out[col] = pd.Series(dtype=object)
+        return out
+    if batch_model is not None and len(encoded) >= BATCH_MODEL_MIN_ROWS:
+        model = batch_model
+    probs = model.predict_proba(encoded[model_columns(model)])[:, 1].astype(np.float64)
+    _ROWS_SCORED.inc(len(probs))
+    out["Risk_Score"] = probs
+    out["Prediction"] = (probs > 0.5).astype(np.int64)
+    out["Tier"], out["Coverage"], out["Premium"] = assign_tiers(probs)
+    return out
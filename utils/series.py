@@ -0,0 +1,201 @@
+"""Slice-by-slice ingestion of multi-frame DICOMs and ZIPs of slices.
+
+Everything here is a generator: one slice is decoded, preprocessed and
+scored before the next is read, so memory stays at roughly one slice no
+matter how long the series is.
+"""
+import io
+import os
+import zipfile
+
+import pydicom
+
+from utils.imaging import (
+    DECODE_MAX_SIDE, MAX_DICOM_PIXELS, abnormal_map, decode_cxr_bytes, dicom_inverted,
+    encode_png, lung_mask_quick, measure_masks, overlay_for, pad_mask, preprocess, to_uint8,
+)
+
+try:
+    from pydicom.pixels import iter_pixels
+except ImportError:  # pydicom < 3: frames come from the full pixel_array
+    iter_pixels = None
+
+MAX_SERIES_SLICES = 2000
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+def _is_dicom(head):
+    return len(head) >= 132 and head[128:132] == b"DICM"
+
+
+def is_series(name, data):
+    """True for ZIP uploads and multi-frame DICOMs."""
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return True
+    if lower.endswith((".dcm", ".dicom")):
+        header = pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True)
+        return int(header.get("NumberOfFrames", 1) or 1) > 1
+    return False
+
+
+def series_length(name, data):
+    """Slice count from the header / ZIP directory (an upper bound for ZIPs)."""
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            return sum(1 for info in zf.infolist() if not info.is_dir())
+    header = pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True)
+    return int(header.get("NumberOfFrames", 1) or 1)
+
+
+def _check_frame(header, max_pixels):
+    rows, cols = int(header.get("Rows", 0) or 0), int(header.get("Columns", 0) or 0)
+    if rows * cols * int(header.get("SamplesPerPixel", 1) or 1) > max_pixels:
+        raise ValueError(f"Slice is too large ({cols}×{rows}); limit is {max_pixels:,} pixels.")
+
+
+def iter_multiframe(data, max_side=DECODE_MAX_SIDE, max_pixels=MAX_DICOM_PIXELS):
+    """Yield ``(label, uint8 slice)`` for each frame of a multi-frame DICOM.
+
+    A frame that can't be used is yielded as ``(label, exception)``. If the
+    pixel data itself stops decoding, the frames after it can't be reached
+    either, so each of them is yielded with that same error.
+    """
+    header = pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True)
+    _check_frame(header, max_pixels)
+    frames = int(header.get("NumberOfFrames", 1) or 1)
+    if frames > MAX_SERIES_SLICES:
+        raise ValueError(f"Series has {frames} frames; limit is {MAX_SERIES_SLICES}.")
+    invert = dicom_inverted(header)
+    if iter_pixels is not None:
+        arrays = iter_pixels(io.BytesIO(data))
+    else:
+        ds = pydicom.dcmread(io.BytesIO(data))
+        arrays = iter(ds.pixel_array) if frames > 1 else iter([ds.pixel_array])
+    for i in range(1, frames + 1):
+        try:
+            arr = next(arrays)
+        except StopIteration:
+            return
+        except Exception as e:
+            for j in range(i, frames + 1):
+                yield f"frame {j}", e
+            return
+        try:
+            if arr.ndim != 2:
+                raise ValueError("Only grayscale series are supported.")
+            yield f"frame {i}", to_uint8(arr, invert=invert, max_side=max_side)
+        except Exception as e:
+            yield f"frame {i}", e
+
+
+def iter_zip(data, max_side=DECODE_MAX_SIDE):
+    """Yield ``(label, uint8 slice)`` for each image in a ZIP, in slice order.
+
+    DICOM members (with or without an extension) are ordered by
+    InstanceNumber from a header-only pass; PNG/JPG members by file name.
+    A member that fails to decode is yielded as ``(name, exception)``.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        members = []
+        for info in zf.infolist():
+            base = os.path.basename(info.filename)
+            if info.is_dir() or not base or base.startswith(".") or base.upper() == "DICOMDIR":
+                continue
+            if base.lower().endswith(_IMAGE_EXTS):
+                members.append(((0, base.lower()), info, base))
+                continue
+            with zf.open(info) as f:
+                if not _is_dicom(f.read(132)):
+                    continue
+            try:
+                with zf.open(info) as f:
+                    header = pydicom.dcmread(f, stop_before_pixels=True)
+                instance = int(header.get("InstanceNumber", 0) or 0)
+            except Exception:
+                instance = 0  # unreadable header: reported when the slice is decoded
+            members.append(((instance, base.lower()), info, base + ".dcm"))
+        if not members:
+            raise ValueError("ZIP contains no PNG/JPG/DICOM slices.")
+        if len(members) > MAX_SERIES_SLICES:
+            raise ValueError(f"ZIP has {len(members)} slices; limit is {MAX_SERIES_SLICES}.")
+        members.sort(key=lambda m: m[0])
+        for _, info, name in members:
+            try:
+                raw = decode_cxr_bytes(name, zf.read(info), max_side=max_side)
+            except Exception as e:
+                raw = e
+            yield info.filename, raw
+
+
+def iter_series(name, data, max_side=DECODE_MAX_SIDE):
+    if name.lower().endswith(".zip"):
+        return iter_zip(data, max_side=max_side)
+    return iter_multiframe(data, max_side=max_side)
+
+
+def analyze_series(name, data, settings):
+    """Score a series one slice at a time, yielding a result dict per slice.
+
+    ``settings`` is the same dict analyze_cxr takes. Slices that fail are
+    reported with ``error`` set instead of stopping the series.
+    """
+    for index, (label, raw) in enumerate(iter_series(name, data), start=1):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            img = preprocess(raw, target=settings["target_size"])
+            lung = pad_mask(lung_mask_quick(img), settings["mask_pad"])
+            abn, _, _ = abnormal_map(img, lung, method=settings["method"],
+                                     z_thresh=settings.get("z_thresh"),
+                                     pct_thresh=settings.get("pct_thresh"),
+                                     min_region_px=settings["min_region"])
+            result = {"index": index, "slice": label, "error": None}
+            result.update(measure_masks(img, lung, abn))
+            result["overlay"] = lambda img=img, abn=abn: encode_png(overlay_for(img, abn, alpha=settings["alpha"]))
+        except Exception as e:
+            result = {"index": index, "slice": label, "error": str(e)}
+        yield result
+
+
+class SeriesSummary:
+    """Running volume-level aggregate of per-slice results.
+
+    Volume % affected is total flagged pixels over total lung pixels, so
+    slices with more lung count for more. Only the worst slice's overlay is
+    kept (rendered when it becomes the worst).
+    """
+
+    def __init__(self):
+        self.slices = 0
+        self.failed = 0
+        self.lung_pixels = 0
+        self.flagged_pixels = 0
+        self.slice_pcts = []
+        self.worst = None
+        self.worst_overlay = None
+
+    def add(self, result):
+        self.slices += 1
+        if result["error"]:
+            self.failed += 1
+            return
+        self.lung_pixels += result["lung_pixels"]
+        self.flagged_pixels += result["flagged_pixels"]
+        self.slice_pcts.append(result["percent_affected"])
+        if self.worst is None or result["percent_affected"] > self.worst["percent_affected"]:
+            self.worst = {k: v for k, v in result.items() if k != "overlay"}
+            self.worst_overlay = result["overlay"]()
+
+    def as_dict(self):
+        scored = len(self.slice_pcts)
+        return {
+            "slices": self.slices,
+            "failed": self.failed,
+            "volume_percent_affected": (self.flagged_pixels * 100.0 / self.lung_pixels
+                                        if self.lung_pixels else 0.0),
+            "mean_slice_percent": sum(self.slice_pcts) / scored if scored else 0.0,
+            "max_slice_percent": max(self.slice_pcts) if scored else 0.0,
+            "slices_with_findings": sum(1 for p in self.slice_pcts if p > 0),
+            "worst_slice": self.worst["slice"] if self.worst else None,
+        }
@@ -0,0 +1,62 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 64
+
+
+class StageCache:
+    """Byte-bounded LRU cache for intermediate imaging results.
+
+    Meant to live in ``st.session_state`` (one per browser session). Each
+    pipeline stage is stored under a key made of the upload's content digest
+    plus only the settings that stage depends on, so changing a late-stage
+    control leaves the earlier stages cached. Cached arrays are shared:
+    callers must not modify them in place.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key][0]
+        self.misses += 1
+        value = compute()
+        size = _nbytes(value)
+        if size <= self.max_bytes:
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}